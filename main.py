@@ -1,7 +1,9 @@
 from topmost.utils import config, log, miscellaneous, seed
+from topmost.data import file_utils
 import topmost
 import wandb
 import os
+import shutil
 import numpy as np
 import scipy
 import torch
@@ -45,163 +47,32 @@ if __name__ == "__main__":
     if args.model in ['YTM', 'ZTM', 'CombinedTM', 'OTClusterTM']:
         dataset = topmost.data.BasicDatasetHandler(
             os.path.join(DATA_DIR, args.dataset), device=args.device, read_labels=read_labels,
-            as_tensor=True, contextual_embed=True, batch_size=args.batch_size)
+            as_tensor=True, contextual_embed=True, batch_size=args.batch_size, sparse=args.sparse_bow,
+            lazy=args.lazy_dataset)
         dataset.to(args.device)
     else:
         dataset = topmost.data.BasicDatasetHandler(
             os.path.join(DATA_DIR, args.dataset), device=args.device, read_labels=read_labels,
-            as_tensor=True, batch_size=args.batch_size)
+            as_tensor=True, batch_size=args.batch_size, sparse=args.sparse_bow,
+            lazy=args.lazy_dataset)
  
     # create a model
     pretrainWE = scipy.sparse.load_npz(os.path.join(
         DATA_DIR, args.dataset, "word_embeddings.npz")).toarray()
 
-    if args.model == "YTM":
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      weight_loss_MMI=args.weight_MMI,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'XTMv2':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      num_groups=args.num_groups,
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_XGR=args.weight_XGR,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      alpha_XGR=args.alpha_XGR,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'XTMv3':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      num_groups=args.num_groups,
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_XGR=args.weight_XGR,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      alpha_XGR=args.alpha_XGR,
-                                                      gating_func=args.gating_func,
-                                                      weight_global_expert=args.weight_global_expert,
-                                                      weight_local_expert=args.weight_local_expert,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'XTMv4':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      num_groups=args.num_groups,
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_XGR=args.weight_XGR,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      alpha_XGR=args.alpha_XGR,
-                                                      gating_func=args.gating_func,
-                                                      weight_global_expert=args.weight_global_expert,
-                                                      weight_local_expert=args.weight_local_expert,
-                                                      k=args.k,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'XTM':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      num_groups=args.num_groups,
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_XGR=args.weight_XGR,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      alpha_XGR=args.alpha_XGR,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'ZTM':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      num_groups=args.num_groups,
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_XGR=args.weight_XGR,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      alpha_XGR=args.alpha_XGR,
-                                                      weight_loss_MMI=args.weight_MMI,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'ECRTM':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'OTClusterTM':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      doc_embedding=dataset.train_contextual_embed,
-                                                      num_topics=args.num_topics,
-                                                      num_groups=args.num_groups,
-                                                      num_data=len(dataset.train_texts),
-                                                      dropout=args.dropout,
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      weight_loss_ECR=args.weight_ECR,
-                                                      alpha_ECR=args.alpha_ECR,
-                                                      weight_loss_DCR=args.weight_DCR,
-                                                      alpha_DCR=args.alpha_DCR,
-                                                      weight_loss_TCR=args.weight_TCR,
-                                                      alpha_TCR=args.alpha_TCR,
-                                                      beta_temp=args.beta_temp)
-    elif args.model == 'CombinedTM':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      dropout=args.dropout,
-                                                      contextual_embed_size=dataset.contextual_embed_size)
-    elif args.model == 'TraCo':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics_list=[args.num_groups, args.num_topics],
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      dropout=args.dropout,
-                                                      beta_temp=args.beta_temp,
-                                                      weight_loss_TPD=args.weight_TPD, 
-                                                      sinkhorn_alpha=args.alpha_TPD)
-    elif args.model == 'TraCoECR':
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics_list=[args.num_groups, args.num_topics],
-                                                      pretrained_WE=pretrainWE if args.use_pretrainWE else None,
-                                                      dropout=args.dropout,
-                                                      beta_temp=args.beta_temp,
-                                                      weight_loss_TPD=args.weight_TPD, 
-                                                      sinkhorn_alpha=args.alpha_TPD,
-                                                      weight_loss_ECR=args.weight_ECR, 
-                                                      alpha_ECR=args.alpha_ECR)
-    else:
-        model = topmost.models.MODEL_DICT[args.model](vocab_size=dataset.vocab_size,
-                                                      num_topics=args.num_topics,
-                                                      dropout=args.dropout)
-
-    if args.model == 'YTM':
-        model.weight_loss_XGR = args.weight_XGR
-        model.weight_loss_ECR = args.weight_ECR
-    elif args.model == 'XTMv2':
-        model.weight_loss_XGR = args.weight_XGR
-        model.weight_loss_ECR = args.weight_ECR
-    elif args.model == 'XTMv3':
-        model.weight_loss_XGR = args.weight_XGR
-        model.weight_loss_ECR = args.weight_ECR
-    elif args.model == 'XTMv4':
-        model.weight_loss_XGR = args.weight_XGR
-        model.weight_loss_ECR = args.weight_ECR
-    elif args.model == 'XTM':
-        model.weight_loss_XGR = args.weight_XGR
-        model.weight_loss_ECR = args.weight_ECR
-    elif args.model == 'ZTM':
-        model.weight_loss_XGR = args.weight_XGR
-        model.weight_loss_ECR = args.weight_ECR
-    elif args.model == 'OTClusterTM':
-        model.weight_loss_XGR = args.weight_XGR
-        model.weight_loss_ECR = args.weight_ECR
-    elif args.model == 'ECRTM':
-        model.weight_loss_ECR = args.weight_ECR
+    model = topmost.models.build_model(args, dataset.vocab_size,
+                                       pretrained_WE=pretrainWE,
+                                       doc_embedding=getattr(dataset, 'train_contextual_embed', None),
+                                       num_data=len(dataset.train_texts),
+                                       contextual_embed_size=getattr(dataset, 'contextual_embed_size', None))
+
+    sinkhorn_options = dict(warm_start=args.sinkhorn_warm_start,
+                            convergence=args.sinkhorn_convergence,
+                            check_interval=args.sinkhorn_check_interval,
+                            compile_update=args.sinkhorn_compile)
+    if args.sinkhorn_max_iter is not None:
+        sinkhorn_options['max_iter'] = args.sinkhorn_max_iter
+    topmost.ot.configure_solvers(model, **sinkhorn_options)
 
     # Thêm đoạn này để in ra số lượng tham số của mô hình
     total_params = sum(p.numel() for p in model.parameters())
@@ -210,13 +81,38 @@ if __name__ == "__main__":
     print(f"===> Total trainable parameters: {total_trainable_params}")
     model = model.to(args.device)
 
+    # evaluate cheap metrics during training
+    evaluator = None
+    if args.eval_interval > 0:
+        early_stopping = None
+        if args.early_stop_metric is not None:
+            early_stopping = topmost.trainers.EarlyStopping(args.early_stop_metric, patience=args.early_stop_patience)
+        callbacks = [topmost.trainers.TopicDiversityCallback(time_budget=args.eval_time_budget),
+                     topmost.trainers.ClusteringCallback(time_budget=args.eval_time_budget)]
+        evaluator = topmost.trainers.Evaluator(callbacks, interval=args.eval_interval,
+                                               num_samples=args.eval_samples,
+                                               labels=dataset.test_labels if read_labels else None,
+                                               early_stopping=early_stopping)
+
+    # save resumable checkpoints during training
+    checkpoint = None
+    if args.checkpoint_interval > 0:
+        checkpoint = topmost.trainers.CheckpointManager(os.path.join(current_run_dir, 'checkpoints'),
+                                                        interval=args.checkpoint_interval,
+                                                        keep=args.checkpoint_keep)
+
     # create a trainer
     if args.model in ['TraCo', 'TraCoECR']:
         trainer = topmost.trainers.HierarchicalTrainer(model, epochs=args.epochs,
                                                        learning_rate=args.lr,
                                                        batch_size=args.batch_size,
                                                        lr_scheduler=args.lr_scheduler,
-                                                       lr_step_size=args.lr_step_size)
+                                                       lr_step_size=args.lr_step_size,
+                                                       device=args.device,
+                                                       precision=args.precision,
+                                                       evaluator=evaluator,
+                                                       checkpoint=checkpoint,
+                                                       inference_batch_size=args.inference_batch_size)
     else:
         trainer = topmost.trainers.BasicTrainer(model, epochs=args.epochs,
                                                 learning_rate=args.lr,
@@ -229,7 +125,12 @@ if __name__ == "__main__":
                                                 mut = args.mut,
                                                 sigmat=args.sigmat,
                                                 k1=args.k1,
-                                                k2=args.k2)          
+                                                k2=args.k2,
+                                                ot_update_interval=args.ot_update_interval,
+                                                precision=args.precision,
+                                                evaluator=evaluator,
+                                                checkpoint=checkpoint,
+                                                inference_batch_size=args.inference_batch_size)
 
     # Với SAM                                        
     # else:
@@ -243,40 +144,37 @@ if __name__ == "__main__":
     # trainer.train(dataset, MOO=args.MOO_algo)
 
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    trainer.train(dataset, device)
+    trainer.train(dataset, device, resume=args.resume)
     
     torch.save(trainer.model.state_dict(), os.path.join(current_run_dir, 'checkpoint.pt'))
+    # vocab and tokenizer settings with the checkpoint, so topmost.serving can load the run on its own
+    file_utils.save_text(dataset.vocab, os.path.join(current_run_dir, 'vocab.txt'))
+    tokenizer_path = os.path.join(DATA_DIR, args.dataset, 'tokenizer.json')
+    if os.path.exists(tokenizer_path):
+        shutil.copy(tokenizer_path, current_run_dir)
 
-    # save beta, theta and top words
-    beta = trainer.save_beta(current_run_dir)
+    # save beta, top words and embeddings in one pass, then theta
+    save_embeddings = args.model in ['ETM', 'ECRTM', 'XTM', 'XTMv2', 'YTM', 'XTMv3', 'ZTM', 'OTClusterTM', 'TraCo', 'TraCoECR', 'XTMv4']
+    beta, top_words = trainer.save_artifacts(dataset.vocab, current_run_dir, (10, 15, 20, 25), embeddings=save_embeddings)
+    top_words_10, top_words_15, top_words_20, top_words_25 = (top_words[k] for k in (10, 15, 20, 25))
     train_theta, test_theta = trainer.save_theta(dataset, current_run_dir)
-    top_words_10 = trainer.save_top_words(
-        dataset.vocab, 10, current_run_dir)
-    top_words_15 = trainer.save_top_words(
-        dataset.vocab, 15, current_run_dir)
-    top_words_20 = trainer.save_top_words(
-        dataset.vocab, 20, current_run_dir)
-    top_words_25 = trainer.save_top_words(
-        dataset.vocab, 25, current_run_dir)
-
-    # argmax of train and test theta
-    train_theta_argmax = train_theta.argmax(axis=1)
+
+    # argmax of train and test theta, computed on the device by save_theta
+    train_theta_argmax = np.load(os.path.join(current_run_dir, 'train_argmax_theta.npy'))
     unique_elements, counts = np.unique(train_theta_argmax, return_counts=True)
     print(f'train theta argmax: {unique_elements, counts}')
     logger.info(f'train theta argmax: {unique_elements, counts}')
-    test_theta_argmax = test_theta.argmax(axis=1)
+    test_theta_argmax = np.load(os.path.join(current_run_dir, 'test_argmax_theta.npy'))
     unique_elements, counts = np.unique(test_theta_argmax, return_counts=True)
     print(f'test theta argmax: {unique_elements, counts}')
     logger.info(f'test theta argmax: {unique_elements, counts}')
 
     # save word embeddings and topic embeddings
     if args.model in ['ETM', 'ECRTM', 'XTM', 'XTMv2', 'YTM', 'XTMv3', 'ZTM', 'OTClusterTM']:
-        trainer.save_embeddings(current_run_dir)
         miscellaneous.tsne_viz(model.word_embeddings.detach().cpu().numpy(),
                                model.topic_embeddings.detach().cpu().numpy(),
                                os.path.join(current_run_dir, 'tsne.png'), logwandb=True)
     elif args.model in ['TraCo', 'TraCoECR']:
-        trainer.save_embeddings(current_run_dir)
         miscellaneous.tsne_viz(model.bottom_word_embeddings.detach().cpu().numpy(),
                                model.topic_embeddings_list[-1].detach().cpu().numpy(),
                                os.path.join(current_run_dir, 'tsne.png'), logwandb=True)
@@ -284,7 +182,6 @@ if __name__ == "__main__":
 
     if args.model in ['XTMv4']:
         # try:
-        trainer.save_embeddings(current_run_dir)
         miscellaneous.tsne_group_viz(model.word_embeddings.detach().cpu().numpy(),
                                      model.topic_embeddings.detach().cpu().numpy(),
                                      model.group_embeddings.detach().cpu().numpy(),
@@ -344,7 +241,8 @@ if __name__ == "__main__":
     # evaluate classification
     if read_labels:
         classification_results = topmost.evaluations.evaluate_classification(
-            train_theta, test_theta, dataset.train_labels, dataset.test_labels, tune=args.tune_SVM)
+            train_theta, test_theta, dataset.train_labels, dataset.test_labels, tune=args.tune_SVM,
+            n_jobs=args.eval_jobs, fast_linear=args.fast_linear_SVM)
         print(f"Accuracy: ", classification_results['acc'])
         wandb.log({"Accuracy": classification_results['acc']})
         logger.info(f"Accuracy: {classification_results['acc']}")
@@ -353,36 +251,36 @@ if __name__ == "__main__":
         logger.info(f"Macro-f1: {classification_results['macro-F1']}")
 
     # TC
-    TC_15_list, TC_15 = topmost.evaluations.topic_coherence.TC_on_wikipedia(
+    TC_15_list, TC_15 = topmost.evaluations.TC_on_wikipedia(
         os.path.join(current_run_dir, 'top_words_15.txt'))
     print(f"TC_15: {TC_15:.5f}")
     wandb.log({"TC_15": TC_15})
     logger.info(f"TC_15: {TC_15:.5f}")
     logger.info(f'TC_15 list: {TC_15_list}')
 
-    # TC_10_list, TC_10 = topmost.evaluations.topic_coherence.TC_on_wikipedia(
+    # TC_10_list, TC_10 = topmost.evaluations.TC_on_wikipedia(
     #     os.path.join(current_run_dir, 'top_words_10.txt'))
     # print(f"TC_10: {TC_10:.5f}")
     # wandb.log({"TC_10": TC_10})
     # logger.info(f"TC_10: {TC_10:.5f}")
     # logger.info(f'TC_10 list: {TC_10_list}')
 
-    # NPMI
-    NPMI_train_10_list, NPMI_train_10 = topmost.evaluations.compute_topic_coherence(
-        dataset.train_texts, dataset.vocab, top_words_10, cv_type='c_npmi')
-    print(f"NPMI_train_10: {NPMI_train_10:.5f}, NPMI_train_10_list: {NPMI_train_10_list}")
-    wandb.log({"NPMI_train_10": NPMI_train_10})
-    logger.info(f"NPMI_train_10: {NPMI_train_10:.5f}")
-    logger.info(f'NPMI_train_10 list: {NPMI_train_10_list}')
+    # NPMI with whole documents as windows; NPMI_train_10 was gensim c_npmi with 10-token windows
+    NPMI_doc_train_10_list, NPMI_doc_train_10 = topmost.evaluations.compute_topic_coherence_on_bow(
+        dataset.train_bow, dataset.vocab, top_words_10, cv_type='NPMI')
+    print(f"NPMI_doc_train_10: {NPMI_doc_train_10:.5f}, NPMI_doc_train_10_list: {NPMI_doc_train_10_list}")
+    wandb.log({"NPMI_doc_train_10": NPMI_doc_train_10})
+    logger.info(f"NPMI_doc_train_10: {NPMI_doc_train_10:.5f}")
+    logger.info(f'NPMI_doc_train_10 list: {NPMI_doc_train_10_list}')
 
-    NPMI_wiki_10_list, NPMI_wiki_10 = topmost.evaluations.topic_coherence.TC_on_wikipedia(
+    NPMI_wiki_10_list, NPMI_wiki_10 = topmost.evaluations.TC_on_wikipedia(
         os.path.join(current_run_dir, 'top_words_10.txt'), cv_type='NPMI')
     print(f"NPMI_wiki_10: {NPMI_wiki_10:.5f}, NPMI_wiki_10_list: {NPMI_wiki_10_list}")
     wandb.log({"NPMI_wiki_10": NPMI_wiki_10})
     logger.info(f"NPMI_wiki_10: {NPMI_wiki_10:.5f}")
     logger.info(f'NPMI_wiki_10 list: {NPMI_wiki_10_list}')
 
-    Cp_wiki_10_list, Cp_wiki_10 = topmost.evaluations.topic_coherence.TC_on_wikipedia(
+    Cp_wiki_10_list, Cp_wiki_10 = topmost.evaluations.TC_on_wikipedia(
         os.path.join(current_run_dir, 'top_words_10.txt'), cv_type='C_P')
     print(f"Cp_wiki_10: {Cp_wiki_10:.5f}, Cp_wiki_10_list: {Cp_wiki_10_list}")
     wandb.log({"Cp_wiki_10": Cp_wiki_10})
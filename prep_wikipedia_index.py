@@ -0,0 +1,10 @@
+from topmost.data import file_utils
+from topmost.evaluations.coherence_index import build_coherence_index
+
+# the reference corpus: one preprocessed Wikipedia article per line.
+# index the union of the vocabularies of the datasets to evaluate.
+vocab = set()
+for dataset in ['20NG', 'IMDB', 'NYT', 'AGNews', 'YahooAnswers']:
+    vocab.update(file_utils.read_text(f'./data/{dataset}/vocab.txt'))
+
+build_coherence_index('./data/wikipedia/wikipedia.txt', sorted(vocab), './data/wikipedia/coherence_index')
@@ -1,11 +1,17 @@
 import pytest
 import numpy as np
+import scipy.sparse
+import torch
 
 import sys
 sys.path.append('../')
 
 from topmost.data import download_dataset
 from topmost.data import BasicDatasetHandler
+from topmost.data import SparseBow
+from topmost.data import file_utils
+from topmost.data.basic_dataset_handler import DatasetHandler, DeviceBatchLoader
+from topmost.data.embedding_cache import EmbeddingCache
 
 
 @pytest.fixture
@@ -59,3 +65,73 @@ def test_datasets(cache_path):
     for item in dataset_info:
         print(item)
         dataset_test(cache_path, **item)
+
+
+def test_sparse_bow():
+    bow = scipy.sparse.random(30, 50, density=0.1, format='csr', dtype='float32', random_state=0)
+    sparse_bow = SparseBow(bow)
+    dense_bow = torch.from_numpy(bow.toarray())
+
+    assert len(sparse_bow) == 30
+    idx = torch.tensor([3, 0, 29, 3])
+    assert torch.equal(sparse_bow[idx], dense_bow[idx])
+    assert torch.equal(sparse_bow[5], dense_bow[5])
+    assert torch.equal(sparse_bow[2:7], dense_bow[2:7])
+    assert torch.equal(sparse_bow.to_dense(), dense_bow)
+
+
+def test_lazy_dataset(tmp_path):
+    train_bow = scipy.sparse.random(6, 4, density=0.5, format='csr', random_state=0)
+    test_bow = scipy.sparse.random(3, 4, density=0.5, format='csr', random_state=1)
+    scipy.sparse.save_npz(tmp_path / 'train_bow.npz', train_bow)
+    scipy.sparse.save_npz(tmp_path / 'test_bow.npz', test_bow)
+    scipy.sparse.save_npz(tmp_path / 'word_embeddings.npz', scipy.sparse.csr_matrix(np.ones((4, 3))))
+    train_texts = ['a b', 'c', 'd a', 'b b', '', 'c d']
+    file_utils.save_text(train_texts, tmp_path / 'train_texts.txt')
+    file_utils.save_text(['a', 'b', 'c'], tmp_path / 'test_texts.txt')
+    file_utils.save_text(['a', 'b', 'c', 'd'], tmp_path / 'vocab.txt')
+    np.savetxt(tmp_path / 'train_labels.txt', [0, 1, 0, 1, 0, 1], fmt='%d')
+    np.savetxt(tmp_path / 'test_labels.txt', [1, 0, 1], fmt='%d')
+
+    dataset = BasicDatasetHandler(str(tmp_path), read_labels=True, lazy=True, sparse=True)
+    eager_dataset = BasicDatasetHandler(str(tmp_path), read_labels=True)
+
+    assert list(dataset.train_texts) == eager_dataset.train_texts
+    assert dataset.train_texts[-1] == 'c d'
+    assert np.array_equal(dataset.train_bow.toarray(), eager_dataset.train_bow)
+    assert np.array_equal(dataset.test_labels, eager_dataset.test_labels)
+    assert dataset.vocab == eager_dataset.vocab
+
+
+def test_device_batch_loader():
+    data = torch.rand(25, 8)
+    contextual_embed = torch.rand(25, 3)
+    loader = DeviceBatchLoader(DatasetHandler(data, contextual_embed), batch_size=10, shuffle=True)
+
+    assert len(loader) == 3
+    seen = list()
+    for batch in loader:
+        assert torch.equal(batch['data'], data[batch['idx']])
+        assert torch.equal(batch['contextual_embed'], contextual_embed[batch['idx']])
+        seen.extend(batch['idx'].tolist())
+    assert sorted(seen) == list(range(25))
+
+
+def test_embedding_cache(tmp_path):
+    encoded = list()
+
+    def encode(texts, batch_size):
+        encoded.extend(texts)
+        return np.asarray([[len(text), text.count('a')] for text in texts], dtype='float32')
+
+    cache = EmbeddingCache('sentence-transformers/test-model', str(tmp_path))
+    embeddings = cache.encode(['a b', 'c', 'a b', 'aa'], encode)
+    assert encoded == ['a b', 'c', 'aa']
+    assert np.array_equal(embeddings, [[3, 1], [1, 0], [3, 1], [2, 2]])
+
+    # a new cache on the same directory only encodes the new text.
+    cache = EmbeddingCache('sentence-transformers/test-model', str(tmp_path))
+    embeddings = cache.encode(['aa', 'new text', 'c'], encode)
+    assert encoded[3:] == ['new text']
+    assert np.array_equal(embeddings, [[2, 2], [8, 0], [1, 0]])
+    assert len(cache) == 4
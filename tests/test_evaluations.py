@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 
 import sys
 sys.path.append('../')
@@ -45,3 +46,113 @@ def test_dynamic_evaluations(cache_path):
     TC = topmost.evaluations.compute_dynamic_TC(dataset.train_texts, dataset.train_times, dataset.vocab, top_words)
     print("TD: ", TD)
     print("TC: ", TC)
+
+
+def test_coherence_index(tmp_path):
+    from topmost.evaluations.coherence_index import build_coherence_index, CoherenceIndex
+
+    reference_corpus = ['a b c', 'a b', 'c d', 'a d d', 'b c']
+    vocab = ['a', 'b', 'c', 'd']
+    build_coherence_index(reference_corpus, vocab, str(tmp_path), window_sizes=(None, 2))
+
+    index = CoherenceIndex(str(tmp_path))
+    p_i, p_ij = index.probabilities(index.word_ids(['a b', 'c d']), None)
+    assert np.allclose(p_i, [[3 / 5, 3 / 5], [3 / 5, 2 / 5]])
+    assert np.allclose(p_ij[0, 0, 1], 2 / 5)
+
+    # 'a b c' and 'a d d' have two size-2 windows each and the other documents one: 7 windows.
+    num_windows, word_count, pair_count = index.load_counts(2)
+    assert num_windows == 7
+    assert pair_count[0, 2] == 0
+    assert pair_count[1, 2] == 2
+
+
+def test_coherence_measures(tmp_path):
+    from topmost.evaluations.coherence_index import build_coherence_index, CoherenceIndex, \
+        compute_C_V, compute_NPMI, compute_UCI, compute_C_P
+
+    reference_corpus = ['a b c', 'a b', 'c d', 'a d d', 'b c']
+    build_coherence_index(reference_corpus, ['a', 'b', 'c', 'd'], str(tmp_path), window_sizes=(None,))
+    index = CoherenceIndex(str(tmp_path))
+
+    # a, b and c occur in 3 of 5 documents; a-b and b-c co-occur in 2, a-c in 1.
+    p_i, p_ij = index.probabilities(index.word_ids(['a b c']), None)
+    assert np.allclose(compute_UCI(p_i, p_ij), (2 * np.log(10 / 9) + np.log(5 / 9)) / 3)
+    assert np.allclose(compute_NPMI(p_i, p_ij), (2 * np.log(10 / 9) / -np.log(2 / 5) + np.log(5 / 9) / -np.log(1 / 5)) / 3)
+    # b|a and c|b confirm with (2/3 - 1/2) / (2/3 + 1/2) = 1/7, c|a with (1/3 - 1) / (1/3 + 1) = -1/2.
+    assert np.allclose(compute_C_P(p_i, p_ij), -1 / 14)
+    assert np.allclose(compute_C_V(p_i, p_ij), 0.5208214, atol=1e-6)
+
+
+def test_CLNPMI():
+    from topmost.evaluations.hierarchy_quality import compute_CLNPMI
+
+    vocab = ['a', 'b', 'c', 'd']
+    reference_bow = np.asarray([
+        [1, 1, 0, 0],
+        [1, 0, 1, 0],
+        [0, 1, 1, 1],
+        [2, 0, 0, 1],
+    ])
+    npmi_list = compute_CLNPMI(['a', 'b'], ['c', 'd'], reference_bow, vocab)
+
+    # a and c co-occur in 1 of 4 documents, each occurs in 3 and 2.
+    p_nl = 1 / 4 + 1e-10
+    assert np.isclose(npmi_list[0], np.log(p_nl / (3 / 4 * 2 / 4)) / -np.log(p_nl))
+    assert len(npmi_list) == 4
+
+
+def test_bow_coherence(tmp_path):
+    from topmost.evaluations.coherence_index import build_coherence_index, CoherenceIndex, BowCoherence
+
+    reference_corpus = ['a b c', 'a b', 'c d', 'a d d', 'b c']
+    vocab = ['a', 'b', 'c', 'd']
+    reference_bow = np.asarray([[text.split().count(word) for word in vocab] for text in reference_corpus])
+    build_coherence_index(reference_corpus, vocab, str(tmp_path), window_sizes=(None,))
+
+    # one window per document gives the same probabilities as the index.
+    ids = BowCoherence(reference_bow, vocab).word_ids(['a b e', 'c d a'])
+    p_i, p_ij = BowCoherence(reference_bow, vocab).probabilities(ids)
+    index_p_i, index_p_ij = CoherenceIndex(str(tmp_path)).probabilities(ids, None)
+    assert np.allclose(p_i, index_p_i)
+    assert np.allclose(p_ij, index_p_ij)
+
+
+def test_bow_coherence_cache():
+    import gc
+    import weakref
+    from topmost.evaluations.topic_coherence import get_bow_coherence, compute_topic_coherence_on_bow
+    from topmost.evaluations.coherence_index import BowCoherence
+
+    reference_bow = np.asarray([[1, 1, 0], [0, 1, 1], [1, 0, 1]])
+    coherence = get_bow_coherence(reference_bow, ['a', 'b', 'c'])
+    assert get_bow_coherence(reference_bow, ['a', 'b', 'c']) is coherence
+    # the same matrix with another vocab is not scored with the cached words.
+    assert get_bow_coherence(reference_bow, ['c', 'b', 'a']).vocab == ['c', 'b', 'a']
+
+    # the cache does not keep the matrix alive.
+    bow_ref = weakref.ref(reference_bow)
+    del reference_bow
+    gc.collect()
+    assert bow_ref() is None
+
+    reference_bow = np.asarray([[1, 1, 0], [0, 1, 1], [1, 0, 1]])
+    owned = BowCoherence(reference_bow, ['a', 'b', 'c'])
+    assert compute_topic_coherence_on_bow(reference_bow, ['a', 'b', 'c'], ['a b'], coherence=owned) == \
+        compute_topic_coherence_on_bow(reference_bow, ['a', 'b', 'c'], ['a b'])
+
+
+def test_evaluation_callbacks():
+    from topmost.trainers.evaluation_callbacks import TopicDiversityCallback, EarlyStopping
+
+    beta = np.asarray([
+        [0.5, 0.4, 0.1, 0.0],
+        [0.0, 0.4, 0.1, 0.5],
+    ])
+    # the top-2 words are {0, 1} and {1, 3}: 2 of 4 words are unique.
+    assert TopicDiversityCallback(num_top_words=2)({'beta': beta})['TD'] == 0.5
+
+    early_stopping = EarlyStopping(patience=2)
+    for value in [0.1, 0.2, 0.2, 0.2]:
+        early_stopping.update(value)
+    assert early_stopping.should_stop()
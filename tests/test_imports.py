@@ -0,0 +1,38 @@
+import os
+import sys
+import subprocess
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('torch', 'sentence_transformers', 'gensim', 'nltk', 'bertopic', 'sklearn', 'torchvision')
+
+
+def run_import(statement):
+    # import time in seconds and loaded modules of a fresh interpreter.
+    code = f'import sys, time; start = time.time(); {statement}; print(time.time() - start); print(" ".join(sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout
+    elapsed, modules = output.strip().split('\n')
+    return float(elapsed), set(modules.split())
+
+
+def test_import_time():
+    elapsed, modules = run_import('import topmost')
+    assert elapsed < 1.
+    for name in HEAVY_MODULES:
+        assert name not in modules
+
+
+def test_lazy_model_dict():
+    _, modules = run_import('import topmost; assert "ECRTM" in topmost.models.MODEL_DICT; dir(topmost.trainers)')
+    for name in HEAVY_MODULES:
+        assert name not in modules
+
+
+def test_lazy_submodule():
+    # submodules that are not listed as exports are imported on access, as with a plain import.
+    statement = ('import topmost; topmost.data.file_utils.read_text; '
+                 'assert "TC_on_wikipedia" in dir(topmost.evaluations); '
+                 'assert not hasattr(topmost.data, "missing_module")')
+    _, modules = run_import(statement)
+    assert 'topmost.data.file_utils' in modules
@@ -0,0 +1,124 @@
+import pytest
+import torch
+
+import sys
+sys.path.append('../')
+
+from topmost.ot import Sinkhorn, sinkhorn, sinkhorn_batch
+
+
+def reference_sinkhorn(M, sinkhorn_alpha, max_iter=5000, stopThr=.5e-2, epsilon=1e-16):
+    a = (torch.ones(M.shape[0]) / M.shape[0]).unsqueeze(1)
+    b = (torch.ones(M.shape[1]) / M.shape[1]).unsqueeze(1)
+    u = torch.ones_like(a) / a.size()[0]
+
+    K = torch.exp(-M * sinkhorn_alpha)
+    err = 1
+    cpt = 0
+    while err > stopThr and cpt < max_iter:
+        v = torch.div(b, torch.matmul(K.t(), u) + epsilon)
+        u = torch.div(a, torch.matmul(K, v) + epsilon)
+        cpt += 1
+        if cpt % 50 == 1:
+            bb = torch.mul(v, torch.matmul(K.t(), u))
+            err = torch.norm(torch.sum(torch.abs(bb - b), dim=0), p=float('inf'))
+
+    return u * (K * v.T)
+
+
+@pytest.fixture
+def cost_list():
+    torch.manual_seed(0)
+    return [torch.rand(10, 50), torch.rand(10, 7)]
+
+
+def test_sinkhorn_matches_reference(cost_list):
+    for M in cost_list:
+        transp = sinkhorn(M, sinkhorn_alpha=20.)
+        assert torch.allclose(transp, reference_sinkhorn(M, 20.))
+
+
+def test_sinkhorn_batch(cost_list):
+    solvers = [Sinkhorn(20.), Sinkhorn(5.)]
+    transp_list = sinkhorn_batch(solvers, cost_list)
+    for M, solver, transp in zip(cost_list, solvers, transp_list):
+        assert transp.shape == M.shape
+        assert torch.allclose(transp, reference_sinkhorn(M, solver.sinkhorn_alpha), atol=1e-6)
+
+
+def test_log_domain(cost_list):
+    for M in cost_list:
+        transp = sinkhorn(M, sinkhorn_alpha=20., stopThr=1e-6)
+        transp_log = sinkhorn(M, sinkhorn_alpha=20., stopThr=1e-6, log_domain=True)
+        assert torch.allclose(transp, transp_log, atol=1e-5)
+
+    # exp(-alpha * M) underflows here, but the log domain stays finite.
+    transp = sinkhorn(cost_list[0] * 100, sinkhorn_alpha=20., log_domain=True)
+    assert torch.isfinite(transp).all()
+    assert torch.allclose(transp.sum(), torch.tensor(1.), atol=1e-3)
+
+
+def test_warm_start(cost_list):
+    M = cost_list[0]
+    solver = Sinkhorn(20., stopThr=1e-4, check_interval=1, warm_start=True)
+    solver(M)
+    cold_n_iter = solver.n_iter
+
+    transp = solver(M + 1e-3 * torch.rand_like(M))
+    assert solver.n_iter < cold_n_iter
+    assert torch.allclose(transp.sum(), torch.tensor(1.), atol=1e-3)
+
+    # shape change falls back to a cold start.
+    solver(cost_list[1])
+    assert solver.u.shape == (cost_list[1].shape[0], 1)
+
+
+def test_convergence_modes(cost_list):
+    M = cost_list[0]
+    transp = sinkhorn(M, sinkhorn_alpha=20.)
+    transp_async = sinkhorn(M, sinkhorn_alpha=20., convergence='async')
+    assert torch.allclose(transp, transp_async)
+
+    # async returns the converged check, at most one check_interval after sync stops.
+    solver = Sinkhorn(20., stopThr=1e-4, check_interval=10)
+    solver_async = Sinkhorn(20., stopThr=1e-4, check_interval=10, convergence='async')
+    assert torch.allclose(solver(M), solver_async(M))
+    assert solver.n_iter < solver.max_iter
+    assert abs(solver_async.n_iter - solver.n_iter) <= solver.check_interval
+
+    solver = Sinkhorn(20., max_iter=120, convergence='fixed')
+    solver(M)
+    assert solver.n_iter == 120
+
+
+def test_reuse_plan(cost_list):
+    M = cost_list[0]
+    solver = Sinkhorn(20., reuse_plan=True)
+    transp = solver(M)
+
+    # the cached plan is returned without solving.
+    solver.n_iter = 0
+    assert torch.equal(solver(M * 2), transp)
+    assert solver.n_iter == 0
+
+    solver.refresh()
+    assert torch.allclose(solver(M * 2), reference_sinkhorn(M * 2, 20.))
+    assert solver.n_iter > 0
+
+
+def test_reuse_plan_marginals(cost_list):
+    # a plan is only reused for the marginals it was solved for, e.g., not across batches.
+    M = cost_list[0]
+    a = torch.full((M.shape[0], 1), 1. / M.shape[0])
+    b = torch.rand(M.shape[1], 1)
+    b /= b.sum()
+    solver = Sinkhorn(20., reuse_plan=True)
+    transp = solver(M, a, b)
+
+    solver.n_iter = 0
+    assert torch.equal(solver(M, a, b.clone()), transp)
+    assert solver.n_iter == 0
+
+    b2 = b.flip(0)
+    assert not torch.equal(solver(M, a, b2), transp)
+    assert solver.n_iter > 0
@@ -0,0 +1,86 @@
+import pytest
+import numpy as np
+import scipy.sparse
+
+import sys
+sys.path.append('../')
+
+from topmost.data import file_utils
+from topmost.data.embedding_cache import EmbeddingCache
+from topmost.preprocessing.preprocessing import Preprocessing, Tokenizer, tokenize_texts, make_bow, make_word_embeddings, clean_raw_text
+
+
+TEXTS = [
+    'The cats are running after the mice in the garden.',
+    'Running water flows through the old garden.',
+    'Mice eat cheese; cats eat mice.',
+    'Stock markets fell after the bank reported losses.',
+    'The bank raised interest rates on loans.',
+    'Interest in the garden show grew after the markets closed.',
+]
+
+
+def test_tokenize_texts_workers():
+    tokenizer = Tokenizer(None, keep_num=False, keep_alphanum=False, strip_html=False, no_lower=False, min_length=3).tokenize
+    tokens, doc_counts = tokenize_texts(tokenizer, TEXTS, num_workers=1, chunk_size=2)
+    parallel_tokens, parallel_doc_counts = tokenize_texts(tokenizer, TEXTS, num_workers=2, chunk_size=2)
+
+    assert parallel_tokens == tokens
+    assert parallel_doc_counts == doc_counts
+    assert doc_counts['garden'] == 3
+
+
+def test_make_bow():
+    word2id = {'a': 0, 'b': 1, 'c': 2}
+    parsed_texts, bow = make_bow([['a', 'b', 'a', 'x'], [], ['c'] * 3], word2id, np.int32)
+    assert parsed_texts == ['a b a', '', 'c c c']
+    assert bow.dtype == np.int32
+    assert np.array_equal(bow.toarray(), [[2, 1, 0], [0, 0, 0], [0, 0, 3]])
+
+    # 300 occurrences of a word do not fit in uint8.
+    with pytest.raises(ValueError):
+        make_bow([['a'] * 300], word2id, np.uint8)
+
+
+def write_word_vectors(cache_dir, name, words, dim=3):
+    # a local copy of word vectors, as load_word_vectors saves it after downloading.
+    vectors = np.arange(len(words) * dim, dtype='float32').reshape(len(words), dim) + 1
+    np.save(f'{cache_dir}/{name}.npy', vectors)
+    file_utils.save_text(words, f'{cache_dir}/{name}.vocab.txt')
+    return vectors
+
+
+def test_make_word_embeddings(tmp_path):
+    vectors = write_word_vectors(str(tmp_path), 'test-vectors', ['bank', 'cat', 'garden'])
+
+    # no download: the vectors are read from the cache.
+    word_embeddings = make_word_embeddings(['garden', 'unknown', 'bank'], 'test-vectors', str(tmp_path)).toarray()
+    assert np.array_equal(word_embeddings, [vectors[2], np.zeros(3), vectors[0]])
+
+
+def test_preprocess_jsonlist_streaming(tmp_path):
+    dataset_dir = tmp_path / 'raw'
+    dataset_dir.mkdir()
+    labels = ['pets', 'garden', 'pets', 'finance', 'finance', 'garden']
+    # 'a b' has no word of the vocabulary and is dropped.
+    file_utils.save_jsonlist([{'text': text, 'label': label} for text, label in zip(TEXTS[:4] + ['a b'], labels[:4] + ['pets'])],
+                             str(dataset_dir / 'train.jsonlist'))
+    file_utils.save_jsonlist([{'text': text, 'label': label} for text, label in zip(TEXTS[4:], labels[4:])],
+                             str(dataset_dir / 'test.jsonlist'))
+
+    write_word_vectors(str(tmp_path), 'glove-wiki-gigaword-200', ['bank', 'cat', 'garden'])
+    # preprocess also computes contextual embeddings; fill their cache so no model is loaded.
+    EmbeddingCache('all-MiniLM-L6-v2', str(tmp_path / 'embeddings')).encode(
+        [clean_raw_text(text) for text in TEXTS + ['a b']], lambda texts, batch_size: np.ones((len(texts), 2)))
+    preprocessing = Preprocessing(embedding_cache_dir=str(tmp_path / 'embeddings'), word_vectors_cache_dir=str(tmp_path))
+
+    rst = preprocessing.preprocess_jsonlist(str(dataset_dir), label_name='label')
+    output_dir = tmp_path / 'output'
+    vocab = preprocessing.preprocess_jsonlist_streaming(str(dataset_dir), str(output_dir), label_name='label', chunk_size=2)
+
+    assert vocab == rst['vocab']
+    assert file_utils.read_text(str(output_dir / 'vocab.txt')) == rst['vocab']
+    assert np.array_equal(scipy.sparse.load_npz(str(output_dir / 'train_bow.npz')).toarray(), rst['train_bow'].toarray())
+    assert np.array_equal(scipy.sparse.load_npz(str(output_dir / 'test_bow.npz')).toarray(), rst['test_bow'].toarray())
+    assert np.array_equal(np.loadtxt(str(output_dir / 'train_labels.txt'), dtype=int), rst['train_labels'])
+    assert file_utils.read_text(str(output_dir / 'train_texts.txt')) == list(rst['train_texts'])
@@ -0,0 +1,106 @@
+import os
+import subprocess
+import pytest
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+
+import sys
+sys.path.append('../')
+
+from topmost.data import file_utils
+from topmost.models import build_model
+from topmost.preprocessing import Preprocessing
+from topmost.serving import TopicModelService, export_encoder, fold_batchnorm
+from topmost.utils import config
+
+
+LOADER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'topmost', 'serving', 'loader.py')
+
+VOCAB = ['apple', 'banana', 'cherry', 'engine', 'wheel', 'road', 'goal', 'match', 'team']
+
+
+def ecrtm_args():
+    parser = config.new_parser()
+    config.add_model_argument(parser)
+    config.add_training_argument(parser)
+    return parser.parse_args(['--model', 'ECRTM', '--num_topics', '4', '--use_pretrainWE'])
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    args = ecrtm_args()
+    config.save_config(args, str(tmp_path / 'config.txt'))
+
+    model = build_model(args, len(VOCAB), pretrained_WE=np.random.rand(len(VOCAB), 20).astype('float32'))
+    torch.save(model.state_dict(), str(tmp_path / 'checkpoint.pt'))
+    file_utils.save_text(VOCAB, str(tmp_path / 'vocab.txt'))
+    Preprocessing(min_length=3).save_tokenizer(str(tmp_path))
+    return tmp_path
+
+
+def test_load_config(run_dir):
+    args = config.load_config(str(run_dir / 'config.txt'))
+    assert args.model == 'ECRTM'
+    assert args.num_topics == 4
+    assert args.dropout == 0.4
+    assert args.use_pretrainWE is True
+
+
+def test_service(run_dir):
+    texts = ['Apples and bananas, cherries.', 'The team won the match by a goal.', 'Engines, wheels and roads', '']
+
+    with TopicModelService(str(run_dir), max_batch_size=3, num_top_topics=2) as service:
+        theta, top_topics = service.predict(texts)
+        assert theta.shape == (4, 4)
+        assert top_topics.shape == (4, 2)
+        assert np.array_equal(top_topics[:, 0], theta.argmax(1))
+
+        bow = np.zeros((1, len(VOCAB)), dtype='float32')
+        bow[0, [VOCAB.index('goal'), VOCAB.index('match'), VOCAB.index('team')]] = 1
+        with torch.no_grad():
+            expected = service.model.get_theta(torch.as_tensor(bow)).numpy()
+        assert np.allclose(theta[1], expected[0], atol=1e-6)
+
+        # concurrent requests are batched together and each gets its own rows.
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda i: service.predict([texts[i % 4]]), range(32)))
+        for i, (request_theta, _) in enumerate(results):
+            assert np.allclose(request_theta[0], theta[i % 4], atol=1e-6)
+
+
+def test_fold_batchnorm():
+    linear = torch.nn.Linear(6, 4)
+    bn = torch.nn.BatchNorm1d(4)
+    bn.running_mean.uniform_(-1, 1)
+    bn.running_var.uniform_(0.5, 2)
+    bn.weight.data.uniform_(0.5, 2)
+    bn.bias.data.uniform_(-1, 1)
+    bn.eval()
+
+    x = torch.randn(5, 6)
+    with torch.no_grad():
+        assert torch.allclose(fold_batchnorm(linear, bn)(x), bn(linear(x)), atol=1e-6)
+
+
+def test_export_encoder(tmp_path):
+    model = build_model(ecrtm_args(), len(VOCAB))
+    model.mean_bn.running_mean.uniform_(-1, 1)
+    model.mean_bn.running_var.uniform_(0.5, 2)
+    model.eval()
+
+    path = str(tmp_path / 'encoder.pt')
+    export_encoder(model, path, VOCAB)
+    bow = np.random.randint(0, 3, size=(5, len(VOCAB))).astype('float32')
+    np.save(str(tmp_path / 'bow.npy'), bow)
+
+    # the artifact is loaded and run without importing topmost.
+    code = (f'import runpy, sys, numpy as np; loader = runpy.run_path({LOADER_PATH!r}); '
+            f'encoder = loader["load_encoder"]({path!r}); '
+            f'np.save({str(tmp_path / "theta.npy")!r}, encoder(np.load({str(tmp_path / "bow.npy")!r}))); '
+            f'assert encoder.vocab == {VOCAB!r}; assert "topmost" not in sys.modules')
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+    with torch.no_grad():
+        expected = model.get_theta(torch.as_tensor(bow)).numpy()
+    assert np.allclose(np.load(str(tmp_path / 'theta.npy')), expected, atol=1e-5)
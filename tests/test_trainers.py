@@ -0,0 +1,130 @@
+import pytest
+import numpy as np
+import torch
+
+import sys
+sys.path.append('../')
+
+from topmost.trainers.checkpoint import CheckpointManager, load_checkpoint, get_rng_state, set_rng_state
+from topmost.trainers.SAM_function.LookaheadSAM import AOSAM
+from topmost.trainers.inference import infer_theta
+from topmost.trainers.evaluation_callbacks import Evaluator, EarlyStopping, TopicDiversityCallback
+from topmost.trainers.basic.basic_trainer import BasicTrainer
+from topmost.trainers.hierarchical.hierarchical_trainer import HierarchicalTrainer
+from topmost.trainers.precision import check_precision
+from topmost.utils import static_utils
+
+
+def test_checkpoint_rotation(tmp_path):
+    manager = CheckpointManager(str(tmp_path), interval=2, keep=2)
+    assert not manager.should_save(1)
+    assert manager.should_save(1, last_epoch=True)
+
+    for epoch in (2, 4, 6, 10):
+        manager.save(epoch, {'epoch': epoch})
+
+    assert [path[-8:] for path in manager.list_checkpoints()] == ['00006.pt', '00010.pt']
+    assert load_checkpoint(str(tmp_path))['epoch'] == 10
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_rng_state():
+    state = get_rng_state()
+    expected = torch.rand(3)
+    set_rng_state(state)
+    assert torch.equal(torch.rand(3), expected)
+
+
+def test_aosam_state_dict():
+    model = torch.nn.Linear(4, 2)
+    optimizer = AOSAM(model.parameters(), torch.optim.SGD, device='cpu', lr=0.1)
+    for _ in range(3):
+        model(torch.randn(8, 4)).pow(2).sum().backward()
+        use_sam, grad_norm = optimizer.update_statistics(0.3)
+        optimizer.first_step(zero_grad=True, grad_norm=grad_norm)
+        model(torch.randn(8, 4)).pow(2).sum().backward()
+        optimizer.second_step(zero_grad=True)
+
+    resumed = AOSAM(model.parameters(), torch.optim.SGD, device='cpu', lr=0.1)
+    resumed.load_state_dict(optimizer.state_dict())
+    assert torch.equal(resumed.mu_t, optimizer.mu_t)
+    assert torch.equal(resumed.sigma_t, optimizer.sigma_t)
+    assert resumed.base_optimizer.param_groups is resumed.param_groups
+
+
+def test_infer_theta(tmp_path):
+    bow = torch.rand(25, 6)
+    layer = torch.nn.Linear(6, 4)
+    get_theta = lambda batch: torch.softmax(layer(batch), dim=-1)
+    expected = get_theta(bow).detach().numpy()
+
+    theta, argmax = infer_theta(get_theta, [bow], batch_size=10)
+    assert np.allclose(theta, expected, atol=1e-6)
+    assert np.array_equal(argmax, expected.argmax(1))
+
+    path = str(tmp_path / 'theta.npy')
+    infer_theta(get_theta, [bow], batch_size=7, output=path)
+    assert np.allclose(np.load(path), expected, atol=1e-6)
+
+
+def test_evaluator_state_dict():
+    evaluator = Evaluator([TopicDiversityCallback(time_budget=1.)], interval=2, early_stopping=EarlyStopping(patience=3))
+    evaluator.callbacks[0].interval_scale = 4
+    evaluator.early_stopping.update(0.5)
+    evaluator.early_stopping.update(0.4)
+    evaluator.history.append({'epoch': 2, 'NMI': 0.5})
+
+    resumed = Evaluator([TopicDiversityCallback(time_budget=1.)], interval=2, early_stopping=EarlyStopping(patience=3))
+    resumed.load_state_dict(evaluator.state_dict())
+    assert resumed.callbacks[0].interval_scale == 4
+    assert resumed.early_stopping.best == 0.5
+    assert resumed.early_stopping.num_bad == 1
+    assert resumed.history == evaluator.history
+
+
+class BetaModel(torch.nn.Module):
+    # get_beta of a basic model, or the betas of all layers of a hierarchical model.
+    def __init__(self, beta_list, hierarchical=False):
+        super().__init__()
+        self.beta_list = beta_list
+        self.hierarchical = hierarchical
+
+    def get_beta(self):
+        return self.beta_list if self.hierarchical else self.beta_list[-1]
+
+
+def test_save_artifacts(tmp_path):
+    torch.manual_seed(0)
+    vocab = [f'word{i}' for i in range(30)]
+    # distinct values in each row, so the top words have no ties.
+    beta_list = [torch.stack([torch.randperm(len(vocab)).float() for _ in range(num_topics)]) / len(vocab)
+                 for num_topics in (2, 4)]
+
+    for trainer in (BasicTrainer(BetaModel(beta_list), device='cpu'),
+                    HierarchicalTrainer(BetaModel(beta_list, hierarchical=True), device='cpu')):
+        beta, top_words = trainer.save_artifacts(vocab, str(tmp_path), num_top_words_list=(5, 10))
+
+        assert np.array_equal(np.load(str(tmp_path / 'beta.npy')), beta_list[-1].numpy())
+        assert np.array_equal(beta, beta_list[-1].numpy())
+        for k in (5, 10):
+            expected = static_utils.print_topic_words(beta_list[-1].numpy(), vocab, k)
+            assert top_words[k] == expected
+            with open(str(tmp_path / f'top_words_{k}.txt')) as file:
+                assert file.read().splitlines() == expected
+
+
+def test_save_top_words(tmp_path):
+    vocab = ['a', 'b', 'c', 'd']
+    top_words = static_utils.save_top_words(np.asarray([[2, 0, 1], [3, 1, 0]]), vocab, [1, 3], str(tmp_path))
+    assert top_words == {1: ['c', 'd'], 3: ['c a b', 'd b a']}
+    with open(str(tmp_path / 'top_words_3.txt')) as file:
+        assert file.read() == 'c a b\nd b a\n'
+
+
+def test_check_precision():
+    assert check_precision('bf16', 'cpu') == 'bf16'
+    assert check_precision('fp16', 'cuda:0') == 'fp16'
+    with pytest.raises(ValueError):
+        check_precision('fp16', 'cpu')
+    with pytest.raises(ValueError):
+        BasicTrainer(BetaModel([torch.rand(2, 3)]), device='cpu', precision='fp16')
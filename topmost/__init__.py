@@ -1,5 +1,12 @@
-from . import models
-from . import data
-from . import evaluations
-from . import trainers
-from . import preprocessing
+# submodules are imported on first access, e.g., topmost.models.
+from .utils.lazy_import import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'models': None,
+    'data': None,
+    'evaluations': None,
+    'trainers': None,
+    'preprocessing': None,
+    'ot': None,
+    'serving': None,
+})
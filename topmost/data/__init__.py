@@ -1,6 +1,12 @@
-from .basic_dataset_handler import BasicDatasetHandler
-from .basic_dataset_handler import RawDatasetHandler
-from .crosslingual_dataset_handler import CrosslingualDatasetHandler
-from .dynamic_dataset_handler import DynamicDatasetHandler
+# dataset handlers are imported on first access.
+from ..utils.lazy_import import lazy_exports
 
-from .download import download_dataset
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'BasicDatasetHandler': '.basic_dataset_handler',
+    'RawDatasetHandler': '.basic_dataset_handler',
+    'CrosslingualDatasetHandler': '.crosslingual_dataset_handler',
+    'DynamicDatasetHandler': '.dynamic_dataset_handler',
+    'SparseBow': '.sparse_bow',
+
+    'download_dataset': '.download',
+})
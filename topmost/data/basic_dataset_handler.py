@@ -4,15 +4,31 @@ import numpy as np
 import scipy.sparse
 import scipy.io
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 from . import file_utils
+from .sparse_bow import SparseBow
+from . import lazy_dataset
+from .embedding_cache import EmbeddingCache, EMBEDDING_CACHE_DIR
 import os
 
 
-def load_contextual_embed(texts, device, model_name="all-mpnet-base-v2", show_progress_bar=True):
-    model = SentenceTransformer(model_name, device=device)
-    embeddings = model.encode(texts, show_progress_bar=show_progress_bar)
-    return embeddings
+def load_contextual_embed(texts, device, model_name="all-mpnet-base-v2", show_progress_bar=True, cache_dir=EMBEDDING_CACHE_DIR, batch_size=256):
+    '''
+        cache_dir: directory of the EmbeddingCache; only texts not in the cache are encoded,
+            and the model is not loaded when all are. None: always encode.
+    '''
+    model = None
+
+    def encode(texts, batch_size):
+        nonlocal model
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name, device=device)
+        return model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+
+    texts = [str(text) for text in texts]
+    if cache_dir is None:
+        return encode(texts, batch_size)
+    return EmbeddingCache(model_name, cache_dir).encode(texts, encode, batch_size=batch_size)
 
 
 class DatasetHandler(Dataset):
@@ -31,29 +47,75 @@ class DatasetHandler(Dataset):
         if torch.is_tensor(idx):
             idx = idx.tolist()
 
+        # a list of indices comes from batch_dataloader; return it like default_collate would.
+        item_idx = torch.as_tensor(idx) if isinstance(idx, list) else idx
+
         if self.contextual_embed is None:
             return {
-                'idx': idx,
+                'idx': item_idx,
                 'data': self.data[idx]
             }
 
         return {
-            'idx': idx,
+            'idx': item_idx,
             'data': self.data[idx],
             'contextual_embed': self.contextual_embed[idx]
         }
 
+    def get_batch(self, idx):
+        # idx: a LongTensor on the device of the data.
+        batch = {
+            'idx': idx,
+            'data': self.data.index_select(0, idx) if torch.is_tensor(self.data) else self.data[idx]
+        }
+        if self.contextual_embed is not None:
+            batch['contextual_embed'] = self.contextual_embed.index_select(0, idx)
+        return batch
+
     def to(self, device):
         self.data = self.data.to(device)  
         if self.contextual_embed is not None:
             self.contextual_embed = self.contextual_embed.to(device)  
 
 
+class DeviceBatchLoader:
+    '''
+        Iterate over batches of a DatasetHandler whose tensors are already on the device.
+
+        A permutation is drawn on the device once per epoch and each batch is gathered
+        with one index_select per tensor, instead of per-item __getitem__ calls and
+        default_collate stacking. Yields the same dicts as a DataLoader over the DatasetHandler.
+    '''
+    def __init__(self, dataset, batch_size=200, shuffle=False, drop_last=False):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.dataset) // self.batch_size
+        return (len(self.dataset) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        data_size = len(self.dataset)
+        device = self.dataset.data.device
+        if self.shuffle:
+            order = torch.randperm(data_size, device=device)
+        else:
+            order = torch.arange(data_size, device=device)
+
+        for idx in torch.split(order, self.batch_size):
+            if self.drop_last and len(idx) < self.batch_size:
+                break
+            yield self.dataset.get_batch(idx)
+
+
 class RawDatasetHandler:
     def __init__(self, docs, preprocessing, batch_size=200, device='cuda', as_tensor=False, contextual_embed=False):
 
         rst = preprocessing.preprocess(docs)
-        self.train_data = rst['train_bow']
+        self.train_data = rst['train_bow'].toarray()
         self.train_texts = rst['train_texts']
         self.vocab = rst['vocab']
 
@@ -76,12 +138,17 @@ class RawDatasetHandler:
 
 
 class BasicDatasetHandler:
-    def __init__(self, dataset_dir, batch_size=200, read_labels=False, device='cuda', as_tensor=False, contextual_embed=False):
+    def __init__(self, dataset_dir, batch_size=200, read_labels=False, device='cuda', as_tensor=False, contextual_embed=False, sparse=False, lazy=False):
         # train_bow: NxV
         # test_bow: Nxv
         # word_emeddings: VxD
         # vocab: V, ordered by word id.
+        # sparse: keep train_bow/test_bow in CSR format and densify each batch when it is drawn.
+        # lazy: memory-map the dataset from {dataset_dir}/lazy (written on first use);
+        #       texts, labels and contextual embeddings are read only when accessed.
 
+        self.sparse = sparse
+        self.lazy = lazy
         self.load_data(dataset_dir, read_labels)
         self.vocab_size = len(self.vocab)
 
@@ -92,14 +159,19 @@ class BasicDatasetHandler:
             self.train_bow.sum(1).sum() / self.train_bow.shape[0]))
 
         if contextual_embed:
-            if os.path.isfile(os.path.join(dataset_dir, 'with_bert', 'train_bert.npz')):
+            lazy_dir = os.path.join(dataset_dir, lazy_dataset.LAZY_DIR)
+            if lazy and os.path.isfile(os.path.join(lazy_dir, 'train_bert.npy')):
+                self.train_contextual_embed = np.load(os.path.join(lazy_dir, 'train_bert.npy'), mmap_mode='c')
+            elif os.path.isfile(os.path.join(dataset_dir, 'with_bert', 'train_bert.npz')):
                 self.train_contextual_embed = np.load(os.path.join(
                     dataset_dir, 'with_bert', 'train_bert.npz'))['arr_0']
             else:
                 self.train_contextual_embed = load_contextual_embed(
                     self.train_texts, device)
 
-            if os.path.isfile(os.path.join(dataset_dir, 'with_bert', 'test_bert.npz')):
+            if lazy and os.path.isfile(os.path.join(lazy_dir, 'test_bert.npy')):
+                self.test_contextual_embed = np.load(os.path.join(lazy_dir, 'test_bert.npy'), mmap_mode='c')
+            elif os.path.isfile(os.path.join(dataset_dir, 'with_bert', 'test_bert.npz')):
                 self.test_contextual_embed = np.load(os.path.join(
                     dataset_dir, 'with_bert', 'test_bert.npz'))['arr_0']
             else:
@@ -118,8 +190,12 @@ class BasicDatasetHandler:
             self.train_data = self.train_bow
             self.test_data = self.test_bow
 
-            self.train_data = torch.from_numpy(self.train_data).to(device)
-            self.test_data = torch.from_numpy(self.test_data).to(device)
+            if sparse:
+                self.train_data = SparseBow(self.train_data, device)
+                self.test_data = SparseBow(self.test_data, device)
+            else:
+                self.train_data = torch.from_numpy(self.train_data).to(device)
+                self.test_data = torch.from_numpy(self.test_data).to(device)
             print("1.0.2")
             if contextual_embed:
 
@@ -133,9 +209,9 @@ class BasicDatasetHandler:
                 test_dataset = DatasetHandler(
                     self.test_data, self.test_contextual_embed)
                 print("1.0.4")
-                self.train_dataloader = DataLoader(
+                self.train_dataloader = DeviceBatchLoader(
                     train_dataset, batch_size=batch_size, shuffle=True)
-                self.test_dataloader = DataLoader(
+                self.test_dataloader = DeviceBatchLoader(
                     test_dataset, batch_size=batch_size, shuffle=False)
                 print("Done 1.")
 
@@ -143,17 +219,23 @@ class BasicDatasetHandler:
                 train_dataset = DatasetHandler(self.train_data)
                 test_dataset = DatasetHandler(self.test_data)
 
-                self.train_dataloader = DataLoader(
+                self.train_dataloader = DeviceBatchLoader(
                     train_dataset, batch_size=batch_size, shuffle=True)
-                self.test_dataloader = DataLoader(
+                self.test_dataloader = DeviceBatchLoader(
                     test_dataset, batch_size=batch_size, shuffle=False)
 
     def load_data(self, path, read_labels):
+        if self.lazy:
+            self.load_lazy_data(path, read_labels)
+            return
 
         self.train_bow = scipy.sparse.load_npz(
-            f'{path}/train_bow.npz').toarray().astype('float32')
+            f'{path}/train_bow.npz').astype('float32').tocsr()
         self.test_bow = scipy.sparse.load_npz(
-            f'{path}/test_bow.npz').toarray().astype('float32')
+            f'{path}/test_bow.npz').astype('float32').tocsr()
+        if not self.sparse:
+            self.train_bow = self.train_bow.toarray()
+            self.test_bow = self.test_bow.toarray()
         self.pretrained_WE = scipy.sparse.load_npz(
             f'{path}/word_embeddings.npz').toarray().astype('float32')
 
@@ -167,6 +249,28 @@ class BasicDatasetHandler:
 
         self.vocab = file_utils.read_text(f'{path}/vocab.txt')
 
+    def load_lazy_data(self, path, read_labels):
+        if not lazy_dataset.has_lazy_dataset(path):
+            lazy_dataset.export_lazy_dataset(path)
+
+        lazy_dir = os.path.join(path, lazy_dataset.LAZY_DIR)
+
+        self.train_bow = lazy_dataset.load_csr(f'{lazy_dir}/train_bow')
+        self.test_bow = lazy_dataset.load_csr(f'{lazy_dir}/test_bow')
+        if not self.sparse:
+            self.train_bow = self.train_bow.toarray().astype('float32')
+            self.test_bow = self.test_bow.toarray().astype('float32')
+        self.pretrained_WE = lazy_dataset.load_csr(f'{lazy_dir}/word_embeddings').toarray().astype('float32')
+
+        self.train_texts = lazy_dataset.LazyTexts(f'{lazy_dir}/train_texts')
+        self.test_texts = lazy_dataset.LazyTexts(f'{lazy_dir}/test_texts')
+
+        if read_labels:
+            self.train_labels = np.load(f'{lazy_dir}/train_labels.npy', mmap_mode='r')
+            self.test_labels = np.load(f'{lazy_dir}/test_labels.npy', mmap_mode='r')
+
+        self.vocab = file_utils.read_text(f'{lazy_dir}/vocab.txt')
+
 
     def to(self, device):
         # Chuyển dữ liệu sang thiết bị mong muốn
@@ -5,19 +5,23 @@ import torch
 from collections import defaultdict
 from torch.utils.data import Dataset, DataLoader
 from . import file_utils
+from .sparse_bow import SparseBow, batch_dataloader
 
 
 class BilingualTextDataset(Dataset):
     def __init__(self, bow_en, bow_cn):
         self.bow_en = bow_en
         self.bow_cn = bow_cn
-        self.bow_size_en = len(self.bow_en)
-        self.bow_size_cn = len(self.bow_cn)
+        self.bow_size_en = self.bow_en.shape[0]
+        self.bow_size_cn = self.bow_cn.shape[0]
 
     def __len__(self):
         return max(self.bow_size_en, self.bow_size_cn)
 
     def __getitem__(self, index):
+        if isinstance(index, list):
+            # a batch of indices from batch_dataloader.
+            index = torch.as_tensor(index)
         return_dict = {
             'bow_en': self.bow_en[(index % self.bow_size_en)],
             'bow_cn': self.bow_cn[(index % self.bow_size_cn)]
@@ -26,8 +30,10 @@ class BilingualTextDataset(Dataset):
 
 
 class CrosslingualDatasetHandler:
-    def __init__(self, dataset_dir, lang1, lang2, dict_path, device='cpu', batch_size=200, as_tensor=True):
+    def __init__(self, dataset_dir, lang1, lang2, dict_path, device='cpu', batch_size=200, as_tensor=True, sparse=False):
+        # sparse: keep the bow matrices in CSR format and densify each batch when it is drawn.
         self.batch_size = batch_size
+        self.sparse = sparse
 
         self.train_texts_en, self.test_texts_en, self.train_bow_en, self.test_bow_en, self.train_labels_en, self.test_labels_en, self.vocab_en, self.word2id_en, self.id2word_en = self.read_data(dataset_dir, lang=lang1)
         self.train_texts_cn, self.test_texts_cn, self.train_bow_cn, self.test_bow_cn, self.train_labels_cn, self.test_labels_cn, self.vocab_cn, self.word2id_cn, self.id2word_cn = self.read_data(dataset_dir, lang=lang2)
@@ -51,10 +57,13 @@ class CrosslingualDatasetHandler:
             self.train_bow_cn = self.move_to_device(self.train_bow_cn, device)
             self.test_bow_cn = self.move_to_device(self.test_bow_cn, device)
 
-            self.train_dataloader = DataLoader(BilingualTextDataset(self.train_bow_en, self.train_bow_cn), batch_size=batch_size, shuffle=True)
-            self.test_dataloader = DataLoader(BilingualTextDataset(self.test_bow_en, self.test_bow_cn), batch_size=batch_size, shuffle=False)
+            make_dataloader = batch_dataloader if sparse else DataLoader
+            self.train_dataloader = make_dataloader(BilingualTextDataset(self.train_bow_en, self.train_bow_cn), batch_size=batch_size, shuffle=True)
+            self.test_dataloader = make_dataloader(BilingualTextDataset(self.test_bow_en, self.test_bow_cn), batch_size=batch_size, shuffle=False)
 
     def move_to_device(self, bow, device):
+        if self.sparse:
+            return SparseBow(bow, device)
         return torch.as_tensor(bow, device=device).float()
 
     def read_data(self, dataset_dir, lang):
@@ -64,8 +73,11 @@ class CrosslingualDatasetHandler:
         word2id = dict(zip(vocab, range(len(vocab))))
         id2word = dict(zip(range(len(vocab)), vocab))
 
-        train_bow = scipy.sparse.load_npz(os.path.join(dataset_dir, 'train_bow_matrix_{}.npz'.format(lang))).toarray()
-        test_bow = scipy.sparse.load_npz(os.path.join(dataset_dir, 'test_bow_matrix_{}.npz'.format(lang))).toarray()
+        train_bow = scipy.sparse.load_npz(os.path.join(dataset_dir, 'train_bow_matrix_{}.npz'.format(lang))).tocsr()
+        test_bow = scipy.sparse.load_npz(os.path.join(dataset_dir, 'test_bow_matrix_{}.npz'.format(lang))).tocsr()
+        if not self.sparse:
+            train_bow = train_bow.toarray()
+            test_bow = test_bow.toarray()
 
         train_labels = np.loadtxt(f'{dataset_dir}/train_labels_{lang}.txt').astype('int32')
         test_labels = np.loadtxt(f'{dataset_dir}/test_labels_{lang}.txt').astype('int32')
@@ -97,7 +109,7 @@ class CrosslingualDatasetHandler:
         return trans_dict, trans_matrix_en, trans_matrix_cn
 
     def get_Map(self, trans_matrix, bow):
-        Map = (trans_matrix * bow.sum(0)[:, np.newaxis]).astype('float32')
+        Map = (trans_matrix * np.asarray(bow.sum(0)).reshape(-1)[:, np.newaxis]).astype('float32')
         Map = Map + 1
         Map_sum = np.sum(Map, axis=1)
         t_index = Map_sum > 0
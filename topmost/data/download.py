@@ -1,9 +1,9 @@
 import os
 import zipfile
-from torchvision.datasets.utils import download_url
 
 
 def download_dataset(dataset_name, cache_path="~/.topmost"):
+    from torchvision.datasets.utils import download_url
     cache_path = os.path.expanduser(cache_path)
     raw_filename = f'{dataset_name}.zip'
 
@@ -4,6 +4,7 @@ import numpy as np
 import scipy.sparse
 import scipy.io
 from . import file_utils
+from .sparse_bow import SparseBow, batch_dataloader
 
 
 class SequentialDataset(Dataset):
@@ -27,24 +28,29 @@ class SequentialDataset(Dataset):
 
 
 class DynamicDatasetHandler:
-    def __init__(self, dataset_dir, batch_size=200, read_labels=False, device='cpu', as_tensor=False):
-
+    def __init__(self, dataset_dir, batch_size=200, read_labels=False, device='cpu', as_tensor=False, sparse=False):
+        # sparse: keep train_bow/test_bow in CSR format and densify each batch when it is drawn.
+        self.sparse = sparse
         self.load_data(dataset_dir, read_labels)
 
         self.vocab_size = len(self.vocab)
-        self.train_size = len(self.train_bow)
+        self.train_size = self.train_bow.shape[0]
         self.num_times = len(np.unique(self.train_times))
         self.train_time_wordfreq = self.get_time_wordfreq(self.train_bow, self.train_times)
 
-        print('===>Info: all train size: ', len(self.train_bow))
-        print('===>Info: all test size: ', len(self.test_bow))
+        print('===>Info: all train size: ', self.train_bow.shape[0])
+        print('===>Info: all test size: ', self.test_bow.shape[0])
         print('===>Info: all vocab size: ', len(self.vocab))
         print('===>Info: average length: {:.3f}'.format(self.train_bow.sum(1).mean().item()))
         print('===>Info: num of each time slice: ', self.num_times, np.bincount(self.train_times))
 
         if as_tensor:
-            self.train_bow = torch.from_numpy(self.train_bow).float().to(device)
-            self.test_bow = torch.from_numpy(self.test_bow).float().to(device)
+            if sparse:
+                self.train_bow = SparseBow(self.train_bow, device)
+                self.test_bow = SparseBow(self.test_bow, device)
+            else:
+                self.train_bow = torch.from_numpy(self.train_bow).float().to(device)
+                self.test_bow = torch.from_numpy(self.test_bow).float().to(device)
             self.train_times = torch.from_numpy(self.train_times).long().to(device)
             self.test_times = torch.from_numpy(self.test_times).long().to(device)
             self.train_time_wordfreq = torch.from_numpy(self.train_time_wordfreq).float().to(device)
@@ -52,11 +58,17 @@ class DynamicDatasetHandler:
             self.train_dataset = SequentialDataset(self.train_bow, self.train_times, self.train_time_wordfreq)
             self.test_dataset = SequentialDataset(self.test_bow, self.test_times, self.train_time_wordfreq)
 
-            self.train_dataloader = DataLoader(self.train_dataset, batch_size=batch_size, shuffle=True)
+            if sparse:
+                self.train_dataloader = batch_dataloader(self.train_dataset, batch_size=batch_size, shuffle=True)
+            else:
+                self.train_dataloader = DataLoader(self.train_dataset, batch_size=batch_size, shuffle=True)
 
     def load_data(self, path, read_labels):
-        self.train_bow = scipy.sparse.load_npz(f'{path}/train_bow.npz').toarray().astype('float32')
-        self.test_bow = scipy.sparse.load_npz(f'{path}/test_bow.npz').toarray().astype('float32')
+        self.train_bow = scipy.sparse.load_npz(f'{path}/train_bow.npz').astype('float32').tocsr()
+        self.test_bow = scipy.sparse.load_npz(f'{path}/test_bow.npz').astype('float32').tocsr()
+        if not self.sparse:
+            self.train_bow = self.train_bow.toarray()
+            self.test_bow = self.test_bow.toarray()
         self.word_embeddings = scipy.sparse.load_npz(f'{path}/word_embeddings.npz').toarray().astype('float32')
 
         self.train_texts = file_utils.read_text(f'{path}/train_texts.txt')
@@ -76,7 +88,7 @@ class DynamicDatasetHandler:
         train_time_wordfreq = np.zeros((self.num_times, self.vocab_size))
         for time in range(self.num_times):
             idx = np.where(times == time)[0]
-            train_time_wordfreq[time] += bow[idx].sum(0)
+            train_time_wordfreq[time] += np.asarray(bow[idx].sum(0)).reshape(-1)
         cnt_times = np.bincount(times)
 
         train_time_wordfreq = train_time_wordfreq / cnt_times[:, np.newaxis]
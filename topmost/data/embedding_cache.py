@@ -0,0 +1,98 @@
+import os
+import re
+import hashlib
+import numpy as np
+
+
+# default location of the embedding cache; shared by all datasets and runs.
+EMBEDDING_CACHE_DIR = os.environ.get('TOPMOST_EMBEDDING_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'topmost', 'embeddings'))
+
+KEY_DTYPE = 'S40'
+
+
+def text_key(text):
+    # hex digest: numpy byte strings drop trailing zero bytes, which a raw digest can have.
+    return hashlib.sha1(text.encode('utf-8')).hexdigest().encode('ascii')
+
+
+class EmbeddingCache:
+    '''
+        Content-addressed cache of text embeddings of one model.
+
+        Embeddings are keyed by the SHA-1 of the text and stored in float16 shards under
+        {cache_dir}/{model_name}: shard_{hash}.npy with the embeddings and shard_{hash}.keys.npy
+        with the keys of its rows. Shards are only added, never modified, and are memory-mapped
+        on load. Each shard is named after the hash of its keys, so concurrent runs never write
+        to the same file; a shard whose keys file is missing is ignored.
+    '''
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.cache_dir = os.path.join(cache_dir, re.sub(r'[^\w.-]', '_', model_name))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.shards = dict()
+        self.index = dict()
+        self.load_index()
+
+    def load_index(self):
+        for name in sorted(os.listdir(self.cache_dir)):
+            if not name.endswith('.keys.npy'):
+                continue
+            shard = name[:-len('.keys.npy')]
+            if shard in self.shards:
+                continue
+            keys = np.load(os.path.join(self.cache_dir, name))
+            self.shards[shard] = np.load(os.path.join(self.cache_dir, f'{shard}.npy'), mmap_mode='r')
+            self.index.update(zip(keys.tolist(), ((shard, row) for row in range(len(keys)))))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, text):
+        return text_key(text) in self.index
+
+    def add(self, keys, embeddings):
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        shard = 'shard_' + hashlib.sha1(keys.tobytes()).hexdigest()[:16]
+        path = os.path.join(self.cache_dir, shard)
+
+        # the embeddings are written first, the keys file last, both with an atomic rename.
+        for suffix, array in (('.npy', np.asarray(embeddings, dtype='float16')), ('.keys.npy', keys)):
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                np.save(file, array)
+            os.replace(tmp_path, f'{path}{suffix}')
+
+        self.load_index()
+
+    def lookup(self, keys):
+        shards, rows = zip(*[self.index[key] for key in keys])
+        shards = np.asarray(shards)
+        rows = np.asarray(rows)
+
+        dim = next(iter(self.shards.values())).shape[1]
+        embeddings = np.empty((len(keys), dim), dtype='float32')
+        for shard in np.unique(shards):
+            positions = np.flatnonzero(shards == shard)
+            embeddings[positions] = self.shards[shard][rows[positions]]
+        return embeddings
+
+    def encode(self, texts, encode_fn, batch_size=256, shard_size=100000):
+        '''
+            Embeddings (float32) of texts. Only texts missing from the cache are passed to encode_fn,
+            in chunks of shard_size distinct texts; encode_fn(texts, batch_size) returns their embeddings.
+        '''
+        keys = [text_key(text) for text in texts]
+        if not keys:
+            return np.zeros((0, 0), dtype='float32')
+
+        missing = dict()
+        for key, text in zip(keys, texts):
+            if key not in self.index and key not in missing:
+                missing[key] = text
+
+        missing = list(missing.items())
+        for start in range(0, len(missing), shard_size):
+            chunk_keys, chunk_texts = zip(*missing[start:start + shard_size])
+            self.add(chunk_keys, encode_fn(list(chunk_texts), batch_size))
+
+        return self.lookup(keys)
@@ -21,11 +21,13 @@ def save_text(texts, path):
 
 
 def read_jsonlist(path):
-    data = list()
+    return list(iter_jsonlist(path))
+
+
+def iter_jsonlist(path):
     with open(path, 'r', encoding='utf-8') as input_file:
         for line in input_file:
-            data.append(json.loads(line))
-    return data
+            yield json.loads(line)
 
 
 def save_jsonlist(list_of_json_objects, path, sort_keys=True):
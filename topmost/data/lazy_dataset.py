@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import scipy.sparse
+from . import file_utils
+
+
+# subdirectory of a dataset that holds its memory-mapped copy.
+LAZY_DIR = 'lazy'
+
+
+def save_csr(matrix, path):
+    matrix = scipy.sparse.csr_matrix(matrix)
+    np.save(f'{path}.indptr.npy', matrix.indptr.astype('int64'))
+    np.save(f'{path}.indices.npy', matrix.indices.astype('int32'))
+    np.save(f'{path}.data.npy', matrix.data)
+    np.save(f'{path}.shape.npy', np.asarray(matrix.shape, dtype='int64'))
+
+
+def load_csr(path):
+    indptr = np.load(f'{path}.indptr.npy', mmap_mode='r')
+    indices = np.load(f'{path}.indices.npy', mmap_mode='r')
+    data = np.load(f'{path}.data.npy', mmap_mode='r')
+    shape = tuple(np.load(f'{path}.shape.npy'))
+    return scipy.sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+def save_texts(texts, path):
+    # all texts as utf-8 bytes in one file, plus the offset of each text.
+    offsets = [0]
+    with open(f'{path}.bin', 'wb') as file:
+        for text in texts:
+            encoded = text.strip().encode('utf-8')
+            file.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+    np.save(f'{path}.offsets.npy', np.asarray(offsets, dtype='int64'))
+
+
+class LazyTexts:
+    '''
+        A read-only list of texts backed by a memory-mapped file.
+        A text is decoded only when it is accessed.
+    '''
+    def __init__(self, path):
+        self.offsets = np.load(f'{path}.offsets.npy', mmap_mode='r')
+        if self.offsets[-1] > 0:
+            self.buffer = np.memmap(f'{path}.bin', dtype='uint8', mode='r')
+        else:
+            self.buffer = np.zeros(0, dtype='uint8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.buffer[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def export_lazy_dataset(dataset_dir):
+    '''
+        Write the memory-mapped copy of a dataset into {dataset_dir}/lazy.
+        This is done once; later runs (also concurrent ones) map the same files.
+    '''
+    lazy_dir = os.path.join(dataset_dir, LAZY_DIR)
+    file_utils.make_dir(lazy_dir)
+
+    for name in ('train_bow', 'test_bow', 'word_embeddings'):
+        save_csr(scipy.sparse.load_npz(os.path.join(dataset_dir, f'{name}.npz')), os.path.join(lazy_dir, name))
+
+    for split in ('train', 'test'):
+        save_texts(file_utils.read_text(os.path.join(dataset_dir, f'{split}_texts.txt')), os.path.join(lazy_dir, f'{split}_texts'))
+
+        labels_path = os.path.join(dataset_dir, f'{split}_labels.txt')
+        if os.path.isfile(labels_path):
+            np.save(os.path.join(lazy_dir, f'{split}_labels.npy'), np.loadtxt(labels_path, dtype=int))
+
+        bert_path = os.path.join(dataset_dir, 'with_bert', f'{split}_bert.npz')
+        if os.path.isfile(bert_path):
+            np.save(os.path.join(lazy_dir, f'{split}_bert.npy'), np.load(bert_path)['arr_0'])
+
+    # written last, so an interrupted export is redone.
+    file_utils.save_text(file_utils.read_text(os.path.join(dataset_dir, 'vocab.txt')), os.path.join(lazy_dir, 'vocab.txt'))
+
+
+def has_lazy_dataset(dataset_dir):
+    return os.path.isfile(os.path.join(dataset_dir, LAZY_DIR, 'vocab.txt'))
@@ -0,0 +1,78 @@
+import numpy as np
+import scipy.sparse
+import torch
+from torch.utils.data import DataLoader, BatchSampler, RandomSampler, SequentialSampler
+
+
+class SparseBow:
+    '''
+        A bag-of-words matrix kept in CSR format (crow_indices, col_indices, values) on a device.
+
+        Indexing rows returns a dense float tensor, so a batch is densified only when it is drawn
+        and the models receive the same dense input as before. An NxV corpus costs memory
+        proportional to its number of nonzeros instead of N*V.
+    '''
+    def __init__(self, bow, device='cpu'):
+        if isinstance(bow, SparseBow):
+            crow, col, values, shape = bow.crow, bow.col, bow.values, bow.shape
+        else:
+            bow = scipy.sparse.csr_matrix(bow, dtype='float32')
+            bow.sort_indices()
+            crow = torch.from_numpy(bow.indptr.astype('int64'))
+            col = torch.from_numpy(bow.indices.astype('int64'))
+            values = torch.from_numpy(bow.data)
+            shape = bow.shape
+
+        self.crow = crow.to(device)
+        self.col = col.to(device)
+        self.values = values.to(device)
+        self.shape = tuple(shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def device(self):
+        return self.values.device
+
+    def to(self, device):
+        return SparseBow(self, device)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self.rows(torch.as_tensor([idx]))[0]
+        if isinstance(idx, slice):
+            return self.rows(torch.arange(self.shape[0])[idx])
+        return self.rows(torch.as_tensor(idx))
+
+    def rows(self, idx):
+        '''
+            Gather rows into a dense BxV tensor with a few vectorized ops.
+        '''
+        idx = idx.to(self.device).long()
+        start = self.crow[idx]
+        length = self.crow[idx + 1] - start
+
+        # position of each gathered nonzero in self.col/self.values.
+        row = torch.repeat_interleave(torch.arange(len(idx), device=self.device), length)
+        offset = torch.arange(len(row), device=self.device) - torch.repeat_interleave(torch.cumsum(length, 0) - length, length)
+        pos = start[row] + offset
+
+        dense = torch.zeros((len(idx), self.shape[1]), dtype=self.values.dtype, device=self.device)
+        dense[row, self.col[pos]] = self.values[pos]
+        return dense
+
+    def to_sparse_csr(self):
+        return torch.sparse_csr_tensor(self.crow, self.col, self.values, size=self.shape)
+
+    def to_dense(self):
+        return self.rows(torch.arange(self.shape[0]))
+
+
+def batch_dataloader(dataset, batch_size=200, shuffle=False):
+    '''
+        A DataLoader that passes a whole batch of indices to dataset.__getitem__,
+        so that sparse rows are gathered and densified once per batch instead of once per item.
+    '''
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None)
@@ -1,15 +1,23 @@
-from .topic_diversity import compute_topic_diversity
-from .topic_diversity import multiaspect_topic_diversity
+# metrics are imported on first access.
+from ..utils.lazy_import import lazy_exports
 
-from .clustering import evaluate_clustering
-from .clustering import evaluate_clustering_with_amax
-from .clustering import hierarchical_clustering
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'compute_topic_diversity': '.topic_diversity',
+    'multiaspect_topic_diversity': '.topic_diversity',
 
-from .classification import evaluate_classification
-from .classification import crosslingual_classification
-from .classification import hierarchical_classification
+    'evaluate_clustering': '.clustering',
+    'evaluate_clustering_with_amax': '.clustering',
+    'hierarchical_clustering': '.clustering',
 
-from .topic_coherence import compute_dynamic_TC
-from .topic_coherence import compute_topic_coherence
+    'evaluate_classification': '.classification',
+    'crosslingual_classification': '.classification',
+    'hierarchical_classification': '.classification',
 
-from .hierarchy_quality import hierarchy_quality
+    'compute_dynamic_TC': '.topic_coherence',
+    'compute_topic_coherence': '.topic_coherence',
+    'compute_topic_coherence_on_bow': '.topic_coherence',
+    'TC_on_wikipedia': '.topic_coherence',
+    'BowCoherence': '.coherence_index',
+
+    'hierarchy_quality': '.hierarchy_quality',
+})
@@ -1,50 +1,132 @@
 import numpy as np
-from sklearn.svm import SVC
+from sklearn.svm import SVC, LinearSVC
 from sklearn.metrics import f1_score, accuracy_score
+from sklearn.metrics.pairwise import rbf_kernel
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
 import logging
 
 
-def evaluate_classification(train_theta, test_theta, train_labels, test_labels, classifier='SVM', gamma='scale', tune=False):
+C_LIST = [0.1, 1, 10, 100, 1000]
+GAMMA_LIST = ['scale', 'auto', 10, 1, 0.1, 0.01, 0.001]
+
+# largest training size for which the RBF Gram matrix (NxN float64, 0.8 GB at N=10000) is precomputed.
+MAX_GRAM_SIZE = 10000
+# memory the Gram matrices of concurrent tuning tasks may take together; caps n_jobs.
+GRAM_MEMORY_BUDGET = 8 * 1024 ** 3
+
+
+def compute_scores(test_labels, preds):
+    return {
+        'acc': accuracy_score(test_labels, preds),
+        'macro-F1': f1_score(test_labels, preds, average='macro')
+    }
+
+
+def gamma_value(gamma, X):
+    # the gamma SVC would use for 'scale' and 'auto'.
+    if gamma == 'scale':
+        X_var = X.var()
+        return 1.0 / (X.shape[1] * X_var) if X_var != 0 else 1.0
+    if gamma == 'auto':
+        return 1.0 / X.shape[1]
+    return gamma
+
+
+def gram_memory(num_train, num_test):
+    # bytes of one RBF task: the train Gram matrix, the copy SVC makes of it, and the test Gram matrix.
+    if num_train > MAX_GRAM_SIZE:
+        return 0
+    return 8 * (2 * num_train * num_train + num_test * num_train)
+
+
+def fit_rbf(train_theta, test_theta, train_labels, test_labels, gamma, C_list):
+    # the Gram matrix does not depend on C, so compute it once for all C values.
+    precompute = len(train_theta) <= MAX_GRAM_SIZE
+    if precompute:
+        value = gamma_value(gamma, train_theta)
+        train_gram = rbf_kernel(train_theta, gamma=value)
+        test_gram = rbf_kernel(test_theta, train_theta, gamma=value)
+
+    rst = list()
+    for C in C_list:
+        if precompute:
+            clf = SVC(C=C, kernel='precomputed')
+            clf.fit(train_gram, train_labels)
+            preds = clf.predict(test_gram)
+        else:
+            clf = SVC(C=C, kernel='rbf', gamma=gamma)
+            clf.fit(train_theta, train_labels)
+            preds = clf.predict(test_theta)
+        rst.append(((C, gamma, 'rbf'), compute_scores(test_labels, preds)))
+    return rst
+
+
+def fit_linear(train_theta, test_theta, train_labels, test_labels, C_list, fast_linear=False):
+    # gamma does not affect the linear kernel, so each C is fit once.
+    rst = list()
+    for C in C_list:
+        if fast_linear:
+            clf = LinearSVC(C=C)
+        else:
+            clf = SVC(C=C, kernel='linear')
+        clf.fit(train_theta, train_labels)
+        preds = clf.predict(test_theta)
+        rst.append(((C, None, 'linear'), compute_scores(test_labels, preds)))
+    return rst
+
+
+def evaluate_classification(train_theta, test_theta, train_labels, test_labels, classifier='SVM', gamma='scale', tune=False, n_jobs=1, fast_linear=False):
+    """
+    Args:
+        classifier: 'SVM' (SVC) or 'LinearSVM' (LinearSVC, liblinear; fast for large N).
+        tune: report the best scores over the C x gamma x kernel grid.
+        n_jobs: number of processes for the tuning grid, lowered so that the Gram matrices
+            of concurrent tasks fit in GRAM_MEMORY_BUDGET.
+        fast_linear: fit the linear kernel of the grid with LinearSVC instead of SVC.
+    """
     if tune:
+        if classifier != 'SVM':
+            raise NotImplementedError
+
         results = {
             'acc': 0,
             'macro-F1': 0
         }
         logger = logging.getLogger('main')
-        for C in [0.1, 1, 10, 100, 1000]:
-            for gamma in ['scale', 'auto', 10, 1, 0.1, 0.01, 0.001]:
-                print(f'C: {C}, gamma: {gamma}')
-                for kernel in ['rbf', 'linear']:
-                    logger.info(f'C: {C}, gamma: {gamma}, kernel: {kernel}')
-                    if classifier == 'SVM':
-                        clf = SVC(C=C, kernel=kernel, gamma=gamma)
-                    else:
-                        raise NotImplementedError
-
-                    clf.fit(train_theta, train_labels)
-                    preds = clf.predict(test_theta)
-                    this_results = {
-                        'acc': accuracy_score(test_labels, preds),
-                        'macro-F1': f1_score(test_labels, preds, average='macro')
-                    }
-                    results = {
-                        key: max(results[key], this_results[key])
-                        for key in results
-                    }
-                    logger.info(f'Accuracy: {this_results["acc"]}, Macro-F1: {this_results["macro-F1"]}')
+
+        data = (train_theta, test_theta, train_labels, test_labels)
+        task_memory = gram_memory(len(train_theta), len(test_theta))
+        if task_memory > 0 and n_jobs > 1:
+            n_jobs = min(n_jobs, max(1, GRAM_MEMORY_BUDGET // task_memory))
+            logger.info(f'Tuning the SVM with {n_jobs} processes ({task_memory / 1024 ** 3:.1f} GB of Gram matrices each).')
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [executor.submit(fit_rbf, *data, gamma, C_LIST) for gamma in GAMMA_LIST]
+                futures.append(executor.submit(fit_linear, *data, C_LIST, fast_linear))
+                rst_list = [future.result() for future in futures]
+        else:
+            rst_list = [fit_rbf(*data, gamma, C_LIST) for gamma in GAMMA_LIST]
+            rst_list.append(fit_linear(*data, C_LIST, fast_linear))
+
+        for (C, gamma, kernel), this_results in sorted((item for rst in rst_list for item in rst), key=lambda item: item[0][0]):
+            logger.info(f'C: {C}, gamma: {gamma}, kernel: {kernel}')
+            results = {
+                key: max(results[key], this_results[key])
+                for key in results
+            }
+            logger.info(f'Accuracy: {this_results["acc"]}, Macro-F1: {this_results["macro-F1"]}')
     else:
         if classifier == 'SVM':
             clf = SVC(gamma=gamma)
+        elif classifier == 'LinearSVM':
+            clf = LinearSVC()
         else:
             raise NotImplementedError
 
         clf.fit(train_theta, train_labels)
         preds = clf.predict(test_theta)
-        results = {
-            'acc': accuracy_score(test_labels, preds),
-            'macro-F1': f1_score(test_labels, preds, average='macro')
-        }
+        results = compute_scores(test_labels, preds)
     return results
 
 
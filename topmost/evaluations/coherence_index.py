@@ -0,0 +1,295 @@
+import os
+import numpy as np
+import scipy.sparse
+from tqdm import tqdm
+from ..data import file_utils
+from ..data.lazy_dataset import save_csr, load_csr
+
+
+# window sizes Palmetto uses for each measure.
+WINDOW_SIZES = {
+    'C_V': 110,
+    'C_P': 70,
+    'NPMI': 10,
+    'UCI': 10,
+}
+
+EPSILON = 1e-12
+
+
+def window_dir_name(window_size):
+    # window_size None: each document is one window (boolean document).
+    return 'window_doc' if window_size is None else f'window_{window_size}'
+
+
+def window_incidence(word_ids, window_size, num_words):
+    '''
+        Binary (num_windows x num_words) matrix of the boolean sliding windows of one document.
+
+        Args:
+            word_ids: word ids of the document tokens, -1 for tokens out of the vocabulary.
+                These still take a position in the windows.
+    '''
+    num_tokens = len(word_ids)
+    positions = np.arange(num_tokens)
+    if window_size is None or num_tokens <= window_size:
+        num_windows = 1
+        windows = np.zeros(num_tokens, dtype='int64')
+    else:
+        # token i is in windows i - window_size + 1, ..., i.
+        num_windows = num_tokens - window_size + 1
+        positions = np.repeat(positions, window_size)
+        windows = positions - np.tile(np.arange(window_size), num_tokens)
+        valid = (windows >= 0) & (windows < num_windows)
+        positions = positions[valid]
+        windows = windows[valid]
+
+    words = word_ids[positions]
+    keep = words >= 0
+    incidence = scipy.sparse.csr_matrix(
+        (np.ones(keep.sum(), dtype='int64'), (windows[keep], words[keep])),
+        shape=(num_windows, num_words)
+    )
+    incidence.data[:] = 1
+    return incidence
+
+
+class WindowCounter:
+    def __init__(self, window_size, num_words):
+        self.window_size = window_size
+        self.num_words = num_words
+        self.num_windows = 0
+        self.word_count = np.zeros(num_words, dtype='int64')
+        self.pair_count = scipy.sparse.csr_matrix((num_words, num_words), dtype='int64')
+        self.buffer = list()
+
+    def add(self, word_ids):
+        self.buffer.append(window_incidence(word_ids, self.window_size, self.num_words))
+
+    def flush(self):
+        if not self.buffer:
+            return
+        incidence = scipy.sparse.vstack(self.buffer, format='csr')
+        self.buffer = list()
+        self.num_windows += incidence.shape[0]
+        self.word_count += np.asarray(incidence.sum(0)).reshape(-1)
+        self.pair_count = self.pair_count + (incidence.T @ incidence).tocsr()
+
+    def save(self, path):
+        self.flush()
+        file_utils.make_dir(path)
+        save_csr(self.pair_count, os.path.join(path, 'pair_count'))
+        np.save(os.path.join(path, 'word_count.npy'), self.word_count)
+        np.save(os.path.join(path, 'num_windows.npy'), np.asarray(self.num_windows, dtype='int64'))
+
+
+def build_coherence_index(reference_corpus, vocab, index_dir, window_sizes=(10, 70, 110), chunk_size=1000):
+    '''
+        Count the windows containing each word and each word pair of vocab in a reference corpus,
+        and save them in index_dir (one subdirectory per window size) for CoherenceIndex.
+
+        Args:
+            reference_corpus: list of texts, or the path of a text file with one document per line.
+            vocab: the words to index, e.g., the union of the dataset vocabularies.
+
+        The size of the index grows with the square of len(vocab), not with the corpus:
+        pair_count keeps an int64 count and an int32 column index (12 bytes) per pair of vocab words that
+        co-occur in some window. On Wikipedia nearly all pairs of frequent words co-occur in windows
+        of 110 words, so a 50,000-word vocab costs up to 50,000^2 * 12 bytes = 30GB per window size,
+        and flush needs about twice that in memory. Index only the words that are queried
+        (the vocabularies of the evaluated datasets, e.g., 5,000 words: up to 300MB per window size)
+        and the window sizes of the measures used.
+    '''
+    if isinstance(reference_corpus, str):
+        with open(reference_corpus, 'r', encoding='utf-8', errors='ignore') as file:
+            return build_coherence_index(file, vocab, index_dir, window_sizes, chunk_size)
+
+    word2id = dict(zip(vocab, range(len(vocab))))
+    counters = [WindowCounter(window_size, len(vocab)) for window_size in window_sizes]
+
+    for i, text in enumerate(tqdm(reference_corpus, desc='indexing')):
+        word_ids = np.asarray([word2id.get(word, -1) for word in text.split()], dtype='int64')
+        for counter in counters:
+            counter.add(word_ids)
+
+        if (i + 1) % chunk_size == 0:
+            for counter in counters:
+                counter.flush()
+
+    for counter in counters:
+        counter.save(os.path.join(index_dir, window_dir_name(counter.window_size)))
+
+    # written last, so an incomplete index is not used.
+    file_utils.save_text(vocab, os.path.join(index_dir, 'vocab.txt'))
+
+
+class Coherence:
+    '''
+        Computes C_V, NPMI, UCI and C_P of all topics at once with NumPy.
+        Subclasses provide the word probabilities.
+    '''
+    def __init__(self, vocab):
+        self.vocab = vocab
+        self.word2id = dict(zip(self.vocab, range(len(self.vocab))))
+
+    def word_ids(self, top_words):
+        split_top_words = file_utils.split_text_word(top_words)
+        num_top_words = len(split_top_words[0])
+        for item in split_top_words:
+            assert num_top_words == len(item)
+        return np.asarray([[self.word2id.get(word, -1) for word in words] for words in split_top_words], dtype='int64')
+
+    def probabilities(self, ids, window_size):
+        raise NotImplementedError
+
+    def score(self, top_words, measures=('C_V', 'NPMI', 'UCI', 'C_P')):
+        '''
+            Returns:
+                a dict from each measure to the list of its per-topic scores.
+        '''
+        ids = self.word_ids(top_words)
+        rst = dict()
+        for measure in measures:
+            p_i, p_ij = self.probabilities(ids, WINDOW_SIZES[measure])
+            rst[measure] = MEASURES[measure](p_i, p_ij).tolist()
+        return rst
+
+
+def gather_pair_counts(pair_count, ids):
+    # KxNxN counts of the word pairs of each topic; 0 for unknown words (id -1).
+    rows = np.broadcast_to(ids[:, :, None], ids.shape + ids.shape[-1:])
+    cols = np.broadcast_to(ids[:, None, :], ids.shape + ids.shape[-1:])
+    known_pair = (rows >= 0) & (cols >= 0)
+    counts = np.zeros(rows.shape)
+    if known_pair.any():
+        counts[known_pair] = np.asarray(pair_count[rows[known_pair], cols[known_pair]]).reshape(-1)
+    return counts
+
+
+class CoherenceIndex(Coherence):
+    '''
+        Memory-mapped window counts of a reference corpus (see build_coherence_index).
+    '''
+    def __init__(self, index_dir):
+        super().__init__(file_utils.read_text(os.path.join(index_dir, 'vocab.txt')))
+        self.index_dir = index_dir
+        self.counts = dict()
+
+    def load_counts(self, window_size):
+        if window_size not in self.counts:
+            path = os.path.join(self.index_dir, window_dir_name(window_size))
+            if not os.path.isdir(path):
+                raise ValueError(f'window size {window_size} is not in the index {self.index_dir}')
+            num_windows = int(np.load(os.path.join(path, 'num_windows.npy')))
+            word_count = np.load(os.path.join(path, 'word_count.npy'), mmap_mode='r')
+            pair_count = load_csr(os.path.join(path, 'pair_count'))
+            self.counts[window_size] = (num_windows, word_count, pair_count)
+        return self.counts[window_size]
+
+    def probabilities(self, ids, window_size):
+        '''
+            Returns:
+                p_i: KxN probabilities of the topic words.
+                p_ij: KxNxN joint probabilities of the word pairs.
+        '''
+        num_windows, word_count, pair_count = self.load_counts(window_size)
+        known = ids >= 0
+
+        p_i = np.zeros(ids.shape)
+        p_i[known] = word_count[ids[known]] / num_windows
+        p_ij = gather_pair_counts(pair_count, ids) / num_windows
+
+        return p_i, p_ij
+
+
+class BowCoherence(Coherence):
+    '''
+        Coherence on the documents of a bag-of-words matrix (e.g., train_bow), with each
+        document as one window. Document frequencies are computed once; the co-occurrence
+        of the topic words comes from one sparse product X[:, words].T @ X[:, words] per call.
+    '''
+    def __init__(self, bow, vocab):
+        super().__init__(vocab)
+        self.incidence = (scipy.sparse.csc_matrix(bow) > 0).astype('int64')
+        self.num_docs = self.incidence.shape[0]
+        self.doc_freq = np.asarray(self.incidence.sum(0)).reshape(-1)
+
+    def probabilities(self, ids, window_size=None):
+        known = ids >= 0
+
+        p_i = np.zeros(ids.shape)
+        p_i[known] = self.doc_freq[ids[known]] / self.num_docs
+
+        # co-occurrence of the distinct topic words only.
+        words, local_ids = np.unique(ids, return_inverse=True)
+        known_words = words[words >= 0]
+        # unknown words (-1) sort first; shift them out of the local ids.
+        local_ids = local_ids.reshape(ids.shape) - (len(words) - len(known_words))
+        local_ids[~known] = -1
+
+        incidence = self.incidence[:, known_words]
+        pair_count = (incidence.T @ incidence).toarray()
+        p_ij = gather_pair_counts(pair_count, local_ids) / self.num_docs
+
+        return p_i, p_ij
+
+
+def log_ratio(p_i, p_ij):
+    # PMI of each word pair; 0 if a word never occurs.
+    denominator = p_i[:, :, None] * p_i[:, None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pmi = np.log((p_ij + EPSILON) / denominator)
+    return np.where(denominator > 0, pmi, 0.)
+
+
+def normalized_log_ratio(p_i, p_ij):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        npmi = log_ratio(p_i, p_ij) / -np.log(p_ij + EPSILON)
+    return np.nan_to_num(npmi, nan=0., posinf=0., neginf=0.)
+
+
+def mean_over_pairs(pair_scores):
+    # average over the pairs i < j (one-one segmentation, symmetric measures).
+    num_top_words = pair_scores.shape[-1]
+    upper = np.triu_indices(num_top_words, k=1)
+    return pair_scores[:, upper[0], upper[1]].mean(-1)
+
+
+def compute_UCI(p_i, p_ij):
+    return mean_over_pairs(log_ratio(p_i, p_ij))
+
+
+def compute_NPMI(p_i, p_ij):
+    return mean_over_pairs(normalized_log_ratio(p_i, p_ij))
+
+
+def compute_C_P(p_i, p_ij):
+    # one-preceding segmentation with Fitelson's confirmation of w_i by each preceding w_j.
+    p_j = p_i[:, None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        given = p_ij / p_j
+        given_not = (p_i[:, :, None] - p_ij) / (1 - p_j)
+        confirmation = (given - given_not) / (given + given_not)
+    confirmation = np.nan_to_num(confirmation, nan=0., posinf=0., neginf=0.)
+
+    num_top_words = p_i.shape[-1]
+    lower = np.tril_indices(num_top_words, k=-1)
+    return confirmation[:, lower[0], lower[1]].mean(-1)
+
+
+def compute_C_V(p_i, p_ij):
+    # one-set segmentation: cosine between the NPMI vector of each word and the sum over the topic.
+    word_vectors = normalized_log_ratio(p_i, p_ij)
+    topic_vector = word_vectors.sum(1, keepdims=True)
+    norm = np.linalg.norm(word_vectors, axis=-1) * np.linalg.norm(topic_vector, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine = (word_vectors * topic_vector).sum(-1) / norm
+    return np.nan_to_num(cosine, nan=0.).mean(-1)
+
+
+MEASURES = {
+    'C_V': compute_C_V,
+    'NPMI': compute_NPMI,
+    'UCI': compute_UCI,
+    'C_P': compute_C_P,
+}
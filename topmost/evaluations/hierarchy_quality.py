@@ -1,5 +1,5 @@
 import numpy as np
-from tqdm import tqdm
+import scipy.sparse
 from collections import Counter, defaultdict
 from sklearn.feature_extraction.text import CountVectorizer
 
@@ -49,34 +49,56 @@ def compute_TD(texts):
     return TD
 
 
-def compute_CLNPMI(parent_diff_words, child_diff_words, all_bow, vocab):
-    npmi_list = list()
+class WordCooccurrence:
+    """
+    Document co-occurrence counts of a set of words, from one sparse product
+    of the binary doc-word incidence matrix.
+
+    Args:
+        reference_bow: NxV bag-of-words (dense or sparse).
+        vocab: V words, ordered by word id.
+        words: the words whose pairs will be queried, e.g., all topic words.
+    """
+    def __init__(self, reference_bow, vocab, words):
+        word2id = dict(zip(vocab, range(len(vocab))))
+        self.words = sorted(set(words))
+        self.word_index = dict(zip(self.words, range(len(self.words))))
 
-    for p_w in parent_diff_words:
-        flag_n = all_bow[:, vocab.index(p_w)] > 0
-        p_n = np.sum(flag_n) / len(all_bow)
+        word_ids = [word2id[word] for word in self.words]
+        incidence = (scipy.sparse.csc_matrix(reference_bow)[:, word_ids] > 0).astype('int64')
+        self.num_docs = incidence.shape[0]
+        # counts[i, j]: number of documents with both words; counts[i, i]: document frequency.
+        self.counts = (incidence.T @ incidence).toarray()
 
-        for c_w in child_diff_words:
-            flag_l = all_bow[:, vocab.index(c_w)] > 0
-            p_l = np.sum(flag_l)
-            p_nl = np.sum(flag_n * flag_l)
+    def npmi(self, words_a, words_b):
+        idx_a = [self.word_index[word] for word in words_a]
+        idx_b = [self.word_index[word] for word in words_b]
 
-            if p_nl == len(all_bow):
-                npmi_score = 1
-            else:
-                p_l = p_l / len(all_bow)
-                p_nl = p_nl / len(all_bow)
-                p_nl += 1e-10
-                npmi_score = np.log(p_nl / (p_l * p_n)) / -np.log(p_nl)
+        p_n = self.counts[idx_a, idx_a][:, None] / self.num_docs
+        p_l = self.counts[idx_b, idx_b][None, :] / self.num_docs
+        count_nl = self.counts[np.ix_(idx_a, idx_b)]
+        p_nl = count_nl / self.num_docs + 1e-10
 
-            npmi_list.append(npmi_score)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            npmi = np.log(p_nl / (p_l * p_n)) / -np.log(p_nl)
+        return np.where(count_nl == self.num_docs, 1., npmi)
 
+
+def compute_CLNPMI(parent_diff_words, child_diff_words, all_bow, vocab, cooccurrence=None):
+    if cooccurrence is None:
+        cooccurrence = WordCooccurrence(all_bow, vocab, list(parent_diff_words) + list(child_diff_words))
+
+    npmi_list = cooccurrence.npmi(parent_diff_words, child_diff_words).reshape(-1).tolist()
     return npmi_list
 
 
-def get_CLNPMI(PC_pair_groups, all_bow, vocab):
+def get_CLNPMI(PC_pair_groups, all_bow, vocab, cooccurrence=None):
+    if cooccurrence is None:
+        words = [word for group in PC_pair_groups for topic_pair in group for topic in topic_pair for word in topic.split()]
+        cooccurrence = WordCooccurrence(all_bow, vocab, words)
+
     CNPMI_list = list()
-    for group in tqdm(PC_pair_groups):
+    for group in PC_pair_groups:
         layer_CNPMI = list()
         for parent_topic, child_topic in group:
             parent_words = set(parent_topic.split())
@@ -86,7 +108,7 @@ def get_CLNPMI(PC_pair_groups, all_bow, vocab):
             parent_diff_words = list(parent_words.difference(inter))
             child_diff_words = list(child_words.difference(inter))
 
-            npmi_list = compute_CLNPMI(parent_diff_words, child_diff_words, all_bow, vocab)
+            npmi_list = compute_CLNPMI(parent_diff_words, child_diff_words, all_bow, vocab, cooccurrence)
 
             # NOTE: assign -1 to the NPMI of repetitive word pairs
             num_repetition = (len(parent_words) - len(parent_diff_words)) * (len(child_words) - len(child_diff_words))
@@ -178,7 +200,7 @@ def get_Sibling_TD(sibling_groups):
     return sibling_TD
 
 
-def get_Sibling_NPMI(sibling_groups, all_bow, vocab):
+def get_Sibling_NPMI(sibling_groups, all_bow, vocab, cooccurrence=None):
     sibling_NPMI = list()
     for group in sibling_groups:
         layer_pairs = list()
@@ -188,7 +210,7 @@ def get_Sibling_NPMI(sibling_groups, all_bow, vocab):
                 for j in range(i + 1, sibling_num):
                     layer_pairs.append([sibling_topics[i], sibling_topics[j]])
 
-        npmi = get_CLNPMI(layer_pairs, all_bow, vocab)
+        npmi = get_CLNPMI([layer_pairs], all_bow, vocab, cooccurrence)
         sibling_NPMI.append(np.mean(npmi))
     return sibling_NPMI
 
@@ -237,8 +259,12 @@ def hierarchy_quality(vocab, reference_bow, topic_str_list, beta_list, phi_list)
 
     PC_pair_groups, PnonC_pair_groups, sibling_groups = get_topic_groups(hierarchical_topic_dict, topic_hierarchy, beta_list)
 
+    # co-occurrence of all topic words, computed once for all layers.
+    topic_words = [word for topic_str in clean_info(topic_str_list) for word in topic_str.split()]
+    cooccurrence = WordCooccurrence(reference_bow, vocab, topic_words)
+
     # Parent and Child topic Coherence (PCC)
-    CLNPMI = get_CLNPMI(PC_pair_groups, reference_bow, vocab)
+    CLNPMI = get_CLNPMI(PC_pair_groups, reference_bow, vocab, cooccurrence)
 
     # Parent and Child topic Diversity (PCD)
     PC_TD = get_topics_difference(PC_pair_groups)
@@ -253,7 +279,14 @@ def hierarchy_quality(vocab, reference_bow, topic_str_list, beta_list, phi_list)
         'PCC': np.mean(CLNPMI),
         'PCD': np.mean(PC_TD),
         'Sibling_TD': np.mean(Sibling_TD),
-        'PnCD': np.mean(PnonC_TD)
+        'PnCD': np.mean(PnonC_TD),
+        # scores of each layer (pair of adjacent layers for PCC, PCD and PnCD).
+        'layers': {
+            'PCC': CLNPMI,
+            'PCD': PC_TD,
+            'Sibling_TD': Sibling_TD,
+            'PnCD': PnonC_TD
+        }
     }
 
     return rst, topic_hierarchy
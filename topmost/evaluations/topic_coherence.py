@@ -3,8 +3,30 @@ from gensim.models import CoherenceModel
 import numpy as np
 from tqdm import tqdm
 from itertools import combinations
-from ..data.file_utils import split_text_word
+from ..data.file_utils import split_text_word, read_text
+from .coherence_index import CoherenceIndex, BowCoherence
 import os
+import threading
+import weakref
+
+
+# native coherence indexes of Wikipedia (see coherence_index.build_coherence_index).
+WIKIPEDIA_INDEX_DIRS = [
+    os.path.join('.', 'data', 'wikipedia', 'coherence_index'),
+    os.path.join('/kaggle/input/wikipedia/', 'wikipedia', 'coherence_index'),
+]
+
+_wikipedia_index = None
+
+
+def get_wikipedia_index():
+    global _wikipedia_index
+    if _wikipedia_index is None:
+        for index_dir in WIKIPEDIA_INDEX_DIRS:
+            if os.path.isfile(os.path.join(index_dir, 'vocab.txt')):
+                _wikipedia_index = CoherenceIndex(index_dir)
+                break
+    return _wikipedia_index
 
 
 def compute_topic_coherence(reference_corpus, vocab, top_words, cv_type='c_v'):
@@ -24,6 +46,39 @@ def compute_topic_coherence(reference_corpus, vocab, top_words, cv_type='c_v'):
     return cv_per_topic, score
 
 
+# the BowCoherence of the last scored bow matrix and vocab. The matrix is only weakly referenced,
+# so the cache does not keep it alive, and a new matrix at the address of a freed one is not mistaken for it.
+_bow_coherence = (None, None, None)
+_bow_coherence_lock = threading.Lock()
+
+
+def get_bow_coherence(reference_bow, vocab):
+    global _bow_coherence
+    vocab_key = tuple(vocab)
+    with _bow_coherence_lock:
+        bow_ref, cached_vocab, coherence = _bow_coherence
+        if bow_ref is None or bow_ref() is not reference_bow or cached_vocab != vocab_key:
+            coherence = BowCoherence(reference_bow, vocab)
+            _bow_coherence = (weakref.ref(reference_bow), vocab_key, coherence)
+    return coherence
+
+
+def compute_topic_coherence_on_bow(reference_bow, vocab, top_words, cv_type='NPMI', coherence=None):
+    """
+    Compute NPMI or C_V with the documents of a bag-of-words matrix as windows,
+    without gensim or splitting texts.
+    Document frequencies are cached across calls on the same reference_bow and vocab;
+    coherence: a BowCoherence of reference_bow owned by the caller, which bypasses the cache.
+    """
+    if coherence is None:
+        coherence = get_bow_coherence(reference_bow, vocab)
+
+    cv_per_topic = coherence.score(top_words, measures=(cv_type,))[cv_type]
+    score = np.mean(cv_per_topic)
+
+    return cv_per_topic, score
+
+
 def compute_dynamic_TC(train_texts, train_times, vocab, top_words_list, cv_type='c_v'):
     cv_score_list = list()
 
@@ -46,7 +101,14 @@ def compute_dynamic_TC(train_texts, train_times, vocab, top_words_list, cv_type=
 def TC_on_wikipedia(top_word_path, cv_type='C_V'):
     """
     Compute the TC score on the Wikipedia dataset
+    cv_type: C_V, NPMI, UCI or C_P.
+    Uses the native coherence index if it exists, otherwise the Palmetto jar.
     """
+    wikipedia_index = get_wikipedia_index()
+    if wikipedia_index is not None:
+        cv_score = wikipedia_index.score(read_text(top_word_path), measures=(cv_type,))[cv_type]
+        return cv_score, sum(cv_score) / len(cv_score)
+
     try:
         jar_dir = os.path.join("topmost", "evaluations")
         wiki_dir = os.path.join(".", 'data')
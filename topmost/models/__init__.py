@@ -1,48 +1,55 @@
-from .basic.ProdLDA import ProdLDA
-from .basic.CombinedTM import CombinedTM
-from .basic.DecTM import DecTM
-from .basic.ETM import ETM
-from .basic.NSTM.NSTM import NSTM
-from .basic.TSCTM.TSCTM import TSCTM
-from .basic.ECRTM.ECRTM import ECRTM
-from .basic.XTM.XTM import XTM
-from .basic.XTMv2.XTMv2 import XTMv2
-from .basic.XTMv3.XTMv3 import XTMv3
-from .basic.XTMv4.XTMv4 import XTMv4
-from .basic.YTM.YTM import YTM
-from .basic.ZTM.ZTM import ZTM
-from .basic.OTClusterTM.OTClusterTM import OTClusterTM
+# models are imported on first access, so using one model does not import the others.
+from ..utils.lazy_import import lazy_exports, LazyDict
 
-from .crosslingual.NMTM import NMTM
-from .crosslingual.InfoCTM.InfoCTM import InfoCTM
+MODULES = {
+    "ProdLDA": '.basic.ProdLDA',
+    "CombinedTM": '.basic.CombinedTM',
+    "DecTM": '.basic.DecTM',
+    "ETM": '.basic.ETM',
+    "NSTM": '.basic.NSTM.NSTM',
+    "TSCTM": '.basic.TSCTM.TSCTM',
+    "ECRTM": '.basic.ECRTM.ECRTM',
+    "XTM": '.basic.XTM.XTM',
+    "XTMv2": '.basic.XTMv2.XTMv2',
+    "XTMv3": '.basic.XTMv3.XTMv3',
+    "XTMv4": '.basic.XTMv4.XTMv4',
+    "YTM": '.basic.YTM.YTM',
+    "ZTM": '.basic.ZTM.ZTM',
+    "OTClusterTM": '.basic.OTClusterTM.OTClusterTM',
 
-from .dynamic.DETM import DETM
+    "NMTM": '.crosslingual.NMTM',
+    "InfoCTM": '.crosslingual.InfoCTM.InfoCTM',
 
-from .hierarchical.SawETM.SawETM import SawETM
-from .hierarchical.HyperMiner.HyperMiner import HyperMiner
-from .hierarchical.TraCo.TraCo import TraCo
-from .hierarchical.TraCoECR.TraCoECR import TraCoECR
+    "DETM": '.dynamic.DETM',
 
-MODEL_DICT = {
-    "ProdLDA": ProdLDA,
-    "CombinedTM": CombinedTM,
-    "DecTM": DecTM,
-    "ETM": ETM,
-    "NSTM": NSTM,
-    "TSCTM": TSCTM,
-    "ECRTM": ECRTM,
-    "NMTM": NMTM,
-    "InfoCTM": InfoCTM,
-    "DETM": DETM,
-    "SawETM": SawETM,
-    "HyperMiner": HyperMiner,
-    "TraCo": TraCo,
-    "TraCoECR": TraCoECR,
-    "XTM": XTM,
-    "XTMv2": XTMv2,
-    "XTMv3": XTMv3,
-    "XTMv4": XTMv4,
-    "YTM": YTM,
-    "ZTM": ZTM,
-    "OTClusterTM": OTClusterTM,
-}
\ No newline at end of file
+    "SawETM": '.hierarchical.SawETM.SawETM',
+    "HyperMiner": '.hierarchical.HyperMiner.HyperMiner',
+    "TraCo": '.hierarchical.TraCo.TraCo',
+    "TraCoECR": '.hierarchical.TraCoECR.TraCoECR',
+}
+
+__getattr__, __dir__ = lazy_exports(__name__, {**MODULES, 'build_model': '.builder'})
+
+MODEL_DICT = LazyDict([
+    "ProdLDA",
+    "CombinedTM",
+    "DecTM",
+    "ETM",
+    "NSTM",
+    "TSCTM",
+    "ECRTM",
+    "NMTM",
+    "InfoCTM",
+    "DETM",
+    "SawETM",
+    "HyperMiner",
+    "TraCo",
+    "TraCoECR",
+    "XTM",
+    "XTMv2",
+    "XTMv3",
+    "XTMv4",
+    "YTM",
+    "ZTM",
+    "OTClusterTM",
+], __getattr__)
@@ -3,6 +3,7 @@ import torch
 from torch import nn
 import torch.nn.functional as F
 import torch_kmeans
+from topmost.ot import sinkhorn_batch
 from .ECR import ECR
 from .DCR2 import DCR2
 from .DCR3 import DCR3
@@ -66,17 +67,23 @@ class OTClusterTM(nn.Module):
         self.ECR = ECR(weight_loss_ECR, alpha_ECR, sinkhorn_max_iter)
 
         # DCR
-        doc_embedding = torch.Tensor(doc_embedding)
-        kmean_model = torch_kmeans.KMeans(
-            n_clusters=self.num_groups, max_iter=1000, seed=0, verbose=False,
-            normalize='unit')
-        cluster_result = kmean_model.fit(doc_embedding[None, :, :])
-        doc_centroids = cluster_result._result.centers.squeeze(0)
-        self.cluster_emb = doc_centroids
-        self.group = torch.nn.functional.one_hot(
-            cluster_result._result.labels.squeeze(0), self.num_groups).to(float)
-        self.group[self.group==0.0] = 0.01
-        self.group /= self.group.sum(axis=0, keepdim=True)
+        if doc_embedding is not None:
+            doc_embedding = torch.Tensor(doc_embedding)
+            kmean_model = torch_kmeans.KMeans(
+                n_clusters=self.num_groups, max_iter=1000, seed=0, verbose=False,
+                normalize='unit')
+            cluster_result = kmean_model.fit(doc_embedding[None, :, :])
+            doc_centroids = cluster_result._result.centers.squeeze(0)
+            self.cluster_emb = doc_centroids
+            self.group = torch.nn.functional.one_hot(
+                cluster_result._result.labels.squeeze(0), self.num_groups).to(float)
+            self.group[self.group==0.0] = 0.01
+            self.group /= self.group.sum(axis=0, keepdim=True)
+        else:
+            # inference only: the clusters are only used by the training losses.
+            doc_centroids = None
+            self.cluster_emb = None
+            self.group = None
 
         self.DCR = DCR2(weight_loss_DCR, doc_centroids)
         self.theta_prj = nn.Sequential(nn.Linear(self.num_topics, 384),
@@ -155,6 +162,23 @@ class OTClusterTM(nn.Module):
         loss_TCR = self.TCR(topic_prj)
         return loss_TCR
 
+    def get_loss_ECR_TCR(self):
+        # ECR and TCR only depend on the global embeddings,
+        # so solve both OT problems in one batched Sinkhorn call.
+        if self.TCR.weight_loss_TCR <= 1e-6:
+            return self.get_loss_ECR(), 0.
+
+        cost_ECR = self.pairwise_euclidean_distance(
+            self.topic_embeddings, self.word_embeddings)
+        cost_TCR = self.TCR.get_cost(self.topic_emb_prj(self.topic_embeddings))
+
+        transp_ECR, transp_TCR = sinkhorn_batch(
+            [self.ECR.solver, self.TCR.solver], [cost_ECR, cost_TCR])
+
+        loss_ECR = self.ECR.get_loss(transp_ECR, cost_ECR)
+        loss_TCR = self.TCR.get_loss(transp_TCR, cost_TCR)
+        return loss_ECR, loss_TCR
+
     def pairwise_euclidean_distance(self, x, y):
         cost = torch.sum(x ** 2, axis=1, keepdim=True) + \
             torch.sum(y ** 2, dim=1) - 2 * torch.matmul(x, y.t())
@@ -172,11 +196,10 @@ class OTClusterTM(nn.Module):
 
         loss_TM = recon_loss + loss_KL
         
-        group = self.group[idx]
+        group = self.group[idx.to(self.group.device)]
 
-        loss_ECR = self.get_loss_ECR()
+        loss_ECR, loss_TCR = self.get_loss_ECR_TCR()
         loss_DCR = self.get_loss_DCR(theta, bert_emb)
-        loss_TCR = self.get_loss_TCR(self.topic_embeddings)
         # print(loss_TM)
         # print(loss_ECR)
         # print(loss_DCR)
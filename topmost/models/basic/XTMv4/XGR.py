@@ -1,5 +1,6 @@
 import torch
 from torch import nn
+from topmost.ot import Sinkhorn
 
 
 class XGR(nn.Module):
@@ -8,40 +9,17 @@ class XGR(nn.Module):
 
         Xiaobao Wu, Xinshuai Dong, Thong Thanh Nguyen, Anh Tuan Luu.
     '''
-    def __init__(self, weight_loss_XGR, sinkhorn_alpha, OT_max_iter=5000, stopThr=.5e-2):
+    def __init__(self, weight_loss_XGR, sinkhorn_alpha, OT_max_iter=5000, stopThr=.5e-2, check_interval=50):
         super().__init__()
 
-        self.sinkhorn_alpha = sinkhorn_alpha
-        self.OT_max_iter = OT_max_iter
         self.weight_loss_XGR = weight_loss_XGR
-        self.stopThr = stopThr
-        self.epsilon = 1e-16
+        self.solver = Sinkhorn(sinkhorn_alpha, OT_max_iter, stopThr, check_interval)
 
     def forward(self, M, group):
         # M: KxV
-        # a: Kx1
-        # b: Vx1
-        device = M.device
-        group = group.to(device)
-
-        # Sinkhorn's algorithm
-        a = (torch.ones(M.shape[0]) / M.shape[0]).unsqueeze(1).to(device)
-        b = (torch.ones(M.shape[1]) / M.shape[1]).unsqueeze(1).to(device)
-
-        u = (torch.ones_like(a) / a.size()[0]).to(device) # Kx1
-
-        K = torch.exp(-M * self.sinkhorn_alpha)
-        err = 1
-        cpt = 0
-        while err > self.stopThr and cpt < self.OT_max_iter:
-            v = torch.div(b, torch.matmul(K.t(), u) + self.epsilon)
-            u = torch.div(a, torch.matmul(K, v) + self.epsilon)
-            cpt += 1
-            if cpt % 50 == 1:
-                bb = torch.mul(v, torch.matmul(K.t(), u))
-                err = torch.norm(torch.sum(torch.abs(bb - b), dim=0), p=float('inf'))
-
-        transp = u * (K * v.T)
+        group = group.to(M.device)
+
+        transp = self.solver(M)
 
         loss_XGR = (torch.exp(group) * (group - transp - 1) \
             + torch.exp(transp)).sum()
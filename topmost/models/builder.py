@@ -0,0 +1,165 @@
+from . import MODEL_DICT
+
+
+def build_model(args, vocab_size, pretrained_WE=None, doc_embedding=None, num_data=None, contextual_embed_size=None):
+    '''
+        Create the model args.model with the hyperparameters of args (the options of main.py, or a loaded config.txt).
+
+        Args:
+            pretrained_WE: VxD word embeddings, used if args.use_pretrainWE.
+            doc_embedding: contextual embeddings of the training documents, clustered by OTClusterTM.
+                None creates OTClusterTM for inference only, e.g., to load a checkpoint.
+            num_data: number of training documents (OTClusterTM).
+            contextual_embed_size: size of the contextual embeddings (CombinedTM).
+    '''
+    if not args.use_pretrainWE:
+        pretrained_WE = None
+
+    if args.model == "YTM":
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       weight_loss_MMI=args.weight_MMI,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'XTMv2':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       num_groups=args.num_groups,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_XGR=args.weight_XGR,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       alpha_XGR=args.alpha_XGR,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'XTMv3':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       num_groups=args.num_groups,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_XGR=args.weight_XGR,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       alpha_XGR=args.alpha_XGR,
+                                       gating_func=args.gating_func,
+                                       weight_global_expert=args.weight_global_expert,
+                                       weight_local_expert=args.weight_local_expert,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'XTMv4':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       num_groups=args.num_groups,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_XGR=args.weight_XGR,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       alpha_XGR=args.alpha_XGR,
+                                       gating_func=args.gating_func,
+                                       weight_global_expert=args.weight_global_expert,
+                                       weight_local_expert=args.weight_local_expert,
+                                       k=args.k,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'XTM':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       num_groups=args.num_groups,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_XGR=args.weight_XGR,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       alpha_XGR=args.alpha_XGR,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'ZTM':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       num_groups=args.num_groups,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_XGR=args.weight_XGR,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       alpha_XGR=args.alpha_XGR,
+                                       weight_loss_MMI=args.weight_MMI,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'ECRTM':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'OTClusterTM':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       doc_embedding=doc_embedding,
+                                       num_topics=args.num_topics,
+                                       num_groups=args.num_groups,
+                                       num_data=num_data,
+                                       dropout=args.dropout,
+                                       pretrained_WE=pretrained_WE,
+                                       weight_loss_ECR=args.weight_ECR,
+                                       alpha_ECR=args.alpha_ECR,
+                                       weight_loss_DCR=args.weight_DCR,
+                                       alpha_DCR=args.alpha_DCR,
+                                       weight_loss_TCR=args.weight_TCR,
+                                       alpha_TCR=args.alpha_TCR,
+                                       beta_temp=args.beta_temp)
+    elif args.model == 'CombinedTM':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       dropout=args.dropout,
+                                       contextual_embed_size=contextual_embed_size)
+    elif args.model == 'TraCo':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics_list=[args.num_groups, args.num_topics],
+                                       pretrained_WE=pretrained_WE,
+                                       dropout=args.dropout,
+                                       beta_temp=args.beta_temp,
+                                       weight_loss_TPD=args.weight_TPD, 
+                                       sinkhorn_alpha=args.alpha_TPD)
+    elif args.model == 'TraCoECR':
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics_list=[args.num_groups, args.num_topics],
+                                       pretrained_WE=pretrained_WE,
+                                       dropout=args.dropout,
+                                       beta_temp=args.beta_temp,
+                                       weight_loss_TPD=args.weight_TPD, 
+                                       sinkhorn_alpha=args.alpha_TPD,
+                                       weight_loss_ECR=args.weight_ECR, 
+                                       alpha_ECR=args.alpha_ECR)
+    else:
+        model = MODEL_DICT[args.model](vocab_size=vocab_size,
+                                       num_topics=args.num_topics,
+                                       dropout=args.dropout)
+
+    if args.model == 'YTM':
+        model.weight_loss_XGR = args.weight_XGR
+        model.weight_loss_ECR = args.weight_ECR
+    elif args.model == 'XTMv2':
+        model.weight_loss_XGR = args.weight_XGR
+        model.weight_loss_ECR = args.weight_ECR
+    elif args.model == 'XTMv3':
+        model.weight_loss_XGR = args.weight_XGR
+        model.weight_loss_ECR = args.weight_ECR
+    elif args.model == 'XTMv4':
+        model.weight_loss_XGR = args.weight_XGR
+        model.weight_loss_ECR = args.weight_ECR
+    elif args.model == 'XTM':
+        model.weight_loss_XGR = args.weight_XGR
+        model.weight_loss_ECR = args.weight_ECR
+    elif args.model == 'ZTM':
+        model.weight_loss_XGR = args.weight_XGR
+        model.weight_loss_ECR = args.weight_ECR
+    elif args.model == 'OTClusterTM':
+        model.weight_loss_XGR = args.weight_XGR
+        model.weight_loss_ECR = args.weight_ECR
+    elif args.model == 'ECRTM':
+        model.weight_loss_ECR = args.weight_ECR
+
+    return model
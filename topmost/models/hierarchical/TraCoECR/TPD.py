@@ -1,57 +1,45 @@
+import copy
 import torch
 from torch import nn
+from topmost.ot import Sinkhorn, sinkhorn_batch
 from . import utils
 
 
 class TPD(nn.Module):
-    def __init__(self, sinkhorn_alpha, sinkhorn_max_iter=5000, stopThr=.5e-2):
+    def __init__(self, sinkhorn_alpha, sinkhorn_max_iter=5000, stopThr=.5e-2, check_interval=50, warm_start=False):
         super().__init__()
 
-        self.sinkhorn_alpha = sinkhorn_alpha
-        self.sinkhorn_max_iter = sinkhorn_max_iter
-        self.stopThr = stopThr
-        self.epsilon = 1e-16
+        self.solver = Sinkhorn(sinkhorn_alpha, sinkhorn_max_iter, stopThr, check_interval, warm_start=warm_start)
+        # one solver per pair of adjacent layers, so that each keeps its own warm-start scalings.
+        self.layer_solvers = nn.ModuleList()
 
     def forward(self, topic_embeddings_list, weight_loss_TPD=20.0):
         all_loss_TPD = 0.
-        transp_list = list()
 
         num_layers = len(topic_embeddings_list)
 
+        cost_list = list()
         for layer_id in range(num_layers)[:-1]:
             topic_embeddings = topic_embeddings_list[layer_id]
             next_topic_embeddings = topic_embeddings_list[layer_id + 1]
             cost = utils.pairwise_euclidean_distance(topic_embeddings, next_topic_embeddings)
-            loss_TPD, transp = self.sinkhorn(cost, return_transp=True)
+            cost_list.append(cost)
 
-            all_loss_TPD += loss_TPD
-            transp_list.append(transp)
+        while len(self.layer_solvers) < len(cost_list):
+            self.layer_solvers.append(copy.deepcopy(self.solver))
 
-        all_loss_TPD *= weight_loss_TPD / (num_layers - 1)
+        # solve the OT problems of all adjacent layers in one loop.
+        transp_list = sinkhorn_batch(self.layer_solvers[:len(cost_list)], cost_list)
+
+        for cost, transp in zip(cost_list, transp_list):
+            all_loss_TPD += torch.sum(transp * cost)
 
+        all_loss_TPD *= weight_loss_TPD / (num_layers - 1)
 
         return all_loss_TPD, transp_list
 
     def sinkhorn(self, M, return_transp=False):
-        device = M.device
-
-        a = (torch.ones(M.shape[0]) / M.shape[0]).unsqueeze(1).to(device)
-        b = (torch.ones(M.shape[1]) / M.shape[1]).unsqueeze(1).to(device)
-
-        u = (torch.ones_like(a) / a.size()[0]).to(device) # Kx1
-
-        K = torch.exp(-M * self.sinkhorn_alpha)
-        err = 1
-        cpt = 0
-        while err > self.stopThr and cpt < self.sinkhorn_max_iter:
-            v = torch.div(b, torch.matmul(K.t(), u) + self.epsilon)
-            u = torch.div(a, torch.matmul(K, v) + self.epsilon)
-            cpt += 1
-            if cpt % 50 == 1:
-                bb = torch.mul(v, torch.matmul(K.t(), u))
-                err = torch.norm(torch.sum(torch.abs(bb - b), dim=0), p=float('inf'))
-
-        transp = u * (K * v.T)
+        transp = self.solver(M)
 
         loss = torch.sum(transp * M)
 
@@ -0,0 +1,8 @@
+from .sinkhorn import Sinkhorn
+from .sinkhorn import sinkhorn
+from .sinkhorn import sinkhorn_batch
+from .sinkhorn import solve_batch
+from .sinkhorn import configure_solvers
+from .sinkhorn import refresh_solvers
+from .sinkhorn import solver_state_dict
+from .sinkhorn import load_solver_state_dict
@@ -0,0 +1,413 @@
+import math
+import functools
+import torch
+from torch import nn
+
+
+CONVERGENCE_MODES = ('sync', 'async', 'fixed')
+
+class Sinkhorn(nn.Module):
+    '''
+        Entropic optimal transport solved with Sinkhorn's algorithm.
+
+        All OT regularizers (ECR, TCR, XGR, TPD, ...) hold one solver and call it
+        instead of running their own loop. Several cost matrices can be solved in
+        one call with sinkhorn_batch.
+
+        Args:
+            sinkhorn_alpha: inverse of the entropic regularization weight.
+            max_iter: maximum number of Sinkhorn iterations.
+            stopThr: stop when the marginal error falls below this threshold.
+            check_interval: compute the marginal error every this many iterations.
+                Each check costs one device-to-host sync.
+            log_domain: iterate on log-scalings with logsumexp. Slower, but stable
+                for large sinkhorn_alpha where exp(-alpha * M) underflows.
+            epsilon: added to denominators of the scaling updates.
+            warm_start: start from the scalings of the previous solve instead of u = 1/K.
+                Embeddings move only slightly between training steps, so the previous
+                scalings are usually close to the new solution. They are discarded when
+                the problem shape changes or the previous solve diverged.
+            convergence: how the marginal error is checked.
+                'sync': read the error on the host at every check (blocks the CUDA stream).
+                'async': copy the convergence flag of each check to the host behind a CUDA event.
+                    At most one check is in flight: the host queues the next block of check_interval
+                    iterations before waiting for the previous check, so the device is never idle,
+                    and at most one block runs past the converged check. The scalings of the converged
+                    check are returned (later iterations are dropped from the autograd graph), so the
+                    result and n_iter equal those of 'sync'.
+                'fixed': always run max_iter iterations without any check, for reproducible timing.
+            compile_update: run the scaling updates through torch.compile, which fuses their
+                elementwise kernels. Ignored if torch has no torch.compile.
+            reuse_plan: return the (detached) transport plan of the last solve until refresh() is called.
+                The cost matrix is still recomputed by the caller, so the regularizer keeps
+                receiving gradients through it. The plan is solved again when the marginals
+                a, b differ from those of the cached plan (e.g., batch-dependent marginals).
+    '''
+    def __init__(self, sinkhorn_alpha, max_iter=5000, stopThr=.5e-2, check_interval=50, log_domain=False, epsilon=1e-16, warm_start=False, convergence='sync', reuse_plan=False, compile_update=False):
+        super().__init__()
+
+        self.sinkhorn_alpha = sinkhorn_alpha
+        self.max_iter = max_iter
+        self.stopThr = stopThr
+        self.check_interval = check_interval
+        self.log_domain = log_domain
+        self.epsilon = epsilon
+        self.warm_start = warm_start
+
+        if convergence not in CONVERGENCE_MODES:
+            raise NotImplementedError(convergence)
+        self.convergence = convergence
+        self.reuse_plan = reuse_plan
+        self.compile_update = compile_update
+
+        # number of iterations used by the last solve.
+        self.n_iter = 0
+
+        # scalings kept from the last solve for warm starting.
+        self.u = None
+        self.v = None
+
+        # transport plan kept for reuse_plan, and the marginals it was solved for.
+        self.cached_transp = None
+        self.cached_marginals = (None, None)
+        self.stale = True
+
+    def kernel(self, M):
+        if self.log_domain:
+            return -M * self.sinkhorn_alpha
+        return torch.exp(-M * self.sinkhorn_alpha)
+
+    def init_state(self, M, a=None, b=None):
+        # M: KxV (or BxKxV)
+        # a: Kx1 source distribution, uniform by default
+        # b: Vx1 target distribution, uniform by default
+        # always solve in fp32, also when the cost comes from an autocast region.
+        M = M.float()
+        if a is None:
+            a = M.new_full((M.shape[-2], 1), 1. / M.shape[-2])
+        if b is None:
+            b = M.new_full((M.shape[-1], 1), 1. / M.shape[-1])
+        a = a.float()
+        b = b.float()
+
+        K = self.kernel(M)
+
+        if self.log_domain:
+            a = a.log()
+            b = b.log()
+
+        u = torch.ones_like(a) / a.shape[-2]
+        if self.log_domain:
+            u = u.log()
+
+        if self.warm_start and self.u is not None and self.u.shape == a.shape and self.u.device == a.device:
+            # fall back to the cold start on the device if the kept scalings are not finite,
+            # which avoids a host sync in the 'async' and 'fixed' modes.
+            u = torch.where(torch.isfinite(self.u).all(), self.u, u)
+
+        return SinkhornState(K, a, b, u)
+
+    def save_state(self, state, err):
+        if not self.warm_start or (err is not None and not math.isfinite(err)):
+            self.reset()
+        else:
+            self.u = state.u.detach()
+            self.v = state.v.detach()
+
+    def reset(self):
+        self.u = None
+        self.v = None
+
+    def refresh(self):
+        # solve again at the next call even if reuse_plan is set.
+        self.stale = True
+
+    def cached_plan(self, M, a=None, b=None):
+        transp = self.cached_transp
+        if not self.reuse_plan or self.stale or transp is None:
+            return None
+        if transp.shape != M.shape or transp.device != M.device:
+            return None
+        for marginal, cached in zip((a, b), self.cached_marginals):
+            if (marginal is None) != (cached is None):
+                return None
+            if marginal is not None and (marginal.shape != cached.shape or not torch.equal(marginal.detach(), cached)):
+                return None
+        return transp
+
+    def cache_plan(self, transp, a=None, b=None):
+        if self.reuse_plan:
+            self.cached_transp = transp.detach()
+            self.cached_marginals = tuple(None if marginal is None else marginal.detach().clone() for marginal in (a, b))
+            self.stale = False
+
+    def update(self, state):
+        update_fn = get_update_fn(self.compile_update)
+        state.u, state.v = update_fn(state.K, state.a, state.b, state.u, self.epsilon, self.log_domain)
+
+    def error(self, state):
+        K, b, u, v = state.K, state.b, state.u, state.v
+        if self.log_domain:
+            bb = torch.exp(v + torch.logsumexp(K.unsqueeze(-1) + u.unsqueeze(-2), dim=-3))
+            b = b.exp()
+        else:
+            bb = torch.mul(v, torch.matmul(K.transpose(-2, -1), u))
+        return torch.norm(torch.sum(torch.abs(bb - b), dim=-2), p=float('inf'))
+
+    def check_async(self, state, n_iter):
+        '''
+            Compute the convergence flag on the device and queue its copy to the host.
+        '''
+        converged = self.error(state) <= self.stopThr
+        state.record(converged, n_iter)
+
+    def plan(self, K, u, v):
+        if self.log_domain:
+            return torch.exp(u + K + v.transpose(-2, -1))
+        return u * (K * v.transpose(-2, -1))
+
+    def solve(self, M, a=None, b=None):
+        '''
+            Return the kernel K and the scalings u, v.
+            Useful when a and b hold several columns (one problem per column)
+            and the full transport plan is not needed.
+        '''
+        return solve_batch([self], [M], [a], [b])[0]
+
+    def forward(self, M, a=None, b=None):
+        return sinkhorn_batch([self], [M], [a], [b])[0]
+
+
+class SinkhornState:
+    def __init__(self, K, a, b, u):
+        self.K = K
+        self.a = a
+        self.b = b
+        self.u = u
+        self.v = None
+
+        # used by the 'async' convergence mode: the check in flight, and the iteration of the converged check.
+        self.pending = None
+        self.converged_iter = None
+
+    def record(self, converged, n_iter):
+        # converged: flag of the check after n_iter iterations, kept with the scalings it was computed on.
+        if converged.is_cuda:
+            flag = torch.empty((), dtype=torch.bool, pin_memory=True)
+            flag.copy_(converged, non_blocking=True)
+            event = torch.cuda.Event()
+            event.record()
+        else:
+            flag, event = converged, None
+        self.pending = (event, flag, self.u, self.v, n_iter)
+
+    def poll(self, wait=False):
+        '''
+            Return True if the check in flight has converged; its scalings then become the result.
+            Without wait, a check the device has not reached yet is left pending.
+        '''
+        if self.pending is None:
+            return False
+        event, flag, u, v, n_iter = self.pending
+        if event is not None:
+            if wait:
+                event.synchronize()
+            elif not event.query():
+                return False
+
+        self.pending = None
+        if flag.item():
+            self.u = u
+            self.v = v
+            self.converged_iter = n_iter
+            return True
+        return False
+
+    def result(self):
+        return self.K, self.u, self.v
+
+
+def update_scalings(K, a, b, u, epsilon, log_domain):
+    # one Sinkhorn iteration: the scalings v, then u.
+    if log_domain:
+        v = b - torch.logsumexp(K.unsqueeze(-1) + u.unsqueeze(-2), dim=-3)
+        u = a - torch.logsumexp(K.unsqueeze(-1) + v.unsqueeze(-3), dim=-2)
+    else:
+        v = torch.div(b, torch.matmul(K.transpose(-2, -1), u) + epsilon)
+        u = torch.div(a, torch.matmul(K, v) + epsilon)
+    return u, v
+
+
+compiled_update_scalings = None
+
+
+def get_update_fn(compile_update=False):
+    # update_scalings, compiled once per process when requested and torch.compile exists (torch >= 2.0).
+    global compiled_update_scalings
+    if not compile_update or not hasattr(torch, 'compile'):
+        return update_scalings
+    if compiled_update_scalings is None:
+        compiled_update_scalings = torch.compile(update_scalings)
+    return compiled_update_scalings
+
+
+def no_autocast(func):
+    # Sinkhorn iterations underflow in fp16/bf16, so autocast is disabled while solving.
+    @functools.wraps(func)
+    def wrapper(solvers, M_list, *args, **kwargs):
+        with torch.autocast(device_type=M_list[0].device.type, enabled=False):
+            return func(solvers, M_list, *args, **kwargs)
+    return wrapper
+
+
+@no_autocast
+def solve_batch(solvers, M_list, a_list=None, b_list=None):
+    '''
+        Run Sinkhorn's algorithm for several cost matrices in one loop.
+
+        All problems advance in lockstep; the marginal errors of 'sync' solvers
+        are checked together so that each check costs a single device-to-host sync.
+        A problem stops updating once it converges or reaches its max_iter.
+
+        Returns:
+            a list of (K, u, v) for each problem.
+    '''
+    num_problems = len(M_list)
+    if a_list is None:
+        a_list = [None] * num_problems
+    if b_list is None:
+        b_list = [None] * num_problems
+
+    states = [solver.init_state(M, a, b) for solver, M, a, b in zip(solvers, M_list, a_list, b_list)]
+
+    active = [i for i in range(num_problems) if solvers[i].max_iter > 0]
+    last_err = [None] * num_problems
+    cpt = 0
+    while active:
+        for i in active:
+            solvers[i].update(states[i])
+        cpt += 1
+
+        check_list = [i for i in active if solvers[i].convergence != 'fixed' and (cpt - 1) % solvers[i].check_interval == 0]
+        sync_list = [i for i in check_list if solvers[i].convergence == 'sync']
+        converged = set()
+        if sync_list:
+            err_list = torch.stack([solvers[i].error(states[i]) for i in sync_list]).tolist()
+            for i, err in zip(sync_list, err_list):
+                last_err[i] = err
+            converged = {i for i, err in zip(sync_list, err_list) if err <= solvers[i].stopThr}
+
+        for i in check_list:
+            if solvers[i].convergence == 'async':
+                # at most one check in flight: the previous check was issued a block ago,
+                # so waiting for it here leaves the current block queued on the device.
+                if states[i].poll(wait=True):
+                    converged.add(i)
+                else:
+                    solvers[i].check_async(states[i], cpt)
+
+        for i in active:
+            # the last check is waited for when max_iter is reached.
+            if solvers[i].convergence == 'async' and i not in converged and states[i].poll(wait=cpt >= solvers[i].max_iter):
+                converged.add(i)
+
+        for i in active:
+            if i in converged or cpt >= solvers[i].max_iter:
+                solvers[i].n_iter = states[i].converged_iter if states[i].converged_iter is not None else cpt
+        active = [i for i in active if i not in converged and cpt < solvers[i].max_iter]
+
+    rst_list = [state.result() for state in states]
+
+    for solver, state, err in zip(solvers, states, last_err):
+        solver.save_state(state, err)
+
+    return rst_list
+
+
+@no_autocast
+def sinkhorn_batch(solvers, M_list, a_list=None, b_list=None):
+    '''
+        Solve several cost matrices in one call and return their transport plans.
+        Each problem uses the settings of its own solver.
+        Solvers with a reusable cached plan are skipped.
+    '''
+    num_problems = len(M_list)
+    if a_list is None:
+        a_list = [None] * num_problems
+    if b_list is None:
+        b_list = [None] * num_problems
+
+    transp_list = [solver.cached_plan(M, a, b) for solver, M, a, b in zip(solvers, M_list, a_list, b_list)]
+    solve_idx = [i for i, transp in enumerate(transp_list) if transp is None]
+
+    if solve_idx:
+        rst_list = solve_batch(
+            [solvers[i] for i in solve_idx],
+            [M_list[i] for i in solve_idx],
+            [a_list[i] for i in solve_idx],
+            [b_list[i] for i in solve_idx]
+        )
+        for i, (K, u, v) in zip(solve_idx, rst_list):
+            transp = solvers[i].plan(K, u, v)
+            solvers[i].cache_plan(transp, a_list[i], b_list[i])
+            transp_list[i] = transp
+
+    return transp_list
+
+
+def sinkhorn(M, a=None, b=None, sinkhorn_alpha=20., max_iter=5000, stopThr=.5e-2, check_interval=50, log_domain=False, epsilon=1e-16, convergence='sync'):
+    solver = Sinkhorn(sinkhorn_alpha, max_iter, stopThr, check_interval, log_domain, epsilon, convergence=convergence)
+    return solver(M, a, b)
+
+
+def configure_solvers(model, **options):
+    '''
+        Set options (e.g., warm_start=True, check_interval=10) on every Sinkhorn solver of a model.
+    '''
+    if options.get('convergence', 'sync') not in CONVERGENCE_MODES:
+        raise NotImplementedError(options['convergence'])
+
+    for module in model.modules():
+        if isinstance(module, Sinkhorn):
+            for key, value in options.items():
+                if not hasattr(module, key):
+                    raise AttributeError(f'Sinkhorn has no option {key}')
+                setattr(module, key, value)
+            module.reset()
+            module.refresh()
+
+
+def refresh_solvers(model):
+    '''
+        Make every Sinkhorn solver of a model solve again at its next call.
+    '''
+    for module in model.modules():
+        if isinstance(module, Sinkhorn):
+            module.refresh()
+
+
+SOLVER_STATE_KEYS = ('u', 'v', 'cached_transp', 'cached_marginals', 'stale')
+
+
+def solver_state_dict(model):
+    '''
+        Warm-start scalings and cached plans of every Sinkhorn solver of a model, for checkpoints.
+    '''
+    state_dict = dict()
+    for name, module in model.named_modules():
+        if isinstance(module, Sinkhorn):
+            state_dict[name] = {key: getattr(module, key) for key in SOLVER_STATE_KEYS}
+    return state_dict
+
+
+def load_solver_state_dict(model, state_dict):
+    # solvers created lazily after the checkpoint was loaded start from scratch.
+    for name, module in model.named_modules():
+        if isinstance(module, Sinkhorn) and name in state_dict:
+            device = next(model.parameters()).device
+            for key, value in state_dict[name].items():
+                if torch.is_tensor(value):
+                    value = value.to(device)
+                elif isinstance(value, tuple):
+                    value = tuple(item.to(device) if torch.is_tensor(item) else item for item in value)
+                setattr(module, key, value)
@@ -1 +1,5 @@
-from .preprocessing import Preprocessing
+from ..utils.lazy_import import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'Preprocessing': '.preprocessing',
+})
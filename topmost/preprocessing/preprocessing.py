@@ -4,17 +4,20 @@ This script is partially based on https://github.com/dallascard/scholar.
 
 import os
 import re
+import json
 import string
-import gensim.downloader
+import shutil
+import itertools
+import contextlib
+import multiprocessing
 from collections import Counter
 import numpy as np
 import scipy.sparse
 from tqdm import tqdm
-from sklearn.feature_extraction.text import CountVectorizer
 
 from topmost.data import file_utils
-import sentence_transformers
-from nltk.stem import WordNetLemmatizer
+from topmost.data.basic_dataset_handler import load_contextual_embed
+from topmost.data.embedding_cache import EMBEDDING_CACHE_DIR
 
 
 # compile some regexes
@@ -27,6 +30,11 @@ alpha_or_num = re.compile('^[a-zA-Z_]+|[0-9_]+$')
 alphanum = re.compile('^[a-zA-Z0-9_]+$')
 
 
+def clean_raw_text(text):
+    # normalize whitespace and drop email addresses and single quotes.
+    return re.sub("\'", "", re.sub('\S*@\S*\s?', '', re.sub('\s+', ' ', text)))
+
+
 def get_stopwords(stopwords):
     if stopwords is None:
         stopwords = []
@@ -48,9 +56,15 @@ class Tokenizer:
         self.lower = not no_lower
         self.min_length = min_length
 
-        self.stopword_set = get_stopwords(stopwords)
+        self.stopword_set = set(get_stopwords(stopwords))
+        # arguments of __init__, saved with a preprocessed dataset to tokenize new texts the same way.
+        self.settings = dict(stopwords=sorted(self.stopword_set), keep_num=keep_num, keep_alphanum=keep_alphanum,
+                             strip_html=strip_html, no_lower=no_lower, min_length=min_length)
         print(f'sttopword set: {self.stopword_set}')
+        from nltk.stem import WordNetLemmatizer
         self.lemmatizer = WordNetLemmatizer()
+        # raw token -> kept lemma, or None if the token is dropped.
+        self.token_cache = dict()
 
     def clean_text(self, text, strip_html=False, lower=True, keep_emails=False, keep_at_mentions=False):
         # remove html tags
@@ -114,55 +128,186 @@ class Tokenizer:
         text = text.strip()
         return text
 
-    def tokenize(self, text):
-        text = self.clean_text2(text, self.strip_html, self.lower)
-        tokens = text.split()
-        tokens = [self.lemmatizer.lemmatize(t) for t in tokens]
+    def filter_token(self, token):
+        t = self.lemmatizer.lemmatize(token)
 
-        tokens = ['_' if t in self.stopword_set else t for t in tokens]
+        if t in self.stopword_set:
+            return None
 
         # remove tokens that contain numbers
         if not self.keep_alphanum and not self.keep_num:
-            tokens = [t if alpha.match(t) else '_' for t in tokens]
+            if not alpha.match(t):
+                return None
 
         # or just remove tokens that contain a combination of letters and numbers
         elif not self.keep_alphanum:
-            tokens = [t if alpha_or_num.match(t) else '_' for t in tokens]
+            if not alpha_or_num.match(t):
+                return None
 
         # drop short tokens
-        if self.min_length > 0:
-            tokens = [t if len(t) >= self.min_length else '_' for t in tokens]
+        if self.min_length > 0 and len(t) < self.min_length:
+            return None
 
-        unigrams = [t for t in tokens if t != '_']
-        # counts = Counter()
-        # counts.update(unigrams)
+        return t
+
+    def tokenize(self, text):
+        text = self.clean_text2(text, self.strip_html, self.lower)
+
+        # lemmatize and filter each distinct token once.
+        unigrams = list()
+        for token in text.split():
+            if token not in self.token_cache:
+                self.token_cache[token] = self.filter_token(token)
+            t = self.token_cache[token]
+            if t is not None:
+                unigrams.append(t)
 
         return unigrams
 
 
-def make_word_embeddings(vocab):
-    glove_vectors = gensim.downloader.load('glove-wiki-gigaword-200')
-    word_embeddings = np.zeros((len(vocab), glove_vectors.vectors.shape[1]))
+def load_tokenizer(path):
+    # Tokenizer with the settings saved by Preprocessing.save_tokenizer (tokenizer.json).
+    with open(path, 'r', encoding='utf-8') as file:
+        return Tokenizer(**json.load(file))
+
+
+# tokenizer of a worker process of tokenize_texts.
+worker_tokenizer = None
+
 
-    num_found = 0
+def init_tokenize_worker(tokenizer):
+    global worker_tokenizer
+    worker_tokenizer = tokenizer
 
-    try:
-        key_word_list = glove_vectors.index_to_key
-    except:
-        key_word_list = glove_vectors.index2word
 
-    for i, word in enumerate(tqdm(vocab, desc="===>making word embeddings")):
-        if word in key_word_list:
-            word_embeddings[i] = glove_vectors[word]
-            num_found += 1
+def tokenize_chunk(texts):
+    # tokens of each text and the document frequencies of the chunk.
+    token_lists = [worker_tokenizer(text) for text in texts]
+    doc_counts = Counter()
+    for tokens in token_lists:
+        doc_counts.update(set(tokens))
+    return token_lists, doc_counts
 
-    print(f'===> number of found embeddings: {num_found}/{len(vocab)}')
+
+def tokenize_texts(tokenizer, texts, num_workers=1, chunk_size=2000, desc="===>tokenize texts"):
+    '''
+        Tokenize texts once, in chunks shared across num_workers processes.
+
+        Returns:
+            the token list of each text (in order) and the document frequency of each token.
+    '''
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    token_lists = list()
+    doc_counts = Counter()
+
+    if num_workers > 1 and len(chunks) > 1:
+        with multiprocessing.Pool(num_workers, initializer=init_tokenize_worker, initargs=(tokenizer,)) as pool:
+            for chunk_tokens, chunk_counts in tqdm(pool.imap(tokenize_chunk, chunks), total=len(chunks), desc=desc):
+                token_lists.extend(chunk_tokens)
+                doc_counts.update(chunk_counts)
+    else:
+        init_tokenize_worker(tokenizer)
+        for chunk in tqdm(chunks, desc=desc):
+            chunk_tokens, chunk_counts = tokenize_chunk(chunk)
+            token_lists.extend(chunk_tokens)
+            doc_counts.update(chunk_counts)
+
+    return token_lists, doc_counts
+
+
+@contextlib.contextmanager
+def tokenize_pool(tokenizer, num_workers=1):
+    '''
+        A map function over a list of text chunks, returning the (token lists, document frequencies)
+        of each chunk. Used for streamed input, where only the chunks passed at once are in memory.
+    '''
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers, initializer=init_tokenize_worker, initargs=(tokenizer,)) as pool:
+            yield lambda chunks: pool.map(tokenize_chunk, chunks)
+    else:
+        init_tokenize_worker(tokenizer)
+        yield lambda chunks: [tokenize_chunk(chunk) for chunk in chunks]
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def make_bow(token_lists, word2id, dtype=np.int32):
+    '''
+        Parsed texts (tokens in the vocabulary) and CSR BoW of tokenized texts.
+        Raises ValueError if a count does not fit in dtype.
+    '''
+    parsed_texts = list()
+    ids = list()
+    lengths = np.zeros(len(token_lists), dtype=np.int64)
+    for i, tokens in enumerate(token_lists):
+        tokens = [t for t in tokens if t in word2id]
+        parsed_texts.append(' '.join(tokens))
+        ids.extend(word2id[t] for t in tokens)
+        lengths[i] = len(tokens)
+
+    # one row per text with the id of each token; duplicates are summed into counts.
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    indices = np.asarray(ids, dtype=np.int32)
+    bow = scipy.sparse.csr_matrix((np.ones(len(indices), dtype=np.int64), indices, indptr), shape=(len(token_lists), len(word2id)))
+    bow.sum_duplicates()
+
+    if bow.nnz and bow.data.max() > np.iinfo(dtype).max:
+        raise ValueError(f'a word count of {bow.data.max()} does not fit in {np.dtype(dtype).name}')
+    return parsed_texts, bow.astype(dtype)
+
+
+# local copies of pretrained word vectors, memory-mapped after the first download.
+WORD_VECTORS_CACHE_DIR = os.environ.get('TOPMOST_WORD_VECTORS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'topmost', 'word_vectors'))
+
+
+def load_word_vectors(name='glove-wiki-gigaword-200', cache_dir=WORD_VECTORS_CACHE_DIR):
+    '''
+        Returns the word-to-row dict and the (memory-mapped) vectors of pretrained word vectors.
+        The first call downloads them with gensim.downloader and saves {name}.npy and {name}.vocab.txt
+        in cache_dir; later calls, also offline ones, only read these files.
+    '''
+    path = os.path.join(cache_dir, name)
+    if not os.path.isfile(f'{path}.vocab.txt'):
+        import gensim.downloader
+        keyed_vectors = gensim.downloader.load(name)
+        try:
+            keys = keyed_vectors.index_to_key
+        except AttributeError:
+            keys = keyed_vectors.index2word
+
+        file_utils.make_dir(cache_dir)
+        np.save(f'{path}.npy', keyed_vectors.vectors)
+        # written last, so an interrupted copy is redone.
+        file_utils.save_text(keys, f'{path}.vocab.txt')
+
+    keys = file_utils.read_text(f'{path}.vocab.txt')
+    vectors = np.load(f'{path}.npy', mmap_mode='r')
+    return dict(zip(keys, range(len(keys)))), vectors
+
+
+def make_word_embeddings(vocab, name='glove-wiki-gigaword-200', cache_dir=WORD_VECTORS_CACHE_DIR):
+    key_to_index, vectors = load_word_vectors(name, cache_dir)
+
+    # gather the rows of all found words at once.
+    ids = np.asarray([key_to_index.get(word, -1) for word in vocab], dtype=np.int64)
+    found = ids >= 0
+    word_embeddings = np.zeros((len(vocab), vectors.shape[1]))
+    word_embeddings[found] = vectors[ids[found]]
+
+    print(f'===> number of found embeddings: {found.sum()}/{len(vocab)}')
 
     return scipy.sparse.csr_matrix(word_embeddings)
 
 
 class Preprocessing:
-    def __init__(self, tokenizer=None, test_sample_size=None, test_p=0.2, stopwords=None, min_doc_count=0, max_doc_freq=1.0, keep_num=False, keep_alphanum=False, strip_html=False, no_lower=False, min_length=3, min_term=1, vocab_size=None, seed=42):
+    def __init__(self, tokenizer=None, test_sample_size=None, test_p=0.2, stopwords=None, min_doc_count=0, max_doc_freq=1.0, keep_num=False, keep_alphanum=False, strip_html=False, no_lower=False, min_length=3, min_term=1, vocab_size=None, seed=42, embedding_model='all-MiniLM-L6-v2', embedding_cache_dir=EMBEDDING_CACHE_DIR, num_workers=1, bow_dtype='int32', word_vectors_cache_dir=WORD_VECTORS_CACHE_DIR):
         """
         Args:
             test_sample_size:
@@ -191,6 +336,16 @@ class Preprocessing:
                 Size of the vocabulary (by most common in the union of train and test sets, following above exclusions)
             seed:
                 Random integer seed (only relevant for choosing test set)
+            embedding_model:
+                SentenceTransformer model of the contextual embeddings (train_bert, test_bert).
+            embedding_cache_dir:
+                Directory of the embedding cache; only documents not encoded before are encoded (None: no cache).
+            num_workers:
+                Number of processes that tokenize the texts.
+            bow_dtype:
+                Integer dtype of the sparse BoW counts; a count that does not fit raises an error.
+            word_vectors_cache_dir:
+                Directory of the local copies of the pretrained word vectors (see load_word_vectors).
         """
 
         self.test_sample_size = test_sample_size
@@ -200,28 +355,46 @@ class Preprocessing:
         self.test_p = test_p
         self.vocab_size = vocab_size
         self.seed = seed
+        self.embedding_model = embedding_model
+        self.embedding_cache_dir = embedding_cache_dir
+        self.num_workers = num_workers
+        self.bow_dtype = np.dtype(bow_dtype)
+        self.word_vectors_cache_dir = word_vectors_cache_dir
 
         if tokenizer is not None:
             self.tokenizer = tokenizer
+            self.tokenizer_settings = None
         else:
-            self.tokenizer = Tokenizer(
-                stopwords, keep_num, keep_alphanum, strip_html, no_lower, min_length).tokenize
+            tokenizer = Tokenizer(stopwords, keep_num, keep_alphanum, strip_html, no_lower, min_length)
+            self.tokenizer = tokenizer.tokenize
+            self.tokenizer_settings = tokenizer.settings
+
+    def save_tokenizer(self, output_dir):
+        # settings of the default Tokenizer, read by load_tokenizer; a custom tokenizer is not saved.
+        if self.tokenizer_settings is not None:
+            with open(f"{output_dir}/tokenizer.json", 'w', encoding='utf-8') as file:
+                json.dump(self.tokenizer_settings, file)
 
     def parse(self, texts, vocab):
         if not isinstance(texts, list):
             texts = [texts]
 
+        token_lists, _ = tokenize_texts(self.tokenizer, texts, self.num_workers, desc="===>parse texts")
+        return self.parse_tokens(token_lists, vocab)
+
+    def parse_tokens(self, token_lists, vocab, chunk_size=10000):
+        # parsed texts and CSR BoW of tokenized texts, keeping the tokens in vocab.
+        word2id = dict(zip(vocab, range(len(vocab))))
         parsed_texts = list()
-        for i, text in enumerate(tqdm(texts, desc="===>parse texts")):
-            tokens = self.tokenizer(text)
-            tokens = [t for t in tokens if t in vocab]
-            parsed_texts.append(' '.join(tokens))
+        bow_chunks = list()
+        for start in range(0, len(token_lists), chunk_size):
+            chunk_texts, chunk_bow = make_bow(token_lists[start:start + chunk_size], word2id, self.bow_dtype)
+            parsed_texts.extend(chunk_texts)
+            bow_chunks.append(chunk_bow)
 
-        vectorizer = CountVectorizer(
-            vocabulary=vocab, tokenizer=lambda x: x.split())
-        bow = vectorizer.fit_transform(parsed_texts)
-        bow = bow.toarray().astype(np.int8)
-        return parsed_texts, bow
+        if not bow_chunks:
+            return parsed_texts, scipy.sparse.csr_matrix((0, len(vocab)), dtype=self.bow_dtype)
+        return parsed_texts, scipy.sparse.vstack(bow_chunks, format='csr')
 
     def preprocess_jsonlist(self, dataset_dir, label_name=None):
         train_items = file_utils.read_jsonlist(
@@ -256,6 +429,118 @@ class Preprocessing:
 
         return rst
 
+    def iter_jsonlist_chunks(self, path, label_name=None, chunk_size=10000):
+        # (cleaned raw texts, labels) of chunks of a jsonlist file.
+        texts = list()
+        labels = list()
+        for item in file_utils.iter_jsonlist(path):
+            texts.append(clean_raw_text(item['text']))
+            if label_name is not None:
+                labels.append(item[label_name])
+
+            if len(texts) == chunk_size:
+                yield texts, labels
+                texts = list()
+                labels = list()
+
+        if texts:
+            yield texts, labels
+
+    def build_vocab(self, doc_counts_counter, num_docs):
+        words, doc_counts = zip(*doc_counts_counter.most_common())
+        doc_freqs = np.array(doc_counts) / float(num_docs)
+        vocab = [word for i, word in enumerate(
+            words) if doc_counts[i] >= self.min_doc_count and doc_freqs[i] <= self.max_doc_freq]
+
+        # filter vocabulary
+        if self.vocab_size is not None:
+            vocab = vocab[:self.vocab_size]
+
+        vocab.sort()
+        return vocab
+
+    def preprocess_jsonlist_streaming(self, dataset_dir, output_dir, label_name=None, chunk_size=10000):
+        '''
+            Preprocess {dataset_dir}/train.jsonlist and test.jsonlist with bounded memory and write
+            the dataset to output_dir, in the format of save().
+
+            Pass 1 streams the files to count document frequencies and build the vocabulary.
+            Pass 2 streams them again and writes the texts, labels and CSR BoW of each chunk to disk;
+            the chunks are stacked into {split}_bow.npz at the end.
+            Only chunk_size * num_workers texts are in memory at a time. The final stacking loads
+            the CSR BoW of a whole split, which takes memory proportional to its nonzero counts.
+            Contextual embeddings are not computed here; BasicDatasetHandler(contextual_embed=True)
+            computes and caches them when with_bert is missing.
+        '''
+        num_workers = max(self.num_workers, 1)
+        splits = [split for split in ('train', 'test') if os.path.isfile(os.path.join(dataset_dir, f'{split}.jsonlist'))]
+
+        def iter_chunks(split):
+            return self.iter_jsonlist_chunks(os.path.join(dataset_dir, f'{split}.jsonlist'), label_name, chunk_size)
+
+        with tokenize_pool(self.tokenizer, self.num_workers) as map_chunks:
+            # pass 1: document frequencies and labels.
+            doc_counts_counter = Counter()
+            num_docs = 0
+            label_set = set()
+            for split in splits:
+                for batch in tqdm(batched(iter_chunks(split), num_workers), desc=f"===>count {split} texts"):
+                    for _, chunk_counts in map_chunks([texts for texts, _ in batch]):
+                        doc_counts_counter.update(chunk_counts)
+                    for texts, labels in batch:
+                        num_docs += len(texts)
+                        if split == 'train':
+                            label_set.update(labels)
+
+            vocab = self.build_vocab(doc_counts_counter, num_docs)
+            word2id = dict(zip(vocab, range(len(vocab))))
+            label_list = sorted(label_set)
+            label2id = dict(zip(label_list, range(len(label_list))))
+            if label_name is not None:
+                print("label2id: ", label2id)
+
+            file_utils.make_dir(output_dir)
+            file_utils.save_text(vocab, f"{output_dir}/vocab.txt")
+            self.save_tokenizer(output_dir)
+
+            # pass 2: texts, labels and BoW chunks.
+            for split in splits:
+                chunk_dir = os.path.join(output_dir, f'{split}_bow_chunks')
+                file_utils.make_dir(chunk_dir)
+                chunk_paths = list()
+                split_size = 0
+
+                with open(f"{output_dir}/{split}_texts.txt", 'w', encoding='utf-8') as texts_file, \
+                        open(f"{output_dir}/raw_{split}_texts.txt", 'w', encoding='utf-8') as raw_texts_file, \
+                        open(f"{output_dir}/{split}_labels.txt", 'w') as labels_file:
+
+                    for batch in tqdm(batched(iter_chunks(split), num_workers), desc=f"===>parse {split} texts"):
+                        for (raw_texts, labels), (token_lists, _) in zip(batch, map_chunks([texts for texts, _ in batch])):
+                            parsed_texts, bow = make_bow(token_lists, word2id, self.bow_dtype)
+
+                            # drop documents without any word in the vocabulary.
+                            idx = np.flatnonzero(np.diff(bow.indptr) > 0)
+                            for i in idx:
+                                texts_file.write(parsed_texts[i] + '\n')
+                                raw_texts_file.write(raw_texts[i].strip() + '\n')
+                                if label_name is not None:
+                                    labels_file.write(f'{label2id[labels[i]]}\n')
+
+                            chunk_paths.append(os.path.join(chunk_dir, f'{len(chunk_paths):05d}.npz'))
+                            scipy.sparse.save_npz(chunk_paths[-1], bow[idx])
+                            split_size += len(idx)
+
+                if label_name is None:
+                    os.remove(f"{output_dir}/{split}_labels.txt")
+
+                bow = scipy.sparse.vstack([scipy.sparse.load_npz(path) for path in chunk_paths], format='csr')
+                scipy.sparse.save_npz(f"{output_dir}/{split}_bow.npz", bow)
+                shutil.rmtree(chunk_dir)
+                print(f"===>{split} size: {split_size}")
+
+        scipy.sparse.save_npz(f"{output_dir}/word_embeddings.npz", make_word_embeddings(vocab, cache_dir=self.word_vectors_cache_dir))
+        return vocab
+
     def convert_labels(self, train_labels, test_labels):
         if train_labels is not None:
             label_list = list(set(train_labels))
@@ -272,65 +557,40 @@ class Preprocessing:
 
         return train_labels, test_labels
 
+    def encode(self, texts):
+        return load_contextual_embed(texts, device=None, model_name=self.embedding_model, cache_dir=self.embedding_cache_dir)
+
     def preprocess(self, raw_train_texts, train_labels=None, raw_test_texts=None, test_labels=None):
         rst = {}
 
         np.random.seed(self.seed)
-        bert_model = sentence_transformers.SentenceTransformer(
-            'all-MiniLM-L6-v2')
-
-        train_texts = list()
-        test_texts = list()
-        word_counts = Counter()
-        doc_counts_counter = Counter()
 
         train_labels, test_labels = self.convert_labels(
             train_labels, test_labels)
 
-        raw_train_texts = [re.sub("\'", "", re.sub(
-            '\S*@\S*\s?', '', re.sub('\s+', ' ', x))) for x in raw_train_texts]
-        train_bert_emb = bert_model.encode(
-            raw_train_texts, batch_size=256, show_progress_bar=True)
-        for text in tqdm(raw_train_texts, desc="===>parse train texts"):
-            tokens = self.tokenizer(text)
-            word_counts.update(tokens)
-            doc_counts_counter.update(set(tokens))
-            parsed_text = ' '.join(tokens)
-            train_texts.append(parsed_text)
+        raw_train_texts = [clean_raw_text(x) for x in raw_train_texts]
+        train_bert_emb = self.encode(raw_train_texts)
+        # each text is tokenized once; the token lists give both the vocabulary and the BoW.
+        train_tokens, doc_counts_counter = tokenize_texts(
+            self.tokenizer, raw_train_texts, self.num_workers, desc="===>parse train texts")
 
+        test_tokens = list()
         if raw_test_texts:
-            raw_test_texts = [re.sub("\'", "", re.sub(
-                '\S*@\S*\s?', '', re.sub('\s+', ' ', x))) for x in raw_test_texts]
-            test_bert_emb = bert_model.encode(
-                raw_test_texts, batch_size=256, show_progress_bar=True)
-            for text in tqdm(raw_test_texts, desc="===>parse test texts"):
-                tokens = self.tokenizer(text)
-                word_counts.update(tokens)
-                doc_counts_counter.update(set(tokens))
-                parsed_text = ' '.join(tokens)
-                test_texts.append(parsed_text)
+            raw_test_texts = [clean_raw_text(x) for x in raw_test_texts]
+            test_bert_emb = self.encode(raw_test_texts)
+            test_tokens, test_doc_counts = tokenize_texts(
+                self.tokenizer, raw_test_texts, self.num_workers, desc="===>parse test texts")
+            doc_counts_counter.update(test_doc_counts)
         
         print('raw test text: ', raw_test_texts)
 
-        words, doc_counts = zip(*doc_counts_counter.most_common())
-        doc_freqs = np.array(doc_counts) / \
-            float(len(train_texts) + len(test_texts))
-        vocab = [word for i, word in enumerate(
-            words) if doc_counts[i] >= self.min_doc_count and doc_freqs[i] <= self.max_doc_freq]
-
-        # filter vocabulary
-        if self.vocab_size is not None:
-            vocab = vocab[:self.vocab_size]
-
-        vocab.sort()
+        vocab = self.build_vocab(doc_counts_counter, len(train_tokens) + len(test_tokens))
 
-        train_texts, train_bow = self.parse(
-            np.asarray(train_texts).tolist(), vocab)
+        train_texts, train_bow = self.parse_tokens(train_tokens, vocab)
         train_idx = [i for i, text in enumerate(
             train_texts) if len(text.split()) >= 1 and text != '']
         if raw_test_texts is not None:
-            test_texts, test_bow = self.parse(
-                np.asarray(test_texts).tolist(), vocab)
+            test_texts, test_bow = self.parse_tokens(test_tokens, vocab)
             test_idx = [i for i, text in enumerate(
                 test_texts) if len(text.split()) >= 1 and text != '']
 
@@ -377,7 +637,7 @@ class Preprocessing:
         rst['vocab'] = vocab
         rst['train_bow'] = train_bow[train_idx]
         rst['train_texts'] = np.asarray(train_texts)[train_idx]
-        rst['word_embeddings'] = make_word_embeddings(vocab)
+        rst['word_embeddings'] = make_word_embeddings(vocab, cache_dir=self.word_vectors_cache_dir)
         rst['train_bert'] = train_bert_emb[train_idx]
         rst['raw_train_texts'] = np.asarray(raw_train_texts)[
             train_idx].tolist()
@@ -400,6 +660,7 @@ class Preprocessing:
         file_utils.make_dir(output_dir)
 
         file_utils.save_text(vocab, f"{output_dir}/vocab.txt")
+        self.save_tokenizer(output_dir)
         file_utils.save_text(train_texts, f"{output_dir}/train_texts.txt")
         file_utils.save_text(
             raw_train_texts, f"{output_dir}/raw_train_texts.txt")
@@ -0,0 +1,11 @@
+# batch inference of a trained run; torch and the model are imported on first access.
+from ..utils.lazy_import import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'TopicModelService': '.service',
+    'serve_http': '.server',
+    'serve_stdin': '.server',
+    'export_encoder': '.export',
+    'fold_batchnorm': '.export',
+    'load_encoder': '.loader',
+})
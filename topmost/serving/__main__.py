@@ -0,0 +1,34 @@
+'''
+Serve a trained run of main.py, e.g.,
+    python -m topmost.serving results/<run> --port 8000
+    python -m topmost.serving results/<run> --stdin < texts.txt > topics.jsonl
+'''
+
+import argparse
+
+from .service import TopicModelService
+from .server import serve_http, serve_stdin
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('topmost.serving')
+    parser.add_argument('run_dir', type=str, help='directory with config.txt, checkpoint.pt, vocab.txt and tokenizer.json')
+    parser.add_argument('--vocab', type=str, default=None, help='vocab.txt, if not in run_dir')
+    parser.add_argument('--tokenizer', type=str, default=None, help='tokenizer.json of the dataset, if not in run_dir')
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--max_batch_size', type=int, default=256)
+    parser.add_argument('--max_wait', type=float, default=0.005,
+                        help='seconds a request waits for others to fill its batch')
+    parser.add_argument('--num_top_topics', type=int, default=3)
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--stdin', action='store_true', default=False,
+                        help='read one text per line from stdin and write JSON lines to stdout')
+    args = parser.parse_args()
+
+    with TopicModelService(args.run_dir, args.vocab, args.tokenizer, args.device, args.max_batch_size,
+                           args.max_wait, args.num_top_topics) as service:
+        if args.stdin:
+            serve_stdin(service)
+        else:
+            serve_http(service, args.host, args.port)
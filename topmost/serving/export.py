@@ -0,0 +1,139 @@
+'''
+Export the eval-mode encoder and the frozen beta of a trained model to TorchScript or ONNX, e.g.,
+    python -m topmost.serving.export results/<run> encoder.pt
+The artifact is loaded by topmost/serving/loader.py without importing topmost.
+'''
+
+import os
+import argparse
+import numpy as np
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+
+# models whose eval-mode theta is softmax(mean_bn(fc21(act(fc12(act(fc11(bow))))))), and their act.
+# XTMv2-4 gate their topics with sampled experts and are not exported.
+ENCODER_ACTIVATIONS = {
+    'ProdLDA': 'softplus',
+    'DecTM': 'softplus',
+    'TSCTM': 'softplus',
+    'ECRTM': 'softplus',
+    'XTM': 'softplus',
+    'ZTM': 'softplus',
+    'OTClusterTM': 'softplus',
+    'YTM': 'relu',
+}
+
+
+def fold_batchnorm(linear, bn):
+    '''
+        A Linear layer computing bn(linear(x)) with the running statistics of an eval-mode BatchNorm1d.
+    '''
+    if bn.running_mean is None:
+        raise ValueError('a BatchNorm1d without running statistics cannot be folded')
+
+    with torch.no_grad():
+        scale = torch.rsqrt(bn.running_var + bn.eps)
+        if bn.weight is not None:
+            scale = scale * bn.weight
+        bias = linear.bias if linear.bias is not None else torch.zeros_like(bn.running_mean)
+        folded_bias = (bias - bn.running_mean) * scale
+        if bn.bias is not None:
+            folded_bias = folded_bias + bn.bias
+
+        folded = nn.Linear(linear.in_features, linear.out_features).to(linear.weight.device)
+        folded.weight.copy_(linear.weight * scale[:, None])
+        folded.bias.copy_(folded_bias)
+    return folded
+
+
+class TopicEncoder(nn.Module):
+    '''
+        The eval-mode encoder of a model, with mean_bn folded into fc21, and its beta (KxV) as a buffer.
+    '''
+    def __init__(self, fc11, fc12, fc21, beta, activation='softplus'):
+        super().__init__()
+        self.fc11 = fc11
+        self.fc12 = fc12
+        self.fc21 = fc21
+        self.activation = F.relu if activation == 'relu' else F.softplus
+        self.register_buffer('beta', beta)
+
+    def forward(self, bow):
+        e1 = self.activation(self.fc11(bow))
+        e1 = self.activation(self.fc12(e1))
+        return F.softmax(self.fc21(e1), dim=1)
+
+
+def make_encoder(model, model_name=None):
+    # TopicEncoder of model on the CPU, checked against model.get_theta.
+    model_name = model_name or type(model).__name__
+    if model_name not in ENCODER_ACTIVATIONS:
+        raise NotImplementedError(f'exporting the encoder of {model_name} is not supported')
+
+    model.eval()
+    device = model.fc11.weight.device
+    with torch.no_grad():
+        encoder = TopicEncoder(nn.Linear(model.fc11.in_features, model.fc11.out_features),
+                               nn.Linear(model.fc12.in_features, model.fc12.out_features),
+                               fold_batchnorm(model.fc21, model.mean_bn).cpu(),
+                               model.get_beta().detach().float().cpu().clone(),
+                               ENCODER_ACTIVATIONS[model_name])
+        encoder.fc11.load_state_dict(model.fc11.state_dict())
+        encoder.fc12.load_state_dict(model.fc12.state_dict())
+        encoder.eval()
+
+        bow = torch.rand(8, model.fc11.in_features)
+        expected = model.get_theta(bow.to(device)).float().cpu()
+        if not torch.allclose(encoder(bow), expected, atol=1e-5):
+            raise ValueError(f'the exported encoder does not reproduce the theta of {model_name}')
+
+    return encoder
+
+
+def export_encoder(model, path, vocab=None, model_name=None):
+    '''
+        Export the encoder and beta of model to path: ONNX if path ends with .onnx, TorchScript otherwise.
+
+        The TorchScript module holds beta as a buffer and vocab as the extra file vocab.txt.
+        ONNX keeps beta and vocab next to the model, as {root}.beta.npy and {root}.vocab.txt.
+
+        Args:
+            model_name: key of the model in MODEL_DICT, if it differs from its class name.
+    '''
+    encoder = make_encoder(model, model_name)
+    example = torch.zeros(2, encoder.fc11.in_features)
+
+    if path.endswith('.onnx'):
+        torch.onnx.export(encoder, example, path, input_names=['bow'], output_names=['theta'],
+                          dynamic_axes={'bow': {0: 'batch'}, 'theta': {0: 'batch'}})
+        root = os.path.splitext(path)[0]
+        np.save(f'{root}.beta.npy', encoder.beta.numpy())
+        if vocab is not None:
+            with open(f'{root}.vocab.txt', 'w', encoding='utf-8') as file:
+                file.write('\n'.join(vocab) + '\n')
+    else:
+        with torch.no_grad():
+            traced = torch.jit.trace(encoder, example)
+        extra_files = {'vocab.txt': '\n'.join(vocab) if vocab is not None else ''}
+        torch.jit.save(traced, path, _extra_files=extra_files)
+
+    return encoder
+
+
+if __name__ == '__main__':
+    from topmost.data import file_utils
+    from topmost.utils import config
+    from .service import load_model
+
+    parser = argparse.ArgumentParser('topmost.serving.export')
+    parser.add_argument('run_dir', type=str, help='directory with config.txt, checkpoint.pt and vocab.txt')
+    parser.add_argument('path', type=str, help='output file, ONNX if it ends with .onnx, TorchScript otherwise')
+    parser.add_argument('--vocab', type=str, default=None, help='vocab.txt, if not in run_dir')
+    args = parser.parse_args()
+
+    run_args = config.load_config(os.path.join(args.run_dir, 'config.txt'))
+    vocab = file_utils.read_text(args.vocab or os.path.join(args.run_dir, 'vocab.txt'))
+    model = load_model(args.run_dir, run_args, len(vocab))
+    export_encoder(model, args.path, vocab, run_args.model)
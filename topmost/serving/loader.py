@@ -0,0 +1,65 @@
+'''
+Load an encoder exported by topmost.serving.export.
+
+This file does not import topmost: it only needs torch for TorchScript, or onnxruntime for ONNX,
+and can be copied into a worker on its own.
+'''
+
+import os
+import numpy as np
+
+
+def read_vocab(text):
+    vocab = [word for word in text.split('\n') if word]
+    return vocab or None
+
+
+class ExportedEncoder:
+    '''
+        theta of BoW inputs (NxV arrays) with an exported encoder.
+
+        Attributes:
+            beta: KxV topic-word distributions.
+            vocab: the vocabulary of the BoW columns, or None if it was not exported.
+    '''
+    def __init__(self, path):
+        self.onnx = path.endswith('.onnx')
+        if self.onnx:
+            import onnxruntime
+            self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+            root = os.path.splitext(path)[0]
+            self.beta = np.load(f'{root}.beta.npy')
+            self.vocab = None
+            if os.path.exists(f'{root}.vocab.txt'):
+                with open(f'{root}.vocab.txt', 'r', encoding='utf-8') as file:
+                    self.vocab = read_vocab(file.read())
+        else:
+            import torch
+            extra_files = {'vocab.txt': ''}
+            self.module = torch.jit.load(path, map_location='cpu', _extra_files=extra_files)
+            self.beta = self.module.beta.numpy()
+            vocab = extra_files['vocab.txt']
+            self.vocab = read_vocab(vocab.decode('utf-8') if isinstance(vocab, bytes) else vocab)
+
+    def __call__(self, bow):
+        # bow: NxV array, or a scipy sparse matrix.
+        if hasattr(bow, 'toarray'):
+            bow = bow.toarray()
+        bow = np.asarray(bow, dtype=np.float32)
+
+        if self.onnx:
+            return self.session.run(['theta'], {'bow': bow})[0]
+
+        import torch
+        with torch.inference_mode():
+            return self.module(torch.from_numpy(bow)).numpy()
+
+    def top_words(self, num_top_words=15):
+        top_word_ids = np.argsort(-self.beta, axis=1)[:, :num_top_words]
+        if self.vocab is None:
+            return top_word_ids
+        return [[self.vocab[i] for i in ids] for ids in top_word_ids]
+
+
+def load_encoder(path):
+    return ExportedEncoder(path)
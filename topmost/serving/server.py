@@ -0,0 +1,79 @@
+import sys
+import json
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def format_results(theta, top_topics):
+    # one JSON object per text.
+    return [{'theta': doc_theta.tolist(),
+             'top_topics': [[int(k), float(doc_theta[k])] for k in doc_top_topics]}
+            for doc_theta, doc_top_topics in zip(theta, top_topics)]
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        '''
+            POST /infer with {"texts": [...]} returns {"results": [{"theta": [...], "top_topics": [[topic, weight], ...]}, ...]}.
+            GET /health returns {"model": ..., "vocab_size": ...}.
+        '''
+        def send_json(self, code, obj):
+            body = json.dumps(obj).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                self.send_json(404, {'error': f'unknown path {self.path}'})
+                return
+            self.send_json(200, {'model': service.args.model, 'vocab_size': len(service.vocab)})
+
+        def do_POST(self):
+            if self.path != '/infer':
+                self.send_json(404, {'error': f'unknown path {self.path}'})
+                return
+
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                texts = request['texts']
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError('texts must be a list of strings')
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {'error': str(e)})
+                return
+
+            theta, top_topics = service.predict(texts)
+            self.send_json(200, {'results': format_results(theta, top_topics)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve_http(service, host='127.0.0.1', port=8000):
+    # requests are handled in threads, so concurrent requests share the batches of service.
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f'serving {service.args.model} on http://{host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def serve_stdin(service, input_file=sys.stdin, output_file=sys.stdout):
+    # one text per input line and one JSON result per output line, read in chunks of max_batch_size lines.
+    lines = (line.rstrip('\n') for line in input_file)
+    while True:
+        texts = list(itertools.islice(lines, service.max_batch_size))
+        if not texts:
+            return
+        theta, top_topics = service.predict(texts)
+        for result in format_results(theta, top_topics):
+            output_file.write(json.dumps(result) + '\n')
+        output_file.flush()
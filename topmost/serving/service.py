@@ -0,0 +1,150 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+import torch
+
+from topmost.data import file_utils
+from topmost.data.sparse_bow import SparseBow
+from topmost.models import build_model
+from topmost.preprocessing.preprocessing import clean_raw_text, load_tokenizer, make_bow
+from topmost.trainers.inference import infer_theta
+from topmost.utils import config
+
+
+# models whose theta depends on more than the BoW of a document.
+UNSUPPORTED_MODELS = ['CombinedTM', 'NMTM', 'InfoCTM', 'DETM']
+
+
+def load_model(run_dir, args, vocab_size, device='cpu'):
+    # the model of args with the weights of run_dir/checkpoint.pt, in eval mode.
+    state_dict = torch.load(os.path.join(run_dir, 'checkpoint.pt'), map_location=device)
+    # the pretrained word embeddings are only needed for their shape; the checkpoint holds the trained ones.
+    pretrained_WE = None
+    if 'word_embeddings' in state_dict:
+        pretrained_WE = np.zeros(state_dict['word_embeddings'].shape, dtype='float32')
+    model = build_model(args, vocab_size, pretrained_WE=pretrained_WE)
+    model.load_state_dict(state_dict)
+    model = model.to(device)
+    model.eval()
+    return model
+
+
+class TopicModelService:
+    '''
+        Infer the topics of raw texts with a trained run of main.py.
+
+        The run directory holds config.txt, checkpoint.pt, vocab.txt and tokenizer.json
+        (the Tokenizer settings of the preprocessed dataset), loaded once.
+        Concurrent calls of predict are queued and inferred together by a worker thread:
+        a batch is started when it has max_batch_size texts or its first request has waited max_wait seconds.
+    '''
+    def __init__(self, run_dir, vocab_path=None, tokenizer_path=None, device='cpu', max_batch_size=256, max_wait=0.005, num_top_topics=3, max_token_cache=1000000):
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.num_top_topics = num_top_topics
+        self.max_token_cache = max_token_cache
+
+        self.args = config.load_config(os.path.join(run_dir, 'config.txt'))
+        if self.args.model in UNSUPPORTED_MODELS:
+            raise NotImplementedError(f'serving {self.args.model} is not supported')
+
+        self.vocab = file_utils.read_text(vocab_path or os.path.join(run_dir, 'vocab.txt'))
+        self.word2id = dict(zip(self.vocab, range(len(self.vocab))))
+        self.tokenizer = load_tokenizer(tokenizer_path or os.path.join(run_dir, 'tokenizer.json'))
+
+        self.model = load_model(run_dir, self.args, len(self.vocab), device)
+
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.serve_forever, daemon=True)
+        self.worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+
+    def submit(self, texts):
+        # a Future of (theta, top_topics) of texts.
+        future = Future()
+        self.requests.put((list(texts), future))
+        return future
+
+    def predict(self, texts):
+        '''
+            Returns:
+                theta (NxK) and the top num_top_topics topics of each text (N x num_top_topics), by decreasing weight.
+        '''
+        return self.submit(texts).result()
+
+    def vectorize(self, texts):
+        if len(self.tokenizer.token_cache) > self.max_token_cache:
+            self.tokenizer.token_cache.clear()
+        token_lists = [self.tokenizer.tokenize(clean_raw_text(text)) for text in texts]
+        _, bow = make_bow(token_lists, self.word2id)
+        return SparseBow(bow, self.device)
+
+    def get_theta(self, bow):
+        theta = self.model.get_theta(bow)
+        # hierarchical models return the theta of each layer.
+        if isinstance(theta, (list, tuple)):
+            theta = theta[-1]
+        return theta
+
+    def infer(self, texts):
+        theta, _ = infer_theta(self.get_theta, [self.vectorize(texts)], self.max_batch_size)
+        top_topics = np.argsort(-theta, axis=1)[:, :self.num_top_topics]
+        return theta, top_topics
+
+    def next_batch(self):
+        # requests of the next batch; None when the service is closed.
+        request = self.requests.get()
+        if request is None:
+            return None
+
+        batch = [request]
+        size = len(request[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # close after this batch.
+                self.requests.put(None)
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def serve_forever(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                theta, top_topics = self.infer(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for request_texts, future in batch:
+                end = start + len(request_texts)
+                future.set_result((theta[start:end], top_topics[start:end]))
+                start = end
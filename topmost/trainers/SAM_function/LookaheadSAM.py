@@ -24,13 +24,45 @@ class AOSAM(torch.optim.Optimizer):
         self.k2 = k2
 
     def _grad_norm(self):
-        norm = torch.norm(
-                torch.stack([
-                    ((torch.abs(p) if group["adaptive"] else 1.0) * p.grad).norm(p=2)
-                    for group in self.param_groups for p in group["params"] if p.grad is not None]),  
-                    p=2)
+        # one fused norm call per param group instead of one kernel per parameter.
+        norms = list()
+        for group in self.param_groups:
+            params = [p for p in group["params"] if p.grad is not None]
+            if not params: continue
+            grads = [p.grad for p in params]
+            if group["adaptive"]:
+                grads = torch._foreach_mul(torch._foreach_abs(params), grads)
+            norms.extend(torch._foreach_norm(grads))
+        norm = torch.norm(torch.stack(norms), p=2)
         return norm
 
+    @torch.no_grad()
+    def update_statistics(self, c_t, grad_scale=None):
+        """ Update mu_t, sigma_t with the current squared gradient norm.
+            Returns (use_sam, grad_norm): use_sam is a 0-dim bool tensor, so nothing is read back
+            to the host here; grad_norm can be passed to first_step to avoid computing it again.
+            grad_scale: loss scale of a GradScaler when the gradients are still scaled.
+                The perturbation of first_step does not depend on the gradient scale,
+                only the statistics need the true norm. Steps with inf/nan gradients leave them unchanged.
+        """
+        grad_norm = self._grad_norm()
+        sq_norm = grad_norm.double() ** 2
+        if grad_scale is not None:
+            sq_norm = sq_norm / grad_scale.double() ** 2
+
+        if not torch.is_tensor(self.mu_t):
+            self.mu_t = sq_norm.new_tensor(self.mu_t)
+            self.sigma_t = sq_norm.new_tensor(self.sigma_t)
+
+        finite = torch.isfinite(sq_norm)
+        mu_t = self.delta * self.mu_t + (1 - self.delta) * sq_norm
+        sigma_t = self.delta * self.sigma_t + (1 - self.delta) * (sq_norm - mu_t)**2
+        self.mu_t = torch.where(finite, mu_t, self.mu_t)
+        self.sigma_t = torch.where(finite, sigma_t, self.sigma_t)
+
+        use_sam = finite & (sq_norm >= (self.mu_t + c_t * self.sigma_t.sqrt()))
+        return use_sam, grad_norm
+
     # def compute_ct(self, t):
     #     T = self.defaults["T"]
     #     k1 = self.defaults["k1"]
@@ -65,14 +97,19 @@ class AOSAM(torch.optim.Optimizer):
     
 
     @torch.no_grad()
-    def first_step(self, zero_grad=False):
-        grad_norm = self._grad_norm()
+    def first_step(self, zero_grad=False, grad_norm=None):
+        if grad_norm is None:
+            grad_norm = self._grad_norm()
         for group in self.param_groups:
             scale = group["rho"] / (grad_norm + 1e-12)
 
             for p in group["params"]:
                 if p.grad is None: continue
-                self.state[p]["old_p"] = p.data.clone()
+                # reuse the buffer of the previous step instead of cloning.
+                state = self.state[p]
+                if "old_p" not in state:
+                    state["old_p"] = torch.empty_like(p.data)
+                state["old_p"].copy_(p.data)
                 e_w = (torch.pow(p, 2) if group["adaptive"] else 1.0) * p.grad * scale.to(p)
                 
                 # Compute: w + e(w)
@@ -82,16 +119,19 @@ class AOSAM(torch.optim.Optimizer):
 
 
     @torch.no_grad()
-    def second_step(self, zero_grad=False):
+    def second_step(self, zero_grad=False, scaler=None):
         for group in self.param_groups:
             for p in group["params"]:
                 if p.grad is None: continue
 
                 # Get back to w from w + e(w)
-                p.data = self.state[p]["old_p"] 
+                p.data.copy_(self.state[p]["old_p"])
 
-        # Update
-        self.base_optimizer.step()               
+        # Update; with a GradScaler the gradients are unscaled and the update is skipped on inf/nan.
+        if scaler is None:
+            self.base_optimizer.step()
+        else:
+            scaler.step(self.base_optimizer)
         if zero_grad: self.zero_grad()
 
 
@@ -104,7 +144,28 @@ class AOSAM(torch.optim.Optimizer):
         closure()
         self.second_step()
 
+    def state_dict(self):
+        # the running statistics decide between SAM and Adam steps, so they are part of the state.
+        state_dict = super().state_dict()
+        state_dict['mu_t'] = self.mu_t
+        state_dict['sigma_t'] = self.sigma_t
+        state_dict['base_optimizer'] = self.base_optimizer.state_dict()
+        return state_dict
+
     def load_state_dict(self, state_dict):
+        state_dict = dict(state_dict)
+        mu_t = state_dict.pop('mu_t', None)
+        sigma_t = state_dict.pop('sigma_t', None)
+        base_state_dict = state_dict.pop('base_optimizer', None)
+
         super().load_state_dict(state_dict)
         self.base_optimizer.param_groups = self.param_groups
+        if base_state_dict is not None:
+            self.base_optimizer.load_state_dict(base_state_dict)
+            self.base_optimizer.param_groups = self.param_groups
+
+        device = self.param_groups[0]['params'][0].device
+        if mu_t is not None:
+            self.mu_t = mu_t.to(device) if torch.is_tensor(mu_t) else mu_t
+            self.sigma_t = sigma_t.to(device) if torch.is_tensor(sigma_t) else sigma_t
 
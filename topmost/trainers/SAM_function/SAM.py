@@ -36,7 +36,7 @@ class SAM(torch.optim.Optimizer):
         if zero_grad: self.zero_grad()
 
     @torch.no_grad()
-    def second_step(self, zero_grad=False):
+    def second_step(self, zero_grad=False, scaler=None):
         for group in self.param_groups:
             for p in group["params"]:
                 if p.grad is None: continue
@@ -44,8 +44,11 @@ class SAM(torch.optim.Optimizer):
                 # Get back to w from w + e(w)
                 p.data = self.state[p]["old_p"] 
 
-        # Update
-        self.base_optimizer.step()               
+        # Update; with a GradScaler the gradients are unscaled and the update is skipped on inf/nan.
+        if scaler is None:
+            self.base_optimizer.step()
+        else:
+            scaler.step(self.base_optimizer)
         if zero_grad: self.zero_grad()
 
 
@@ -1,14 +1,25 @@
-from .basic.basic_trainer import BasicTrainer
-from .basic.BERTopic_trainer import BERTopicTrainer
-from .basic.LDA_trainer import LDAGensimTrainer
-from .basic.LDA_trainer import LDASklearnTrainer
-from .basic.NMF_trainer import NMFGensimTrainer
-from .basic.NMF_trainer import NMFSklearnTrainer
+# trainers are imported on first access, e.g., BERTopicTrainer imports bertopic only when it is used.
+from ..utils.lazy_import import lazy_exports
 
-from .crosslingual.crosslingual_trainer import CrosslingualTrainer
-from .dynamic.dynamic_trainer import DynamicTrainer
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'BasicTrainer': '.basic.basic_trainer',
+    'BERTopicTrainer': '.basic.BERTopic_trainer',
+    'LDAGensimTrainer': '.basic.LDA_trainer',
+    'LDASklearnTrainer': '.basic.LDA_trainer',
+    'NMFGensimTrainer': '.basic.NMF_trainer',
+    'NMFSklearnTrainer': '.basic.NMF_trainer',
 
-from .dynamic.DTM_trainer import DTMTrainer
+    'CrosslingualTrainer': '.crosslingual.crosslingual_trainer',
+    'DynamicTrainer': '.dynamic.dynamic_trainer',
 
-from .hierarchical.hierarchical_trainer import HierarchicalTrainer
-from .hierarchical.HDP_trainer import HDPGensimTrainer
+    'DTMTrainer': '.dynamic.DTM_trainer',
+
+    'HierarchicalTrainer': '.hierarchical.hierarchical_trainer',
+    'HDPGensimTrainer': '.hierarchical.HDP_trainer',
+
+    'Evaluator': '.evaluation_callbacks',
+    'EarlyStopping': '.evaluation_callbacks',
+    'TopicDiversityCallback': '.evaluation_callbacks',
+    'ClusteringCallback': '.evaluation_callbacks',
+    'CheckpointManager': '.checkpoint',
+})
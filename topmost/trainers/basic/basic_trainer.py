@@ -5,10 +5,16 @@ from torch.optim.lr_scheduler import StepLR
 from collections import defaultdict
 from topmost.utils import static_utils
 from topmost.models.basic.CombinedTM import CombinedTM
+from topmost.ot import configure_solvers, refresh_solvers, solver_state_dict, load_solver_state_dict
+from topmost.trainers import precision as precision_utils
+from topmost.trainers import checkpoint as checkpoint_utils
+from topmost.trainers.inference import infer_theta
+from topmost.trainers.evaluation_callbacks import to_numpy
+from topmost.data.sparse_bow import SparseBow
 import wandb
 import logging
 import os
-import scipy
+import scipy.sparse
 import torch.optim
 
 # Thêm
@@ -20,11 +26,10 @@ from topmost.trainers.SAM_function.LookaheadSAM import AOSAM
 # from pytorch_lightning import LightningModule
 
 # Thêm
-# from torch.cuda.amp import autocast, GradScaler
 # from topmost.trainers.SAM_function.bypass_bn import enable_running_stats, disable_running_stats
 
 class BasicTrainer():
-    def __init__(self, model, epochs=200, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5, rho=0.05, device = 'cuda', delta=0.3, mut = 0, sigmat = 1e-10, k1= 0.2, k2=0.4):
+    def __init__(self, model, epochs=200, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5, rho=0.05, device = 'cuda', delta=0.3, mut = 0, sigmat = 1e-10, k1= 0.2, k2=0.4, ot_update_interval=None, precision='fp32', evaluator=None, checkpoint=None, inference_batch_size=2000):
         self.model = model
         self.epochs = epochs
         self.learning_rate = learning_rate
@@ -38,22 +43,28 @@ class BasicTrainer():
         self.logger = logging.getLogger('main')
 
         # Them
-        self.mut = 0.0
-        self.sigmat = 1e-10
         self.delta = delta
         self.k1 = k1 
         self.k2 = k2
-        self.optimizer = self.make_aosam_optimizer()
 
+        # None: solve the OT regularizers at every forward pass.
+        # int N: solve every N steps and reuse the transport plans in between (including the AOSAM second pass).
+        # 'epoch': solve once at the start of each epoch.
+        if ot_update_interval is not None and ot_update_interval != 'epoch' and int(ot_update_interval) < 1:
+            raise ValueError(ot_update_interval)
+        self.ot_update_interval = ot_update_interval
 
-    def _grad_norm(self):
-        norm = torch.norm(
-            torch.stack([
-                ((torch.abs(p) if group["adaptive"] else 1.0) * p.grad).norm(p=2)
-                for group in self.optimizer.param_groups
-                for p in group["params"] if p.grad is not None]),
-            p=2)
-        return norm
+        # 'fp32', 'bf16' or 'fp16': dtype of the autocast region around the model forward.
+        self.precision = precision_utils.check_precision(precision, device)
+
+        # an evaluation_callbacks.Evaluator run every few epochs, or None.
+        self.evaluator = evaluator
+
+        # a checkpoint.CheckpointManager, or None.
+        self.checkpoint = checkpoint
+
+        # batch size of test/save_theta; inference keeps no activations, so it can be larger than batch_size.
+        self.inference_batch_size = inference_batch_size
 
     
     # def make_sam_optimizer(self,):
@@ -113,7 +124,10 @@ class BasicTrainer():
 
     
     
-    def train(self, dataset_handler, verbose=False):
+    def train(self, dataset_handler, verbose=False, resume=None):
+        '''
+            resume: a checkpoint file, or a checkpoint directory to continue from its latest checkpoint.
+        '''
 
         global demsam, demadam 
         demsam = 0
@@ -121,7 +135,9 @@ class BasicTrainer():
 
         adam_optimizer = self.make_adam_optimizer()
         aosam_optimizer = self.make_aosam_optimizer()  
+        scaler = precision_utils.make_grad_scaler(self.precision, self.device)
 
+        lr_scheduler = None
         if self.lr_scheduler:
             print("===>using lr_scheduler")
             self.logger.info("===>using lr_scheduler")
@@ -131,7 +147,16 @@ class BasicTrainer():
         total_batches = len(dataset_handler.train_dataloader)
         T = self.epochs * total_batches
 
-        for epoch in tqdm(range(1, self.epochs + 1)):
+        if self.ot_update_interval is not None:
+            configure_solvers(self.model, reuse_plan=True)
+
+        start_epoch = 1
+        if resume is not None:
+            state = checkpoint_utils.load_checkpoint(resume)
+            start_epoch = self.load_checkpoint_state(state, adam_optimizer, aosam_optimizer, lr_scheduler, scaler) + 1
+            self.logger.info(f'Resumed from epoch {start_epoch - 1}: {resume}')
+
+        for epoch in tqdm(range(start_epoch, self.epochs + 1)):
             self.model.train()
             loss_rst_dict = defaultdict(float)
             wandb.log({'epoch': epoch})
@@ -140,37 +165,41 @@ class BasicTrainer():
 
                 t = (epoch - 1) * total_batches + batch_idx + 1
 
-                rst_dict = self.model(batch_data, epoch_id=epoch, batch_idx=batch_idx)
-                batch_loss = rst_dict['loss']
-                batch_loss.backward()
-                
-                grad_norm = self._grad_norm()
+                if self.need_ot_update(t, batch_idx):
+                    refresh_solvers(self.model)
 
-                # Tính mut, sigmat
-                self.mut = self.delta * self.mut + (1 - self.delta) * grad_norm.item()**2
-                self.sigmat = self.delta * self.sigmat + (1 - self.delta) * ((grad_norm.item()**2) - self.mut)**2
+                with precision_utils.autocast(self.precision, self.device):
+                    rst_dict = self.model(batch_data, epoch_id=epoch, batch_idx=batch_idx)
+                batch_loss = rst_dict['loss']
+                scaler.scale(batch_loss).backward()
                 
                 # Tính c_t
                 c_t = (t / T) * self.k1 + (1 - (t / T)) * self.k2
 
-                if grad_norm.item()**2 >= (self.mut + c_t * (self.sigmat**0.5)):
+                # Tính mut, sigmat on the device; the decision is the only host sync of the step.
+                use_sam, grad_norm = aosam_optimizer.update_statistics(c_t, grad_scale=precision_utils.get_scale(scaler))
+
+                if use_sam.item():
 
                     demsam += 1
 
-                    aosam_optimizer.first_step(zero_grad=True)
+                    aosam_optimizer.first_step(zero_grad=True, grad_norm=grad_norm)
 
-                    rst_dict_adv = self.model(batch_data, epoch_id=epoch, batch_idx=batch_idx)
+                    with precision_utils.autocast(self.precision, self.device):
+                        rst_dict_adv = self.model(batch_data, epoch_id=epoch, batch_idx=batch_idx)
                     batch_loss_adv = rst_dict_adv['loss']
-                    batch_loss_adv.backward()
+                    scaler.scale(batch_loss_adv).backward()
 
-                    aosam_optimizer.second_step(zero_grad=True)
+                    aosam_optimizer.second_step(zero_grad=True, scaler=scaler)
                 
                 else:
                     demadam += 1
 
-                    adam_optimizer.step()
+                    scaler.step(adam_optimizer)
                     adam_optimizer.zero_grad()
 
+                scaler.update()
+
                 for key in rst_dict:
                     try:
                         loss_rst_dict[key] += rst_dict[key] * \
@@ -192,38 +221,100 @@ class BasicTrainer():
                 output_log += f' | Số lần dùng AOSAM: {demsam}, Số lần dùng Adam: {demadam}'
                 print(output_log)
                 self.logger.info(output_log)
+
+            stop = self.evaluator is not None and self.evaluator.step(epoch, lambda: self.eval_snapshot(dataset_handler))
+
+            if self.checkpoint is not None and self.checkpoint.should_save(epoch, last_epoch=(stop or epoch == self.epochs)):
+                # finish a running evaluation, so its results are part of the checkpoint.
+                if self.evaluator is not None:
+                    stop = self.evaluator.poll(wait=True) or stop
+                state = self.checkpoint_state(epoch, adam_optimizer, aosam_optimizer, lr_scheduler, scaler)
+                self.checkpoint.save(epoch, state)
+
+            if stop:
+                break
+
+        if self.evaluator is not None:
+            self.evaluator.close()
         
         print(f"So lan dung AOSAM: {demsam}")
         print(f"So lan dung Adam: {demadam}")
 
-    def test(self, input_data):
+    def checkpoint_state(self, epoch, adam_optimizer, aosam_optimizer, lr_scheduler, scaler):
+        # everything needed to continue training exactly from the end of this epoch.
+        return {
+            'epoch': epoch,
+            'model': self.model.state_dict(),
+            'adam_optimizer': adam_optimizer.state_dict(),
+            'aosam_optimizer': aosam_optimizer.state_dict(),
+            'lr_scheduler': lr_scheduler.state_dict() if lr_scheduler is not None else None,
+            'scaler': scaler.state_dict(),
+            'solvers': solver_state_dict(self.model),
+            'demsam': demsam,
+            'demadam': demadam,
+            'evaluator': self.evaluator.state_dict() if self.evaluator is not None else None,
+            'rng': checkpoint_utils.get_rng_state(),
+        }
+
+    def load_checkpoint_state(self, state, adam_optimizer, aosam_optimizer, lr_scheduler, scaler):
+        global demsam, demadam
+
+        self.model.load_state_dict(state['model'])
+        adam_optimizer.load_state_dict(state['adam_optimizer'])
+        aosam_optimizer.load_state_dict(state['aosam_optimizer'])
+        if lr_scheduler is not None and state['lr_scheduler'] is not None:
+            lr_scheduler.load_state_dict(state['lr_scheduler'])
+        scaler.load_state_dict(state['scaler'])
+        load_solver_state_dict(self.model, state['solvers'])
+        demsam = state['demsam']
+        demadam = state['demadam']
+        if self.evaluator is not None and state.get('evaluator') is not None:
+            self.evaluator.load_state_dict(state['evaluator'])
+        checkpoint_utils.set_rng_state(state['rng'])
+        return state['epoch']
+
+    def eval_snapshot(self, dataset_handler):
+        # CPU copies of beta and of the theta of the held-out subsample, for the evaluator thread.
+        with torch.no_grad():
+            self.model.eval()
+            snapshot = {'beta': to_numpy(self.model.get_beta())}
+            if not isinstance(self.model, CombinedTM) and hasattr(dataset_handler, 'test_data'):
+                sample_idx = self.evaluator.get_sample_idx(dataset_handler.test_data.shape[0])
+                theta = self.model.get_theta(dataset_handler.test_data[torch.as_tensor(sample_idx)])
+                snapshot['theta'] = to_numpy(theta)
+        self.model.train()
+        return snapshot
+
+    def need_ot_update(self, t, batch_idx):
+        if self.ot_update_interval is None:
+            return False
+        if self.ot_update_interval == 'epoch':
+            return batch_idx == 0
+        return (t - 1) % int(self.ot_update_interval) == 0
+
+    def infer(self, input_data, output=None):
+        # theta and its argmax; output: None, or a .npy path theta is written to directly.
+        # A scipy sparse BoW, e.g., from Preprocessing.parse, is densified batch by batch on the device.
+        self.model.eval()
+        if scipy.sparse.issparse(input_data):
+            input_data = SparseBow(input_data, self.device)
+        elif isinstance(input_data, (list, tuple)) and scipy.sparse.issparse(input_data[0]):
+            input_data = [SparseBow(input_data[0], self.device)] + list(input_data[1:])
         if not isinstance(self.model, CombinedTM):
-            data_size = input_data.shape[0]
-            theta = list()
-            all_idx = torch.split(torch.arange(data_size), self.batch_size)
-
-            with torch.no_grad():
-                self.model.eval()
-                for idx in all_idx:
-                    batch_input = input_data[idx]
-                    batch_theta = self.model.get_theta(batch_input)
-                    theta.extend(batch_theta.cpu().tolist())
+            inputs = [input_data]
         else:
-            data_size = input_data[0].shape[0]
-            theta = list()
-            all_idx = torch.split(torch.arange(data_size), self.batch_size)
-
-            with torch.no_grad():
-                self.model.eval()
-                for idx in all_idx:
-                    batch_bow = input_data[0][idx]
-                    batch_contextual = input_data[1][idx]
-                    batch_theta = self.model.get_theta(batch_bow, batch_contextual)
-                    theta.extend(batch_theta.cpu().tolist())
-
-        theta = np.asarray(theta)
+            inputs = [input_data[0], input_data[1]]
+        return infer_theta(self.model.get_theta, inputs, self.inference_batch_size, output)
+
+    def test(self, input_data):
+        theta, _ = self.infer(input_data)
         return theta
 
+    def theta_input(self, dataset_handler, split):
+        if not isinstance(self.model, CombinedTM):
+            return getattr(dataset_handler, f'{split}_data')
+        return (getattr(dataset_handler, f'{split}_data'), getattr(dataset_handler, f'{split}_contextual_embed'))
+
     def export_beta(self):
         beta = self.model.get_beta().detach().cpu().numpy()
         return beta
@@ -234,12 +325,8 @@ class BasicTrainer():
         return top_words
 
     def export_theta(self, dataset_handler):
-        if not isinstance(self.model, CombinedTM):
-            train_theta = self.test(dataset_handler.train_data)
-            test_theta = self.test(dataset_handler.test_data)
-        else:
-            train_theta = self.test((dataset_handler.train_data, dataset_handler.train_contextual_embed))
-            test_theta = self.test((dataset_handler.test_data, dataset_handler.test_contextual_embed))
+        train_theta = self.test(self.theta_input(dataset_handler, 'train'))
+        test_theta = self.test(self.theta_input(dataset_handler, 'test'))
         return train_theta, test_theta
 
     def save_beta(self, dir_path):
@@ -254,15 +341,34 @@ class BasicTrainer():
                 f.write(words + '\n')
         return top_words
 
+    def save_artifacts(self, vocab, dir_path, num_top_words_list=(10, 15, 20, 25), embeddings=False):
+        '''
+            Save beta, top_words_{k}.txt for each k of num_top_words_list and, if embeddings, the embeddings
+            and topic distances. Beta is computed once and the top words of all k come from one top-k on the device.
+
+            Returns:
+                beta and a dict from k to the top words.
+        '''
+        with torch.no_grad():
+            beta = self.model.get_beta()
+            top_word_ids = torch.topk(beta, max(num_top_words_list), dim=1).indices.cpu().numpy()
+            beta = beta.cpu().numpy()
+
+        np.save(os.path.join(dir_path, 'beta.npy'), beta)
+        top_words = static_utils.save_top_words(top_word_ids, vocab, num_top_words_list, dir_path)
+        if embeddings:
+            self.save_embeddings(dir_path)
+        return beta, top_words
+
     def save_theta(self, dataset_handler, dir_path):
-        train_theta, test_theta = self.export_theta(dataset_handler)
-        np.save(os.path.join(dir_path, 'train_theta.npy'), train_theta)
-        np.save(os.path.join(dir_path, 'test_theta.npy'), test_theta)
-        
-        train_argmax_theta = np.argmax(train_theta, axis=1)
-        test_argmax_theta = np.argmax(test_theta, axis=1)
-        np.save(os.path.join(dir_path, 'train_argmax_theta.npy'), train_argmax_theta)
-        np.save(os.path.join(dir_path, 'test_argmax_theta.npy'), test_argmax_theta)
+        # theta is written straight into the .npy files; the argmax comes from the device.
+        theta_list = list()
+        for split in ('train', 'test'):
+            theta, argmax_theta = self.infer(self.theta_input(dataset_handler, split), output=os.path.join(dir_path, f'{split}_theta.npy'))
+            np.save(os.path.join(dir_path, f'{split}_argmax_theta.npy'), argmax_theta)
+            theta_list.append(theta)
+
+        train_theta, test_theta = theta_list
         return train_theta, test_theta
 
     def save_embeddings(self, dir_path):
@@ -0,0 +1,82 @@
+import os
+import re
+import random
+import numpy as np
+import torch
+
+
+def get_rng_state():
+    rng_state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        rng_state['cuda'] = torch.cuda.get_rng_state_all()
+    return rng_state
+
+
+def set_rng_state(rng_state):
+    random.setstate(rng_state['python'])
+    np.random.set_state(rng_state['numpy'])
+    torch.set_rng_state(rng_state['torch'])
+    if 'cuda' in rng_state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng_state['cuda'])
+
+
+def atomic_save(obj, path):
+    # write to a temporary file in the same directory, then rename,
+    # so a preempted job never leaves a truncated checkpoint behind.
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        torch.save(obj, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class CheckpointManager:
+    '''
+        Save training checkpoints every interval epochs into checkpoint_dir,
+        keeping only the latest keep files.
+    '''
+    PATTERN = re.compile(r'checkpoint_(\d+)\.pt$')
+
+    def __init__(self, checkpoint_dir, interval=10, keep=3):
+        self.checkpoint_dir = checkpoint_dir
+        self.interval = interval
+        self.keep = keep
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def should_save(self, epoch, last_epoch=False):
+        return self.interval > 0 and (epoch % self.interval == 0 or last_epoch)
+
+    def list_checkpoints(self):
+        return list_checkpoints(self.checkpoint_dir)
+
+    def save(self, epoch, state):
+        path = os.path.join(self.checkpoint_dir, f'checkpoint_{epoch:05d}.pt')
+        atomic_save(state, path)
+
+        for old_path in self.list_checkpoints()[:-self.keep]:
+            os.remove(old_path)
+        return path
+
+
+def list_checkpoints(checkpoint_dir):
+    # checkpoint paths sorted by epoch.
+    names = [name for name in os.listdir(checkpoint_dir) if CheckpointManager.PATTERN.match(name)]
+    names.sort(key=lambda name: int(CheckpointManager.PATTERN.match(name).group(1)))
+    return [os.path.join(checkpoint_dir, name) for name in names]
+
+
+def load_checkpoint(path, map_location='cpu'):
+    '''
+        path: a checkpoint file, or a directory whose latest checkpoint is loaded.
+    '''
+    if os.path.isdir(path):
+        checkpoints = list_checkpoints(path)
+        if not checkpoints:
+            raise FileNotFoundError(f'no checkpoint in {path}')
+        path = checkpoints[-1]
+    return torch.load(path, map_location=map_location)
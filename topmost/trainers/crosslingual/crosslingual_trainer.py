@@ -1,13 +1,13 @@
 import torch
 from torch.optim.lr_scheduler import StepLR
 from collections import defaultdict
-import numpy as np
 from tqdm import tqdm
 from topmost.utils import static_utils
+from topmost.trainers.inference import infer_theta
 
 
 class CrosslingualTrainer:
-    def __init__(self, model, epochs=500, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5):
+    def __init__(self, model, epochs=500, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5, inference_batch_size=2000):
         self.model = model
         self.epochs = epochs
         self.learning_rate = learning_rate
@@ -15,6 +15,7 @@ class CrosslingualTrainer:
         self.lr_scheduler = lr_scheduler
         self.lr_step_size = lr_step_size
         self.log_interval = log_interval
+        self.inference_batch_size = inference_batch_size
 
     def make_optimizer(self):
         args_dict = {
@@ -83,17 +84,9 @@ class CrosslingualTrainer:
                 print(output_log)
 
     def get_theta(self, bow, lang):
-        theta_list = list()
-        data_size = bow.shape[0]
-        all_idx = torch.split(torch.arange(data_size,), self.batch_size)
-        with torch.no_grad():
-            self.model.eval()
-            for idx in all_idx:
-                batch_bow = bow[idx]
-                theta = self.model.get_theta(batch_bow, lang)
-                theta_list.extend(theta.detach().cpu().numpy().tolist())
-
-        return np.asarray(theta_list)
+        self.model.eval()
+        theta, _ = infer_theta(lambda batch_bow: self.model.get_theta(batch_bow, lang), [bow], self.inference_batch_size)
+        return theta
 
     def test(self, bow_en, bow_cn):
         theta_en = self.get_theta(bow_en, lang='en')
@@ -1,13 +1,13 @@
-import numpy as np
 import torch
 from torch.optim.lr_scheduler import StepLR
 from tqdm import tqdm
 from collections import defaultdict
 from topmost.utils import static_utils
+from topmost.trainers.inference import infer_theta
 
 
 class DynamicTrainer:
-    def __init__(self, model, epochs=200, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5):
+    def __init__(self, model, epochs=200, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5, inference_batch_size=2000):
         self.model = model
         self.epochs = epochs
         self.learning_rate = learning_rate
@@ -15,6 +15,7 @@ class DynamicTrainer:
         self.lr_scheduler = lr_scheduler
         self.lr_step_size = lr_step_size
         self.log_interval = log_interval
+        self.inference_batch_size = inference_batch_size
 
     def make_optimizer(self,):
         args_dict = {
@@ -72,17 +73,8 @@ class DynamicTrainer:
                 print(output_log)
 
     def test(self, bow, times):
-        data_size = bow.shape[0]
-        theta = list()
-        all_idx = torch.split(torch.arange(data_size), self.batch_size)
-
-        with torch.no_grad():
-            self.model.eval()
-            for idx in all_idx:
-                batch_theta = self.model.get_theta(bow[idx], times[idx])
-                theta.extend(batch_theta.cpu().tolist())
-
-        theta = np.asarray(theta)
+        self.model.eval()
+        theta, _ = infer_theta(self.model.get_theta, [bow, times], self.inference_batch_size)
         return theta
 
     def export_beta(self):
@@ -0,0 +1,199 @@
+import time
+import logging
+import numpy as np
+import wandb
+from concurrent.futures import ThreadPoolExecutor
+from topmost.evaluations.clustering import evaluate_clustering
+
+
+class EvaluationCallback:
+    '''
+        A cheap metric computed during training on CPU copies of beta and theta.
+
+        Args:
+            time_budget: target seconds per run of the metric. A run is not interrupted or
+                subsampled: it always completes and is logged, and only afterwards, if it went
+                over the budget, the interval of the metric is doubled. This bounds the average
+                evaluation cost over training, not the time of a single evaluation.
+    '''
+    def __init__(self, time_budget=None):
+        self.time_budget = time_budget
+        self.interval_scale = 1
+
+    def __call__(self, snapshot):
+        raise NotImplementedError
+
+
+class TopicDiversityCallback(EvaluationCallback):
+    def __init__(self, num_top_words=15, time_budget=None):
+        super().__init__(time_budget)
+        self.num_top_words = num_top_words
+
+    def __call__(self, snapshot):
+        beta = snapshot['beta']
+        # top word ids of each topic; TD is the ratio of words that occur in a single topic.
+        top_words = np.argpartition(-beta, self.num_top_words, axis=1)[:, :self.num_top_words]
+        counts = np.bincount(top_words.reshape(-1), minlength=beta.shape[1])
+        TD = (counts == 1).sum() / top_words.size
+        return {'TD': TD}
+
+
+class ClusteringCallback(EvaluationCallback):
+    def __call__(self, snapshot):
+        if snapshot.get('theta') is None or snapshot.get('labels') is None:
+            return dict()
+        return evaluate_clustering(snapshot['theta'], snapshot['labels'])
+
+
+class EarlyStopping:
+    '''
+        Stop training when a metric has not improved by min_delta for patience evaluations.
+    '''
+    def __init__(self, metric='NMI', patience=5, min_delta=1e-4, mode='max'):
+        self.metric = metric
+        self.patience = patience
+        self.min_delta = min_delta
+        self.mode = mode
+        self.best = None
+        self.num_bad = 0
+
+    def update(self, value):
+        sign = 1 if self.mode == 'max' else -1
+        if self.best is None or sign * (value - self.best) > self.min_delta:
+            self.best = value
+            self.num_bad = 0
+        else:
+            self.num_bad += 1
+
+    def should_stop(self):
+        return self.num_bad >= self.patience
+
+    def state_dict(self):
+        return {'best': self.best, 'num_bad': self.num_bad}
+
+    def load_state_dict(self, state_dict):
+        self.best = state_dict['best']
+        self.num_bad = state_dict['num_bad']
+
+
+class Evaluator:
+    '''
+        Run evaluation callbacks every interval epochs in a background thread.
+
+        The trainer hands over CPU copies of beta and of the theta of a fixed held-out
+        subsample, so training continues while the metrics are computed. A new evaluation
+        is skipped while the previous one is still running.
+
+        Args:
+            callbacks: list of EvaluationCallback. Defaults to TD and NMI/Purity.
+            interval: evaluate every this many epochs.
+            num_samples: size of the held-out subsample used for theta.
+            labels: labels of the held-out data (the whole test set), for clustering metrics.
+            early_stopping: an EarlyStopping, or None.
+    '''
+    def __init__(self, callbacks=None, interval=10, num_samples=2000, labels=None, early_stopping=None, seed=0):
+        if callbacks is None:
+            callbacks = [TopicDiversityCallback(), ClusteringCallback()]
+        self.callbacks = callbacks
+        self.interval = interval
+        self.num_samples = num_samples
+        self.labels = labels
+        self.early_stopping = early_stopping
+        self.seed = seed
+
+        self.logger = logging.getLogger('main')
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.sample_idx = None
+        self.history = list()
+
+    def get_sample_idx(self, data_size):
+        # the same subsample at every evaluation.
+        if self.sample_idx is None:
+            rng = np.random.RandomState(self.seed)
+            num_samples = min(self.num_samples, data_size)
+            self.sample_idx = np.sort(rng.choice(data_size, num_samples, replace=False))
+        return self.sample_idx
+
+    def due_callbacks(self, epoch):
+        return [callback for callback in self.callbacks if epoch % (self.interval * callback.interval_scale) == 0]
+
+    def busy(self):
+        return self.future is not None and not self.future.done()
+
+    def submit(self, epoch, snapshot):
+        callbacks = self.due_callbacks(epoch)
+        if not callbacks or self.busy():
+            return
+
+        if self.labels is not None and self.sample_idx is not None:
+            snapshot['labels'] = np.asarray(self.labels)[self.sample_idx]
+        self.future = self.executor.submit(self.run, epoch, snapshot, callbacks)
+
+    def run(self, epoch, snapshot, callbacks):
+        # callbacks over their time_budget still finish; they are then run less often.
+        rst = {'epoch': epoch}
+        for callback in callbacks:
+            start = time.time()
+            rst.update(callback(snapshot))
+            elapsed = time.time() - start
+            if callback.time_budget is not None and elapsed > callback.time_budget:
+                callback.interval_scale *= 2
+                self.logger.info(f'{type(callback).__name__} took {elapsed:.1f}s, over its budget of {callback.time_budget}s; evaluating it every {self.interval * callback.interval_scale} epochs.')
+        return rst
+
+    def step(self, epoch, make_snapshot):
+        '''
+            Called at the end of each epoch. make_snapshot is only called when an evaluation is due.
+            Returns True if training should stop.
+        '''
+        if self.due_callbacks(epoch) and not self.busy():
+            self.submit(epoch, make_snapshot())
+        return self.poll()
+
+    def poll(self, wait=False):
+        '''
+            Log the results of a finished evaluation. Returns True if training should stop.
+        '''
+        if self.future is None or (not wait and not self.future.done()):
+            return False
+
+        rst = self.future.result()
+        self.future = None
+        self.history.append(rst)
+
+        epoch = rst.pop('epoch')
+        wandb.log({f'eval/{key}': value for key, value in rst.items()})
+        self.logger.info(f'Epoch: {epoch:03d} ' + ' '.join(f'{key}: {value:.5f}' for key, value in rst.items()))
+        rst['epoch'] = epoch
+
+        if self.early_stopping is not None and self.early_stopping.metric in rst:
+            self.early_stopping.update(rst[self.early_stopping.metric])
+            if self.early_stopping.should_stop():
+                self.logger.info(f'Early stopping at epoch {epoch}: {self.early_stopping.metric} has not improved for {self.early_stopping.patience} evaluations.')
+                return True
+        return False
+
+    def close(self):
+        # wait for the last evaluation and log it.
+        self.poll(wait=True)
+
+    def state_dict(self):
+        # evaluation cadence, early stopping counters and history, for checkpoints.
+        # call poll(wait=True) first, so a running evaluation is included.
+        return {
+            'interval_scales': [callback.interval_scale for callback in self.callbacks],
+            'early_stopping': self.early_stopping.state_dict() if self.early_stopping is not None else None,
+            'history': list(self.history),
+        }
+
+    def load_state_dict(self, state_dict):
+        for callback, interval_scale in zip(self.callbacks, state_dict['interval_scales']):
+            callback.interval_scale = interval_scale
+        if self.early_stopping is not None and state_dict['early_stopping'] is not None:
+            self.early_stopping.load_state_dict(state_dict['early_stopping'])
+        self.history = list(state_dict['history'])
+
+
+def to_numpy(tensor):
+    return tensor.detach().float().cpu().numpy()
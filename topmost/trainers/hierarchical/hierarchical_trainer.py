@@ -4,6 +4,12 @@ from torch.optim.lr_scheduler import StepLR
 from collections import defaultdict
 from tqdm import tqdm
 from topmost.utils import static_utils
+from topmost.trainers import precision as precision_utils
+from topmost.trainers import checkpoint as checkpoint_utils
+from topmost.trainers.inference import infer_theta
+from topmost.ot import solver_state_dict, load_solver_state_dict
+from topmost.trainers.SAM_function.SAM import SAM
+from topmost.trainers.evaluation_callbacks import to_numpy
 import os
 import scipy
 import wandb
@@ -16,7 +22,7 @@ def to_nparray(tensor_list):
 
 
 class HierarchicalTrainer:
-    def __init__(self, model, epochs=200, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5, rho=0.05):
+    def __init__(self, model, epochs=200, learning_rate=0.002, batch_size=200, lr_scheduler=None, lr_step_size=125, log_interval=5, rho=0.05, device='cuda', precision='fp32', evaluator=None, checkpoint=None, inference_batch_size=2000):
         self.model = model
         self.epochs = epochs
         self.learning_rate = learning_rate
@@ -25,6 +31,15 @@ class HierarchicalTrainer:
         self.lr_step_size = lr_step_size
         self.log_interval = log_interval
         self.rho = rho
+        self.device = device
+        # 'fp32', 'bf16' or 'fp16': dtype of the autocast region around the model forward.
+        self.precision = precision_utils.check_precision(precision, device)
+        # an evaluation_callbacks.Evaluator run every few epochs on the last layer, or None.
+        self.evaluator = evaluator
+        # a checkpoint.CheckpointManager, or None.
+        self.checkpoint = checkpoint
+        # batch size of test/save_theta.
+        self.inference_batch_size = inference_batch_size
         self.logger = logging.getLogger('main')
 
     def make_optimizer(self,):
@@ -54,28 +69,44 @@ class HierarchicalTrainer:
         return top_words, train_theta
 
 
-    def train(self, dataset_handler, verbose=False):
+    def train(self, dataset_handler, verbose=False, resume=None):
         optimizer = self.make_optimizer()
+        scaler = precision_utils.make_grad_scaler(self.precision, self.device)
 
+        lr_scheduler = None
         if self.lr_scheduler:
             print("===>using lr_scheduler")
             lr_scheduler = self.make_lr_scheduler(optimizer)
 
         data_size = len(dataset_handler.train_dataloader.dataset)
 
-        for epoch in tqdm(range(1, self.epochs + 1), leave=False):
+        start_epoch = 1
+        if resume is not None:
+            state = checkpoint_utils.load_checkpoint(resume)
+            start_epoch = self.load_checkpoint_state(state, optimizer, lr_scheduler, scaler) + 1
+            self.logger.info(f'Resumed from epoch {start_epoch - 1}: {resume}')
+
+        for epoch in tqdm(range(start_epoch, self.epochs + 1), leave=False):
             self.model.train()
             loss_rst_dict = defaultdict(float)
             wandb.log({'epoch': epoch})
 
             for batch_data in dataset_handler.train_dataloader:
 
-                rst_dict = self.model(batch_data)
+                with precision_utils.autocast(self.precision, self.device):
+                    rst_dict = self.model(batch_data)
                 batch_loss = rst_dict['loss']
 
                 optimizer.zero_grad()
-                batch_loss.backward()
-                optimizer.step()
+                scaler.scale(batch_loss).backward()
+                # the SAM perturbation rho * g / ||g|| does not depend on the loss scale.
+                optimizer.first_step(zero_grad=True)
+
+                with precision_utils.autocast(self.precision, self.device):
+                    rst_dict_adv = self.model(batch_data)
+                scaler.scale(rst_dict_adv['loss']).backward()
+                optimizer.second_step(zero_grad=True, scaler=scaler)
+                scaler.update()
 
                 for key in rst_dict:
                     loss_rst_dict[key] += rst_dict[key] * len(batch_data)
@@ -93,26 +124,63 @@ class HierarchicalTrainer:
 
                 print(output_log)
 
-    def test(self, bow):
-        data_size = bow.shape[0]
-
-        num_topics_list = self.model.num_topics_list
-        theta_list = [list() for _ in range(len(num_topics_list))]
-        all_idx = torch.split(torch.arange(data_size), self.batch_size)
-
+            stop = self.evaluator is not None and self.evaluator.step(epoch, lambda: self.eval_snapshot(dataset_handler))
+
+            if self.checkpoint is not None and self.checkpoint.should_save(epoch, last_epoch=(stop or epoch == self.epochs)):
+                # finish a running evaluation, so its results are part of the checkpoint.
+                if self.evaluator is not None:
+                    stop = self.evaluator.poll(wait=True) or stop
+                self.checkpoint.save(epoch, self.checkpoint_state(epoch, optimizer, lr_scheduler, scaler))
+
+            if stop:
+                break
+
+        if self.evaluator is not None:
+            self.evaluator.close()
+
+    def checkpoint_state(self, epoch, optimizer, lr_scheduler, scaler):
+        return {
+            'epoch': epoch,
+            'model': self.model.state_dict(),
+            'optimizer': optimizer.state_dict(),
+            'lr_scheduler': lr_scheduler.state_dict() if lr_scheduler is not None else None,
+            'scaler': scaler.state_dict(),
+            'solvers': solver_state_dict(self.model),
+            'evaluator': self.evaluator.state_dict() if self.evaluator is not None else None,
+            'rng': checkpoint_utils.get_rng_state(),
+        }
+
+    def load_checkpoint_state(self, state, optimizer, lr_scheduler, scaler):
+        self.model.load_state_dict(state['model'])
+        optimizer.load_state_dict(state['optimizer'])
+        if lr_scheduler is not None and state['lr_scheduler'] is not None:
+            lr_scheduler.load_state_dict(state['lr_scheduler'])
+        scaler.load_state_dict(state['scaler'])
+        load_solver_state_dict(self.model, state['solvers'])
+        if self.evaluator is not None and state.get('evaluator') is not None:
+            self.evaluator.load_state_dict(state['evaluator'])
+        checkpoint_utils.set_rng_state(state['rng'])
+        return state['epoch']
+
+    def eval_snapshot(self, dataset_handler):
+        # CPU copies of the last layer beta and theta of the held-out subsample, for the evaluator thread.
         with torch.no_grad():
             self.model.eval()
-            for idx in all_idx:
-                batch_input = bow[idx]
-                batch_theta_list = self.model.get_theta(batch_input)
-
-                for layer_id in range(len(num_topics_list)):
-                    theta_list[layer_id].extend(batch_theta_list[layer_id].cpu().numpy().tolist())
-
-        theta = np.empty(len(num_topics_list), object)
-        theta[:] = [np.asarray(item) for item in theta_list]
+            snapshot = {'beta': to_numpy(self.model.get_beta()[-1])}
+            sample_idx = self.evaluator.get_sample_idx(dataset_handler.test_data.shape[0])
+            theta_list = self.model.get_theta(dataset_handler.test_data[torch.as_tensor(sample_idx)])
+            snapshot['theta'] = to_numpy(theta_list[-1])
+        self.model.train()
+        return snapshot
+
+    def infer(self, bow, output=None):
+        # theta of the last layer and its argmax; output: None, or a .npy path theta is written to directly.
+        self.model.eval()
+        return infer_theta(lambda batch: self.model.get_theta(batch)[-1], [bow], self.inference_batch_size, output)
 
-        return np.asarray(theta[-1])
+    def test(self, bow):
+        theta, _ = self.infer(bow)
+        return theta
 
     def export_phi(self):
         phi = to_nparray(self.model.get_phi_list())
@@ -156,15 +224,34 @@ class HierarchicalTrainer:
                 f.write(words + '\n')
         return top_words
 
+    def save_artifacts(self, vocab, dir_path, num_top_words_list=(10, 15, 20, 25), embeddings=False):
+        '''
+            Save beta, top_words_{k}.txt for each k of num_top_words_list and, if embeddings, the embeddings
+            and topic distances. Beta is computed once and the top words of all k come from one top-k on the device.
+
+            Returns:
+                beta and a dict from k to the top words.
+        '''
+        with torch.no_grad():
+            beta = self.model.get_beta()[-1]
+            top_word_ids = torch.topk(beta, max(num_top_words_list), dim=1).indices.cpu().numpy()
+            beta = beta.cpu().numpy()
+
+        np.save(os.path.join(dir_path, 'beta.npy'), beta)
+        top_words = static_utils.save_top_words(top_word_ids, vocab, num_top_words_list, dir_path)
+        if embeddings:
+            self.save_embeddings(dir_path)
+        return beta, top_words
+
     def save_theta(self, dataset_handler, dir_path):
-        train_theta, test_theta = self.export_theta(dataset_handler)
-        np.save(os.path.join(dir_path, 'train_theta.npy'), train_theta)
-        np.save(os.path.join(dir_path, 'test_theta.npy'), test_theta)
-        
-        train_argmax_theta = np.argmax(train_theta, axis=1)
-        test_argmax_theta = np.argmax(test_theta, axis=1)
-        np.save(os.path.join(dir_path, 'train_argmax_theta.npy'), train_argmax_theta)
-        np.save(os.path.join(dir_path, 'test_argmax_theta.npy'), test_argmax_theta)
+        # theta is written straight into the .npy files; the argmax comes from the device.
+        theta_list = list()
+        for split in ('train', 'test'):
+            theta, argmax_theta = self.infer(getattr(dataset_handler, f'{split}_data'), output=os.path.join(dir_path, f'{split}_theta.npy'))
+            np.save(os.path.join(dir_path, f'{split}_argmax_theta.npy'), argmax_theta)
+            theta_list.append(theta)
+
+        train_theta, test_theta = theta_list
         return train_theta, test_theta
 
     def save_embeddings(self, dir_path):
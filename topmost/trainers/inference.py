@@ -0,0 +1,84 @@
+import numpy as np
+import torch
+
+
+def allocate_output(output, shape):
+    # output: None for an in-memory array, or the path of a .npy file written through a memmap.
+    if output is None:
+        return np.empty(shape, dtype='float32')
+    return np.lib.format.open_memmap(output, mode='w+', dtype='float32', shape=shape)
+
+
+class HostCopier:
+    '''
+        Copy device batches into rows of a host array.
+
+        CUDA batches go through two alternating pinned buffers with non_blocking copies;
+        a batch is only waited for after the next one has been launched.
+    '''
+    def __init__(self, output):
+        self.output = output
+        self.buffers = [None, None]
+        self.num_batches = 0
+        self.pending = None
+
+    def copy(self, batch, start):
+        if not batch.is_cuda:
+            self.output[start:start + len(batch)] = batch.numpy()
+            return
+
+        i = self.num_batches % 2
+        self.num_batches += 1
+        if self.buffers[i] is None or self.buffers[i].shape != batch.shape:
+            self.buffers[i] = torch.empty(batch.shape, dtype=batch.dtype, pin_memory=True)
+        self.buffers[i].copy_(batch, non_blocking=True)
+        event = torch.cuda.Event()
+        event.record()
+
+        self.flush()
+        self.pending = (self.buffers[i], event, start)
+
+    def flush(self):
+        if self.pending is not None:
+            buffer, event, start = self.pending
+            event.synchronize()
+            self.output[start:start + len(buffer)] = buffer.numpy()
+            self.pending = None
+
+
+@torch.inference_mode()
+def infer_theta(get_theta, inputs, batch_size, output=None):
+    '''
+        theta of all rows of inputs, computed batch by batch into a preallocated NxK array.
+
+        Args:
+            get_theta: maps the batches of inputs (same rows of each) to a BxK theta tensor.
+            inputs: list of tensors, SparseBow or arrays with the same number of rows.
+            output: None to return an in-memory array, or the path of a .npy file to write theta to directly.
+
+        Returns:
+            theta and the argmax of each row, computed on the device.
+    '''
+    data_size = inputs[0].shape[0]
+    theta = None
+    copier = None
+    argmax_list = list()
+
+    for start in range(0, data_size, batch_size):
+        end = min(start + batch_size, data_size)
+        batch_theta = get_theta(*[item[start:end] for item in inputs]).float()
+        argmax_list.append(batch_theta.argmax(1))
+
+        if theta is None:
+            theta = allocate_output(output, (data_size, batch_theta.shape[1]))
+            copier = HostCopier(theta)
+        copier.copy(batch_theta, start)
+
+    if theta is None:
+        return allocate_output(output, (0, 0)), np.zeros(0, dtype='int64')
+
+    copier.flush()
+    if isinstance(theta, np.memmap):
+        theta.flush()
+    argmax = torch.cat(argmax_list).cpu().numpy()
+    return theta, argmax
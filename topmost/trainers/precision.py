@@ -0,0 +1,40 @@
+import torch
+
+
+PRECISION_DTYPES = {
+    'fp32': torch.float32,
+    'bf16': torch.bfloat16,
+    'fp16': torch.float16,
+}
+
+
+def check_precision(precision, device='cuda'):
+    if precision not in PRECISION_DTYPES:
+        raise NotImplementedError(precision)
+    # fp16 needs loss scaling, which GradScaler only does on CUDA, and CPU autocast does not support fp16 matmuls.
+    if precision == 'fp16' and torch.device(device).type != 'cuda':
+        raise ValueError(f'fp16 requires a CUDA device, got {device}; use bf16 instead')
+    return precision
+
+
+def autocast(precision, device):
+    '''
+        Autocast context for the forward pass.
+        Softmax, log, exp and reductions are kept in fp32 by autocast itself,
+        and the Sinkhorn solvers disable autocast, so only matmuls and linear layers run in low precision.
+    '''
+    device_type = torch.device(device).type
+    return torch.autocast(device_type=device_type, dtype=PRECISION_DTYPES[precision], enabled=(precision != 'fp32'))
+
+
+def make_grad_scaler(precision, device):
+    # loss scaling is only needed for fp16; a disabled scaler is a no-op.
+    enabled = (precision == 'fp16' and torch.device(device).type == 'cuda')
+    return torch.cuda.amp.GradScaler(enabled=enabled)
+
+
+def get_scale(scaler):
+    # the current loss scale as a device tensor (no host sync), or None when scaling is disabled.
+    if not scaler.is_enabled():
+        return None
+    return scaler._get_scale_async()
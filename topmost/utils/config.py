@@ -1,3 +1,4 @@
+import ast
 import argparse
 
 
@@ -13,6 +14,10 @@ def add_dataset_argument(parser):
                         help='dataset name, currently support datasets are: \
                             20NG, ACL, Amazon_Review, ECNews, IMDB, NeurIPS, \
                             NYT, Rakuten_Amazon, Wikitext-103')
+    parser.add_argument('--sparse_bow', action='store_true', default=False,
+                        help='keep the bag-of-words in CSR format and densify each batch when it is drawn')
+    parser.add_argument('--lazy_dataset', action='store_true', default=False,
+                        help='memory-map the dataset and read texts, labels and embeddings only when accessed')
 
 
 def add_model_argument(parser):
@@ -39,13 +44,50 @@ def add_model_argument(parser):
     parser.add_argument('--weight_local_expert', type=float, default=250.)
     parser.add_argument('--k', help='top k expert', type=int, default=1)
     parser.add_argument('--beta_temp', type=float, default=0.2)
+    parser.add_argument('--sinkhorn_warm_start', action='store_true', default=False,
+                        help='start each Sinkhorn solve from the scalings of the previous step')
+    parser.add_argument('--sinkhorn_convergence', type=str, default='sync',
+                        choices=['sync', 'async', 'fixed'],
+                        help='sync: check the error on the host; async: keep one check in flight \
+                            and stop at most one check interval late; fixed: always run sinkhorn_max_iter iterations')
+    parser.add_argument('--sinkhorn_compile', action='store_true', default=False,
+                        help='fuse the Sinkhorn scaling updates with torch.compile (torch >= 2.0)')
+    parser.add_argument('--sinkhorn_check_interval', type=int, default=50,
+                        help='number of Sinkhorn iterations between convergence checks')
+    parser.add_argument('--sinkhorn_max_iter', type=int, default=None,
+                        help='override the maximum number of Sinkhorn iterations of all regularizers')
+    parser.add_argument('--ot_update_interval', type=str, default=None,
+                        help='solve the OT regularizers every N steps (or "epoch") and reuse \
+                            the transport plans in between; default: every forward pass')
 
 
 def add_training_argument(parser):
+    parser.add_argument('--precision', type=str, default='fp32',
+                        choices=['fp32', 'bf16', 'fp16'],
+                        help='autocast dtype of the model forward pass; fp16 requires a CUDA device')
+    parser.add_argument('--eval_interval', type=int, default=0,
+                        help='compute TD and NMI/Purity every this many epochs during training (0: off)')
+    parser.add_argument('--eval_time_budget', type=float, default=None,
+                        help='target seconds per in-training metric; a metric that takes longer still completes, \
+                            then is evaluated half as often (this does not limit a single evaluation)')
+    parser.add_argument('--eval_samples', type=int, default=2000,
+                        help='number of test documents used by the in-training evaluation')
+    parser.add_argument('--early_stop_metric', type=str, default=None,
+                        help='stop training when this in-training metric (e.g., NMI, TD) stops improving')
+    parser.add_argument('--early_stop_patience', type=int, default=5,
+                        help='number of evaluations without improvement before early stopping')
+    parser.add_argument('--checkpoint_interval', type=int, default=0,
+                        help='save a resumable checkpoint every this many epochs (0: off)')
+    parser.add_argument('--checkpoint_keep', type=int, default=3,
+                        help='number of most recent checkpoints to keep')
+    parser.add_argument('--resume', type=str, default=None,
+                        help='checkpoint file, or checkpoint directory (its latest checkpoint), to resume training from')
     parser.add_argument('--epochs', type=int, default=200,
                         help='number of epochs to train the model')
     parser.add_argument('--batch_size', type=int, default=200,
                         help='batch size')
+    parser.add_argument('--inference_batch_size', type=int, default=2000,
+                        help='batch size used to infer theta after training')
     parser.add_argument('--lr', type=float, default=0.001,
                         help='learning rate')
 
@@ -88,6 +130,10 @@ def add_training_argument(parser):
 
 def add_eval_argument(parser):
     parser.add_argument('--tune_SVM', action='store_true', default=False)
+    parser.add_argument('--eval_jobs', type=int, default=1,
+                        help='number of processes for the SVM tuning grid')
+    parser.add_argument('--fast_linear_SVM', action='store_true', default=False,
+                        help='fit the linear kernel of the SVM grid with LinearSVC (liblinear)')
 
 
 def save_config(args, path):
@@ -100,12 +146,12 @@ def load_config(path):
     args = argparse.Namespace()
     with open(path, 'r') as f:
         for line in f:
-            key, value = line.strip().split(': ')
-            if value.isdigit():
-                if value.find('.') != -1:
-                    value = float(value)
-                else:
-                    value = int(value)
+            key, value = line.rstrip('\n').split(': ', 1)
+            # numbers, booleans and None as written by save_config; other values stay strings.
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                pass
             setattr(args, key, value)
     print(args)
     return args
@@ -0,0 +1,65 @@
+import sys
+import importlib
+from collections.abc import Mapping
+
+
+def lazy_exports(package, exports):
+    '''
+        Module __getattr__ and __dir__ for a package whose public names are imported on first access.
+
+        Args:
+            package: __name__ of the package.
+            exports: dict from each public name to the module defining it, relative to the package
+                (e.g., {'ECRTM': '.basic.ECRTM.ECRTM'}). A name mapped to None is a submodule.
+                Other submodules of the package are also imported on access, as with a plain import.
+    '''
+    def __getattr__(name):
+        if name not in exports:
+            if name.startswith('__'):
+                raise AttributeError(f'module {package!r} has no attribute {name!r}')
+            try:
+                value = importlib.import_module(f'.{name}', package)
+            except ModuleNotFoundError as e:
+                # only a missing submodule is an AttributeError; a failing import inside it is raised.
+                if e.name != f'{package}.{name}':
+                    raise
+                raise AttributeError(f'module {package!r} has no attribute {name!r}') from None
+        elif exports[name] is None:
+            value = importlib.import_module(f'.{name}', package)
+        else:
+            value = getattr(importlib.import_module(exports[name], package), name)
+
+        # later accesses find the attribute without calling __getattr__.
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package])) | set(exports))
+
+    return __getattr__, __dir__
+
+
+class LazyDict(Mapping):
+    '''
+        A read-only dict whose values are loaded by load(key) on first access.
+    '''
+    def __init__(self, keys, load):
+        self.keys_ = list(keys)
+        self.load = load
+        self.values_ = dict()
+
+    def __getitem__(self, key):
+        if key not in self.values_:
+            if key not in self.keys_:
+                raise KeyError(key)
+            self.values_[key] = self.load(key)
+        return self.values_[key]
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+    def __contains__(self, key):
+        return key in self.keys_
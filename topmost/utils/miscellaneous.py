@@ -1,8 +1,6 @@
 from datetime import datetime
 import numpy as np
 import os
-from sklearn.manifold import TSNE
-import matplotlib.pyplot as plt
 import wandb
 
 
@@ -25,6 +23,8 @@ def create_folder_if_not_exist(folder_path):
 
 
 def tsne_viz(word_embedding, topic_embedding, save_path, viz_group=False, logwandb=False):
+    from sklearn.manifold import TSNE
+    import matplotlib.pyplot as plt
     tsne = TSNE(n_components=2, random_state=0,
                 perplexity=5 if viz_group else 30)
     word_c = np.ones(word_embedding.shape[0])
@@ -47,6 +47,8 @@ def tsne_viz(word_embedding, topic_embedding, save_path, viz_group=False, logwan
 
 
 def tsne_group_viz(word_embedding, topic_embedding, group_embeddings, save_path_1, save_path_2, viz_group=False):
+    from sklearn.manifold import TSNE
+    import matplotlib.pyplot as plt
     tsne = TSNE(n_components=2, random_state=0,
                 perplexity=5 if viz_group else 30)
     word_c = np.ones(word_embedding.shape[0])
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import logging
 
@@ -5,10 +6,33 @@ import logging
 def print_topic_words(beta, vocab, num_top_words):
     logger = logging.getLogger('main')
     topic_str_list = list()
+    vocab = np.asarray(vocab)
     for i, topic_dist in enumerate(beta):
-        topic_words = np.array(vocab)[np.argsort(topic_dist)][:-(num_top_words + 1):-1]
+        topic_words = vocab[np.argsort(topic_dist)][:-(num_top_words + 1):-1]
         topic_str = ' '.join(topic_words)
         topic_str_list.append(topic_str)
         print('Topic {}: {}'.format(i, topic_str))
         logger.info('Topic {}: {}'.format(i, topic_str))
     return topic_str_list
+
+
+def save_top_words(top_word_ids, vocab, num_top_words_list, dir_path):
+    '''
+        Write top_words_{k}.txt for each k of num_top_words_list from the KxN ids of the top words of each topic
+        (sorted, N >= max k), so the top words of all k come from one top-k.
+
+        Returns:
+            a dict from k to the top words of each topic.
+    '''
+    logger = logging.getLogger('main')
+    vocab = np.asarray(vocab)
+    rst = dict()
+    for num_top_words in num_top_words_list:
+        topic_str_list = [' '.join(words) for words in vocab[top_word_ids[:, :num_top_words]]]
+        with open(os.path.join(dir_path, f'top_words_{num_top_words}.txt'), 'w') as f:
+            for i, topic_str in enumerate(topic_str_list):
+                print('Topic {}: {}'.format(i, topic_str))
+                logger.info('Topic {}: {}'.format(i, topic_str))
+                f.write(topic_str + '\n')
+        rst[num_top_words] = topic_str_list
+    return rst